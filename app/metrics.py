@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from hmac import compare_digest
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger(__name__)
+
+# Métricas por view (nome da rota: 'product-list', 'admin:products_product_changelist'...), mantidas
+# em memória no processo e expostas em /metrics no formato texto do Prometheus. Com vários
+# processos (workers do gunicorn), cada um tem os próprios contadores: o Prometheus deve coletar
+# de cada processo ou agregar pela instância.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Repetições da mesma consulta (mesmo SQL, parâmetros diferentes) em uma requisição a partir das
+# quais o padrão N+1 é registrado no log
+DUPLICATE_QUERY_WARNING = 10
+
+METRICS_PREFIX = 'inventory'
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: (list(counts), count, total) for labels, (counts, count, total) in self.series.items()}
+        for labels, (counts, count, total) in sorted(series.items()):
+            base = _labels(self.labels, labels)
+            cumulative = 0
+            for bound, value in zip(self.buckets, counts):
+                cumulative += value
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value, *labels):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = dict(self.series)
+        for labels, value in sorted(series.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, labels)}}} {value}')
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+REQUEST_LATENCY = Histogram(
+    f'{METRICS_PREFIX}_http_request_duration_seconds', 'Duração das requisições.', LATENCY_BUCKETS, ('view', 'method')
+)
+REQUESTS = Counter(
+    f'{METRICS_PREFIX}_http_requests_total', 'Requisições por view, método e status.', ('view', 'method', 'status')
+)
+REQUEST_QUERIES = Histogram(
+    f'{METRICS_PREFIX}_db_queries_per_request', 'Consultas SQL por requisição.', QUERY_BUCKETS, ('view',)
+)
+SQL_TIME = Counter(f'{METRICS_PREFIX}_db_query_duration_seconds_total', 'Tempo total em SQL.', ('view',))
+DUPLICATE_QUERIES = Counter(
+    f'{METRICS_PREFIX}_db_duplicate_queries_total',
+    'Consultas repetidas (mesmo SQL) dentro de uma requisição, indício de N+1.', ('view',)
+)
+METRICS = [REQUEST_LATENCY, REQUESTS, REQUEST_QUERIES, SQL_TIME, DUPLICATE_QUERIES]
+
+
+# Consultas da requisição atual. A variável de contexto acompanha a requisição também nas
+# threads do sync_to_async (views assíncronas), onde as conexões são outras.
+class QueryRecorder:
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    @property
+    def duplicates(self):
+        return self.count - len(self.statements)
+
+
+_recorder = ContextVar('metrics_recorder', default=None)
+
+
+# Wrapper instalado uma vez em cada conexão: fora de uma requisição medida, só repassa a chamada
+def record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.seconds += time.perf_counter() - start
+        recorder.count += 1
+        recorder.statements[sql] = recorder.statements.get(sql, 0) + 1
+
+
+def install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install, dispatch_uid='metrics-install-query-wrapper')
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Conexões abertas antes do middleware ser carregado não receberam o sinal
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.record(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.record(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, recorder, elapsed):
+        view = _view_name(request)
+        if view == 'metrics':
+            return
+        REQUEST_LATENCY.observe(elapsed, view, request.method)
+        REQUESTS.inc(1, view, request.method, response.status_code)
+        REQUEST_QUERIES.observe(recorder.count, view)
+        if recorder.count:
+            SQL_TIME.inc(recorder.seconds, view)
+        duplicates = recorder.duplicates
+        if duplicates:
+            DUPLICATE_QUERIES.inc(duplicates, view)
+            sql, repeats = max(recorder.statements.items(), key=lambda item: item[1])
+            if repeats >= DUPLICATE_QUERY_WARNING:
+                logger.warning('Possível N+1 em %s: %d execuções de %s', view, repeats, sql)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} consultas", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Coleta pelo Prometheus com 'Authorization: Bearer <METRICS_TOKEN>'; sem token, só usuários da equipe
+@require_GET
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    allowed = token and compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not (allowed or request.user.is_staff):
+        return HttpResponse('Não autorizado.\n', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+# Leituras marcadas com use_replica() vão para a réplica; todo o resto (inclusive qualquer
+# escrita dentro do bloco) vai para o primário. Como a réplica pode estar atrasada, só são
+# marcadas leituras que toleram alguns segundos de defasagem (listas, detalhes, logs, relatórios).
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def __init__(self, primary='default', replica='replica'):
+        self.primary = primary
+        self.replica = replica
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and self.replica in connections.settings:
+            return self.replica
+        return self.primary
+
+    def db_for_write(self, model, **hints):
+        return self.primary
+
+    # Primário e réplica têm os mesmos dados: objetos lidos de um podem se relacionar com o outro
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {self.primary, self.replica}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    # A réplica recebe o esquema por replicação, não por migrações
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != self.replica
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,7 +26,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # obriga autenticação
         'rest_framework.permissions.DjangoModelPermissions' # obriga permissão de modelo
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'products.pagination.InventoryCursorPagination',
+    'PAGE_SIZE': 100,  # pode ser alterado por requisição com ?page_size= (até 1000)
 }
 
 
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +57,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Instrumentação (app.metrics): latência, consultas SQL e N+1 por view, em /metrics
+# - METRICS_TOKEN: token para o Prometheus (Authorization: Bearer); sem ele, só a equipe acessa
+# - METRICS_SERVER_TIMING=1: cabeçalho Server-Timing com o tempo em SQL e o total de cada resposta
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '0') == '1'
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -77,10 +87,92 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# SQLite ajustado para vários usuários simultâneos (SQLITE_TUNED=0 volta ao padrão, para comparação):
+# - WAL: leitores não bloqueiam o escritor e vice-versa; synchronous=NORMAL é seguro com WAL
+# - timeout: espera até 20 s por um lock em vez de falhar com "database is locked"
+# - transaction_mode IMMEDIATE: as transações (inclusive as que alteram estoque) pegam o lock de
+#   escrita no BEGIN, evitando o impasse de duas transações que leem e depois tentam escrever
+# - mmap_size/cache_size: 256 MB mapeados em memória e ~64 MB de cache de páginas por conexão
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', '1') != '0'
+SQLITE_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA busy_timeout=20000;'
+        'PRAGMA mmap_size=268435456;'
+        'PRAGMA cache_size=-65536;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+}
+
+# Banco de dados, configurado por variáveis de ambiente:
+# - DB_ENGINE: padrão django.db.backends.sqlite3 (arquivo DB_NAME, com o ajuste acima); para um
+#   servidor, por exemplo django.db.backends.postgresql, com DB_NAME, DB_USER, DB_PASSWORD,
+#   DB_HOST e DB_PORT
+# - DB_POOL_MAX_SIZE (PostgreSQL): > 0 habilita o pool de conexões do psycopg 3 (psycopg[pool]),
+#   com DB_POOL_MIN_SIZE conexões abertas; o pool substitui o CONN_MAX_AGE
+# - DB_REPLICA_HOST / DB_REPLICA_PORT / DB_REPLICA_NAME: réplica de leitura 'replica', usada pelo
+#   app.routers.ReplicaRouter nas leituras marcadas com use_replica()
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DEFAULT_DATABASE = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS if SQLITE_TUNED else {},
+    }
+else:
+    DEFAULT_DATABASE = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', 'inventory'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        'OPTIONS': {},
+    }
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+if DB_ENGINE == 'django.db.backends.postgresql' and DB_POOL_MAX_SIZE:
+    DEFAULT_DATABASE['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': 10,
+    }
+    DEFAULT_DATABASE['CONN_MAX_AGE'] = 0
+else:
+    # Conexões persistentes: reaproveitadas entre requisições da mesma thread por até
+    # DB_CONN_MAX_AGE segundos (0 fecha ao fim de cada requisição), verificadas antes do reuso
+    DEFAULT_DATABASE['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DEFAULT_DATABASE['CONN_HEALTH_CHECKS'] = True
+
+DATABASES = {'default': DEFAULT_DATABASE}
+
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DEFAULT_DATABASE,
+        'OPTIONS': dict(DEFAULT_DATABASE['OPTIONS']),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DEFAULT_DATABASE['NAME']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DEFAULT_DATABASE.get('HOST', '')),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DEFAULT_DATABASE.get('PORT', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+
+
+# Cache
+# Memória local por padrão (um cache por processo). Para compartilhar entre processos/servidores,
+# defina CACHE_BACKEND e CACHE_LOCATION, por exemplo:
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://localhost:6379/1
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'inventory'),
+        'KEY_PREFIX': 'inventory',
     }
 }
 
@@ -121,6 +213,17 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Arquivos gerados pelas tarefas em segundo plano (exportações e relatórios), servidos pelo
+# download das tarefas no Admin e na API, com verificação de permissão
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
+# Resumo de estoque baixo (comando low_stock_digest): LOW_STOCK_DIGEST_RECIPIENTS com os e-mails
+# separados por vírgula; sem ele, o resumo vai para os usuários da equipe com e-mail
+LOW_STOCK_DIGEST_RECIPIENTS = [
+    address.strip() for address in os.environ.get('LOW_STOCK_DIGEST_RECIPIENTS', '').split(',') if address.strip()
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -150,6 +253,9 @@ JAZZMIN_SETTINGS = {
         'products.UnitOfMeasurement': 'fa-solid fa-ruler-combined',
         'products.Entry': 'fa-solid fa-plus',
         'products.Exit': 'fa-solid fa-minus',
+        'products.StockSnapshot': 'fas fa-calendar-check',
+        'products.StockReconciliation': 'fas fa-balance-scale',
+        'products.WebhookSubscription': 'fas fa-broadcast-tower',
         'admin.LogEntry': 'fas fa-history'
     },
 
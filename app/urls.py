@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
+    path('api/async/', include('products.async_urls')),
     path('api/', include('products.api_urls')),
     path('', admin.site.urls),
 ]
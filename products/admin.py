@@ -1,22 +1,135 @@
-import csv
-import openpyxl
+from functools import partial
 
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 from django import forms
 from django.contrib import admin, messages
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from .models import Brand, Category, Product, UnitOfMeasurement, Entry, Exit
-from django.core.exceptions import ValidationError
+from .models import (
+    Brand, Category, Product, UnitOfMeasurement, Entry, Exit, StockSnapshot, StockReconciliation, Job,
+    WebhookSubscription
+)
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.contrib.admin.models import LogEntry
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.functional import cached_property
+from .exports import csv_response, xlsx_response
+from .reports import stock_pdf_response
+from .cache import cached_reference, is_reference_model, reference_choices
+from .search import filter_by_search
+from .imports import import_products
+from .events import latest_event_id
+from .jobs import enqueue, should_enqueue
+from .services import low_stock_products
+
+
+# Paginador com contagem limitada: em tabelas grandes, o COUNT(*) do changelist custa mais que a página.
+# Conta no máximo `count_cap` linhas, ou até a página seguinte à pedida (`page_hint`), para que o
+# link "próxima" continue existindo além do limite; `capped` indica que há mais linhas que `count`.
+# No PostgreSQL, sem filtros, usa a estimativa do catálogo.
+class CappedCountPaginator(Paginator):
+    count_cap = 10000
+
+    def __init__(self, *args, page_hint=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_hint = page_hint
+        self.capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > max(self.count_cap, self.page_hint * self.per_page):
+                return row[0]
+        limit = max(self.count_cap, (self.page_hint + 1) * self.per_page)
+        count = queryset.order_by()[:limit + 1].count()
+        self.capped = count > limit
+        return min(count, limit)
+
+
+# Filtro por chave estrangeira com as opções em cache, evitando a consulta da tabela relacionada
+# a cada carregamento do changelist. Tabelas de referência usam o cache versionado, invalidado
+# ao salvar; as demais expiram após `cache_timeout`.
+class CachedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    cache_timeout = 300
+
+    def field_choices(self, field, request, model_admin):
+        model = field.related_model
+        producer = partial(super().field_choices, field, request, model_admin)
+        if is_reference_model(model):
+            return cached_reference(model, 'filter-choices', producer)
+
+        key = f'admin-filter-choices:{model._meta.label_lower}'
+        choices = cache.get(key)
+        if choices is None:
+            choices = producer()
+            cache.set(key, choices, self.cache_timeout)
+        return choices
+
+
+# Selects de chave estrangeira para tabelas de referência montados a partir do cache;
+# o queryset do campo continua sendo usado na validação
+class ReferenceChoicesAdminMixin:
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if formfield is not None and is_reference_model(db_field.related_model) and db_field.name not in self.raw_id_fields:
+            blank = [('', formfield.empty_label)] if formfield.empty_label is not None else []
+            formfield.choices = blank + reference_choices(db_field.related_model, formfield.queryset)
+        return formfield
+
+
+# Configuração comum aos changelists de tabelas grandes
+class LargeTableAdminMixin:
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            page = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            page = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, page_hint=page)
+
+
+# Estoque baixo pelo índice parcial de low_stock, sem percorrer o catálogo
+class LowStockListFilter(admin.SimpleListFilter):
+    title = 'estoque baixo'
+    parameter_name = 'low_stock'
+
+    def lookups(self, request, model_admin):
+        return [('reorder', 'No ponto de pedido'), ('critical', 'Abaixo do mínimo')]
+
+    def queryset(self, request, queryset):
+        if self.value() in ('reorder', 'critical'):
+            return low_stock_products(queryset, critical=self.value() == 'critical')
+        return queryset
 
 
 # Habilita a exclusão do LogEntry pelo Admin
 @admin.register(LogEntry)
-class LogEntryAdmin(admin.ModelAdmin):
+class LogEntryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['action_time', 'user', 'content_type', 'object_repr', 'action_flag']
+    list_select_related = ['user', 'content_type']
     search_fields = ['user__username', 'object_repr']
-    list_filter = ['action_flag', 'content_type', 'user']
+    list_filter = [
+        'action_flag',
+        ('content_type', CachedRelatedFieldListFilter),
+        ('user', CachedRelatedFieldListFilter),
+    ]
     readonly_fields = ['action_time', 'user', 'content_type', 'object_repr', 'object_id', 'change_message']
     actions = ['excluir_logs_selecionados', 'delete_all_logs']
 
@@ -44,67 +157,145 @@ class ExitForm(forms.ModelForm):
         model = Exit
         fields = '__all__'
 
+    # Em edições do mesmo produto, só o acréscimo à saída precisa caber no estoque
     def clean_quantity(self):
         quantity = self.cleaned_data.get('quantity')
         product = self.cleaned_data.get('product')
 
-        if product and quantity > product.stock:
+        increase = quantity
+        if self.instance.pk and product and self.instance.product_id == product.pk:
+            increase = quantity - self.instance.quantity
+        if product and increase > product.stock:
             raise forms.ValidationError(f"A quantidade não pode ser maior que o estoque disponível ({product.stock}).")
         
         return quantity
 
 
-# Função para exportar como CSV
-def export_as_csv(modeladmin, request, queryset):
-    if not queryset:
-        return HttpResponse("Nenhum item selecionado.")
-    
-    meta = modeladmin.model._meta
-    field_names = [field.name for field in meta.fields if field.name != 'id']
+# Formulário de importação de produtos (CSV ou XLSX)
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label="Arquivo",
+        help_text="CSV (UTF-8, separado por vírgula ou ponto e vírgula) ou XLSX, com as mesmas colunas da exportação."
+    )
+    create_missing = forms.BooleanField(
+        label="Cadastrar marcas e categorias inexistentes", required=False
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Envie um arquivo .csv ou .xlsx.")
+        return file
+
+
+# Parâmetros da tarefa (ver jobs.enqueue): o changelist inteiro (exportação do changelist, ou ação
+# com "selecionar todos") é remontado pela query string; uma seleção de linhas, pelos ids
+def export_job_params(request, queryset):
+    if request.method == 'GET' or request.POST.get('select_across') == '1':
+        return {'changelist': request.GET.urlencode()}
+    return {
+        'filters': {'pk__in': list(queryset.values_list('pk', flat=True))},
+        'ordering': [field for field in queryset.query.order_by if isinstance(field, str)],
+    }
+
+
+# Exportações grandes vão para a fila (comando run_jobs); o usuário recebe o link da tarefa
+def enqueue_export(modeladmin, request, kind, queryset):
+    job = enqueue(kind, modeladmin.model, export_job_params(request, queryset), request.user)
+    url = reverse('admin:products_job_change', args=[job.pk])
+    modeladmin.message_user(
+        request,
+        format_html(
+            'A exportação tem muitas linhas e foi agendada: acompanhe em <a href="{}">{}</a>.', url, job
+        ),
+        level=messages.INFO
+    )
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename={meta.model_name}.csv'
 
-    writer = csv.writer(response)
-    writer.writerow(field_names)
-    for obj in queryset:
-        writer.writerow([getattr(obj, field) if getattr(obj, field) is not None else '' for field in field_names])
+# Função para exportar como CSV (em streaming, sem carregar o queryset em memória)
+def export_as_csv(modeladmin, request, queryset):
+    if not queryset.exists():
+        return HttpResponse("Nenhum item selecionado.")
+    if should_enqueue(queryset):
+        return enqueue_export(modeladmin, request, 'export_csv', queryset)
 
-    return response
+    return csv_response(queryset, modeladmin.model._meta.model_name)
 
 export_as_csv.short_description = "Exportar como CSV"
 
 
-# Função para exportar como XLSX
+# Função para exportar como XLSX (planilha write_only com células tipadas)
 def export_as_xlsx(modeladmin, request, queryset):
-    if not queryset:
+    if not queryset.exists():
         return HttpResponse("Nenhum item selecionado.")
-    
-    meta = modeladmin.model._meta
-    field_names = [field.name for field in meta.fields if field.name != 'id']
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = meta.model_name.capitalize()
-    ws.append(field_names)
-
-    for obj in queryset:
-        row = []
-        for field in field_names:
-            value = getattr(obj, field)
-            row.append(str(value) if hasattr(value, '__str__') else value if value is not None else '')
-        ws.append(row)
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename={meta.model_name}.xlsx'
-    wb.save(response)
-    return response
+    if should_enqueue(queryset):
+        return enqueue_export(modeladmin, request, 'export_xlsx', queryset)
+
+    return xlsx_response(queryset, modeladmin.model._meta.model_name)
 
 export_as_xlsx.short_description = "Exportar como XLSX"
 
 
+# Relatório de estoque em PDF (estoque, status e valor dos produtos selecionados)
+def export_as_pdf(modeladmin, request, queryset):
+    if not queryset.exists():
+        return HttpResponse("Nenhum item selecionado.")
+    if should_enqueue(queryset):
+        return enqueue_export(modeladmin, request, 'stock_pdf', queryset)
+
+    return stock_pdf_response(queryset)
+
+export_as_pdf.short_description = "Exportar como PDF"
+
+
+# Exportação baseada em filtros: exporta todo o changelist filtrado, não apenas os itens selecionados
+class ExportChangelistMixin:
+    change_list_template = 'admin/products/change_list_export.html'
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                'export/csv/',
+                self.admin_site.admin_view(self.export_changelist_csv),
+                name='%s_%s_export_csv' % info
+            ),
+            path(
+                'export/xlsx/',
+                self.admin_site.admin_view(self.export_changelist_xlsx),
+                name='%s_%s_export_xlsx' % info
+            ),
+        ] + super().get_urls()
+
+    def get_filtered_queryset(self, request):
+        return self.get_changelist_instance(request).get_queryset(request)
+
+    def export_changelist_csv(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        queryset = self.get_filtered_queryset(request)
+        if should_enqueue(queryset):
+            return self.enqueue_changelist_export(request, 'export_csv', queryset)
+        return csv_response(queryset, self.model._meta.model_name)
+
+    def export_changelist_xlsx(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        queryset = self.get_filtered_queryset(request)
+        if should_enqueue(queryset):
+            return self.enqueue_changelist_export(request, 'export_xlsx', queryset)
+        return xlsx_response(queryset, self.model._meta.model_name)
+
+    # Volta ao changelist, com os mesmos filtros, avisando que a exportação foi agendada
+    def enqueue_changelist_export(self, request, kind, queryset):
+        enqueue_export(self, request, kind, queryset)
+        info = self.model._meta.app_label, self.model._meta.model_name
+        changelist = reverse('admin:%s_%s_changelist' % info)
+        return redirect(f'{changelist}?{request.GET.urlencode()}' if request.GET else changelist)
+
+
 @admin.register(Brand)
-class BrandAdmin(admin.ModelAdmin):
+class BrandAdmin(ExportChangelistMixin, admin.ModelAdmin):
     list_display = ['name', 'is_active', 'created_at', 'updated_at']
     search_fields = ['name']
     list_filter = ['is_active']
@@ -117,20 +308,21 @@ class BrandAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ExportChangelistMixin, admin.ModelAdmin):
     list_display = ['name', 'is_active', 'created_at', 'updated_at']
     search_fields = ['name']
     list_filter = ['is_active']
     actions = [export_as_csv, export_as_xlsx]
     fieldsets = (
         (None, {'fields': ('name', 'is_active')}),
+        ('Estoque baixo', {'fields': ('min_stock', 'reorder_point')}),
         ('Datas', {'fields': ('created_at', 'updated_at')})
     )
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(UnitOfMeasurement)
-class UnitOfMeasurementAdmin(admin.ModelAdmin):
+class UnitOfMeasurementAdmin(ExportChangelistMixin, admin.ModelAdmin):
     list_display = ['name', 'symbol', 'is_active', 'created_at', 'updated_at']
     search_fields = ['name']
     list_filter = ['is_active']
@@ -143,14 +335,20 @@ class UnitOfMeasurementAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ExportChangelistMixin, LargeTableAdminMixin, ReferenceChoicesAdminMixin, admin.ModelAdmin):
+    change_list_template = 'admin/products/product/change_list.html'
     list_display = [
         'title', 'brand', 'category', 'price', 'stock', 'dimension',
-        'unit_of_measurement', 'status', 'is_active', 'created_at', 'updated_at'
+        'unit_of_measurement', 'status', 'low_stock', 'is_active', 'created_at', 'updated_at'
     ]
     search_fields = ['title', 'brand__name', 'category__name']
-    list_filter = ['status', 'is_active', 'brand', 'category']
-    actions = [export_as_csv, export_as_xlsx]
+    list_select_related = ['brand', 'category', 'unit_of_measurement']
+    list_filter = [
+        'status', LowStockListFilter, 'is_active',
+        ('brand', CachedRelatedFieldListFilter),
+        ('category', CachedRelatedFieldListFilter),
+    ]
+    actions = [export_as_csv, export_as_xlsx, export_as_pdf]
     fieldsets = (
         (None, {
             'fields': (
@@ -158,14 +356,63 @@ class ProductAdmin(admin.ModelAdmin):
                 'dimension', 'unit_of_measurement', 'observation', 'status', 'is_active'
             )
         }),
+        ('Estoque baixo', {'fields': ('min_stock', 'reorder_point', 'alert_level', 'low_stock', 'low_stock_since')}),
         ('Datas', {'fields': ('created_at', 'updated_at')})
     )
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['alert_level', 'low_stock', 'low_stock_since', 'created_at', 'updated_at']
+
+    # Busca pelo índice textual (FTS5 no SQLite) em vez de LIKE '%termo%' sobre os JOINs
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return filter_by_search(queryset, search_term), False
+
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='products_product_import'
+            ),
+        ] + super().get_urls()
+
+    # Importação em massa: valida o arquivo inteiro e só grava se nenhuma linha tiver erro
+    def import_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == 'POST' and form.is_valid():
+            try:
+                result = import_products(form.cleaned_data['file'], create_missing=form.cleaned_data['create_missing'])
+            except ValidationError as e:
+                form.add_error('file', e)
+            else:
+                if not result['errors']:
+                    self.message_user(
+                        request,
+                        f"Importação concluída: {result['created']} produto(s) criado(s) e "
+                        f"{result['updated']} atualizado(s).",
+                        level=messages.SUCCESS
+                    )
+                    return redirect('admin:products_product_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Importar produtos",
+            'opts': self.model._meta,
+            'form': form,
+            'result': result,
+        }
+        return TemplateResponse(request, 'admin/products/product/import.html', context)
 
 
 @admin.register(Entry)
-class EntryAdmin(admin.ModelAdmin):
+class EntryAdmin(ExportChangelistMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['product', 'user', 'quantity', 'date']
+    list_select_related = ['product__brand', 'product__category', 'product__unit_of_measurement', 'user']
+    autocomplete_fields = ['product']
     search_fields = ['product__title', 'user__username']
     list_filter = ['date']
     readonly_fields = ['date']
@@ -179,9 +426,11 @@ class EntryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Exit)
-class ExitAdmin(admin.ModelAdmin):
+class ExitAdmin(ExportChangelistMixin, LargeTableAdminMixin, admin.ModelAdmin):
     form = ExitForm
     list_display = ['product', 'user', 'quantity', 'date']
+    list_select_related = ['product__brand', 'product__category', 'product__unit_of_measurement', 'user']
+    autocomplete_fields = ['product']
     search_fields = ['product__title', 'user__username']
     list_filter = ['date']
     readonly_fields = ['date']
@@ -197,4 +446,111 @@ class ExitAdmin(admin.ModelAdmin):
         try:
             super().save_model(request, obj, form, change)
         except ValidationError as e:
-            self.message_user(request, str(e), level='error')
\ No newline at end of file
+            self.message_user(request, str(e), level='error')
+
+
+# Fechamentos diários são mantidos pelas movimentações; o admin é somente leitura
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['product', 'date', 'closing_stock', 'updated_at']
+    list_select_related = ['product__brand', 'product__category']
+    search_fields = ['product__title']
+    list_filter = ['date']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# Histórico das conciliações executadas pelo comando reconcile_stock
+@admin.register(StockReconciliation)
+class StockReconciliationAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'finished_at', 'incremental', 'checked_since', 'drifted', 'fixed']
+    list_filter = ['incremental']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'kind', 'status', 'progress', 'rows', 'user', 'created_at', 'finished_at', 'download']
+    list_filter = ['status', 'kind']
+    list_select_related = ['user']
+    fields = [
+        'kind', 'status', 'progress', 'rows', 'user', 'download', 'error',
+        'created_at', 'started_at', 'heartbeat_at', 'finished_at'
+    ]
+    readonly_fields = fields
+
+    # Cada usuário vê as próprias tarefas; superusuários veem todas
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not request.user.is_superuser:
+            queryset = queryset.filter(user=request.user)
+        return queryset
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='products_job_download'
+            ),
+        ] + super().get_urls()
+
+    @admin.display(description='Arquivo')
+    def download(self, obj):
+        if obj.status != 'done' or not obj.file:
+            return '-'
+        return format_html('<a href="{}">Baixar</a>', reverse('admin:products_job_download', args=[obj.pk]))
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        job = self.get_queryset(request).filter(pk=pk, status='done').first()
+        if job is None or not job.file:
+            raise Http404
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1])
+
+
+# Destinos dos eventos de estoque, entregues pelo comando dispatch_events. O cursor pode ser
+# editado para reenviar (menor) ou pular (maior) eventos.
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'url', 'is_active', 'cursor', 'pending', 'failures', 'next_attempt_at', 'last_delivered_at']
+    list_filter = ['is_active']
+    fields = [
+        'name', 'url', 'secret', 'is_active', 'cursor',
+        'failures', 'next_attempt_at', 'last_delivered_at', 'last_error'
+    ]
+    readonly_fields = ['failures', 'next_attempt_at', 'last_delivered_at', 'last_error']
+    actions = ['retry_now']
+
+    # Pendentes pela distância entre o cursor e o último id da outbox, lido uma vez por requisição
+    # (ids de transações desfeitas contam, mas são poucos); contar os eventos seria um COUNT por linha
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            pending=Greatest(Value(latest_event_id()) - F('cursor'), Value(0))
+        )
+
+    @admin.display(description='Eventos pendentes', ordering='pending')
+    def pending(self, obj):
+        return obj.pending
+
+    @admin.action(description='Tentar novamente agora')
+    def retry_now(self, request, queryset):
+        updated = queryset.update(next_attempt_at=None, failures=0)
+        self.message_user(request, f'{updated} webhook(s) liberado(s) para a próxima entrega.')
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     ProductViewSet, CategoryViewSet, BrandViewSet, UnitViewSet, 
     EntryViewSet, ExitViewSet, UserViewSet, GroupViewSet, 
-    LogEntryViewSet
+    LogEntryViewSet, ReportViewSet, JobViewSet, StockEventViewSet, cache_stats
 )
 
 router = DefaultRouter()
@@ -16,7 +16,11 @@ router.register(r'exits', ExitViewSet)
 router.register(r'users', UserViewSet)
 router.register(r'groups', GroupViewSet)
 router.register(r'logs', LogEntryViewSet)
+router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'jobs', JobViewSet)
+router.register(r'stock-events', StockEventViewSet)
 
 urlpatterns = [
+    path('cache-stats/', cache_stats, name='cache-stats'),
     path('', include(router.urls)),
 ]
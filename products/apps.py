@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    # Conecta os sinais: invalidação do cache de referência, remoção do arquivo das tarefas
+    # e marcação dos produtos cujas movimentações somem na exclusão de um usuário
+    def ready(self):
+        from . import signals
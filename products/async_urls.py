@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .async_views import product_detail, product_stock, entry_list, exit_list
+
+urlpatterns = [
+    path('products/<int:pk>/', product_detail, name='async-product-detail'),
+    path('products/<int:pk>/stock/', product_stock, name='async-product-stock'),
+    path('entries/', entry_list, name='async-entry-list'),
+    path('exits/', exit_list, name='async-exit-list'),
+]
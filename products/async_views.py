@@ -0,0 +1,125 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .models import Product, Entry, Exit
+
+# Endpoints assíncronos de leitura (/api/async/), para servir sob ASGI (uvicorn) sem ocupar uma
+# thread por requisição enquanto o banco responde. Usam o ORM assíncrono e devolvem dicts de
+# .values(), sem passar pelo DRF.
+
+PRODUCT_FIELDS = [field.name for field in Product._meta.concrete_fields]
+MOVEMENT_FIELDS = ['id', 'product', 'user', 'quantity', 'date']
+
+# Querysets montados uma vez: cada aget() trabalha sobre um clone
+PRODUCT_VALUES = Product.objects.values(*PRODUCT_FIELDS)
+STOCK_VALUES = Product.objects.values('id', 'stock', 'status', 'is_active')
+
+MOVEMENT_DEFAULT_LIMIT = 100
+MOVEMENT_MAX_LIMIT = 1000
+
+
+def _error(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+def _positive_int(value, default=None):
+    if value in (None, ''):
+        return default
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+
+# Autenticação com as mesmas classes do REST_FRAMEWORK (sessão, Basic e token); levanta
+# AuthenticationFailed para credenciais inválidas
+def _authenticate(request):
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
+
+
+# Exige um usuário autenticado como no restante da API. A sessão é lida com o ORM assíncrono;
+# só requisições com o cabeçalho Authorization passam pelas classes do DRF, que são síncronas.
+def async_login_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated and request.headers.get('Authorization'):
+            try:
+                user = await sync_to_async(_authenticate)(request)
+            except AuthenticationFailed as e:
+                return _error(str(e.detail), 403)
+        if not user.is_authenticated:
+            return _error("As credenciais de autenticação não foram fornecidas.", 403)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+@async_login_required
+async def product_detail(request, pk):
+    try:
+        product = await PRODUCT_VALUES.aget(pk=pk)
+    except Product.DoesNotExist:
+        return _error("Não encontrado.", 404)
+    return JsonResponse(product)
+
+
+# Consulta de estoque: ?quantity= informa se uma saída dessa quantidade seria aceita agora
+@require_GET
+@async_login_required
+async def product_stock(request, pk):
+    quantity = _positive_int(request.GET.get('quantity'), default=1)
+    if quantity is None:
+        return _error("?quantity= deve ser um número inteiro positivo.", 400)
+    try:
+        product = await STOCK_VALUES.aget(pk=pk)
+    except Product.DoesNotExist:
+        return _error("Não encontrado.", 404)
+
+    available = product['is_active'] and product['status'] != 'temporarily_unavailable'
+    return JsonResponse({
+        "product": product['id'],
+        "stock": product['stock'],
+        "status": product['status'],
+        "quantity": quantity,
+        "available": available and product['stock'] >= quantity,
+    })
+
+
+# Lista de movimentações da mais recente para a mais antiga, paginada por ?before=<id>;
+# filtros: ?product= e ?limit= (padrão 100, até 1000)
+def movement_list(model):
+    @require_GET
+    @async_login_required
+    async def view(request):
+        params = request.GET
+        limit = _positive_int(params.get('limit'), default=MOVEMENT_DEFAULT_LIMIT)
+        before = _positive_int(params.get('before'))
+        product = _positive_int(params.get('product'))
+        if limit is None or limit > MOVEMENT_MAX_LIMIT:
+            return _error(f"?limit= deve ser um número entre 1 e {MOVEMENT_MAX_LIMIT}.", 400)
+        if (params.get('before') and before is None) or (params.get('product') and product is None):
+            return _error("?before= e ?product= devem ser ids numéricos.", 400)
+
+        queryset = model.objects.order_by('-id')
+        if before:
+            queryset = queryset.filter(id__lt=before)
+        if product:
+            queryset = queryset.filter(product=product)
+
+        results = [row async for row in queryset.values(*MOVEMENT_FIELDS)[:limit]]
+        next_url = None
+        if len(results) == limit:
+            query = params.copy()
+            query['before'] = results[-1]['id']
+            next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+        return JsonResponse({"next": next_url, "results": results})
+    return view
+
+
+entry_list = movement_list(Entry)
+exit_list = movement_list(Exit)
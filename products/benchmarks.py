@@ -0,0 +1,704 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+import openpyxl
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib import admin
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from app.metrics import MetricsMiddleware
+
+from .datagen import generate_dataset
+from .exports import export_columns, stream_csv, write_xlsx
+from .imports import import_products
+from .serializers import FastListSerializer, ProductSerializer
+from .reports import low_stock_digest
+from .search import search_products
+from .services import low_stock_products, stock_drift
+from .models import Brand, Category, Product, UnitOfMeasurement, Entry, Exit
+
+# Cenários registrados: nome -> função(rows) que devolve um dict de métricas
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+
+# Métricas em que um valor menor é melhor (tempo, consultas, memória) e maior é melhor (vazão);
+# as demais (contagens, parâmetros) são informativas e não entram na comparação
+LOWER_IS_BETTER = ('seconds', '_ms', '_us', 'queries', 'memory_kb', 'errors')
+HIGHER_IS_BETTER = ('per_second', '_rps')
+
+
+# Identificação da execução, gravada junto com os resultados para comparar entre commits
+def run_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cpus': os.cpu_count(),
+    }
+
+
+def metric_direction(name):
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+# Compara dois resultados ({cenário: {métrica: valor}}): devolve (cenário, métrica, antes, depois,
+# variação em %, piorou além do limite?) para as métricas de desempenho presentes nos dois
+def compare_results(baseline, current, threshold=10.0):
+    rows = []
+    for name, metrics in current.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            direction = metric_direction(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before * 100
+            rows.append((name, metric, before, value, round(change, 1), -change * direction > threshold))
+    return rows
+
+
+# Banco descartável (o mesmo usado pelos testes), para não tocar nos dados reais
+@contextmanager
+def benchmark_database():
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+# Conta as consultas executadas sem guardá-las (o log do Django é limitado a 9000)
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+# Mede tempo, consultas e pico de memória Python de uma função que consome um resultado.
+# O tempo vem de uma execução sem tracemalloc; a memória, de uma segunda execução rastreada.
+def measure(function, rows):
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed) if elapsed else None,
+        'queries': queries.count,
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def seed_catalog(products=10, title='Produto {}'.format):
+    brand = Brand.objects.create(name='Marca Benchmark')
+    category = Category.objects.create(name='Categoria Benchmark')
+    unit = UnitOfMeasurement.objects.create(name='Unidade Benchmark', symbol='un')
+    return Product.objects.bulk_create(
+        Product(
+            title=title(i), brand=brand, category=category, unit_of_measurement=unit,
+            price='9.90', stock=0
+        )
+        for i in range(products)
+    )
+
+
+# Grava movimentações direto com bulk_create, sem passar pelo Entry.save
+def seed_entries(rows, products, batch_size=5000):
+    user = User.objects.create(username='benchmark')
+    for start in range(0, rows, batch_size):
+        Entry.objects.bulk_create(
+            Entry(product=products[i % len(products)], user=user, quantity=1)
+            for i in range(start, min(start + batch_size, rows))
+        )
+
+
+def _consume(iterable):
+    for _ in iterable:
+        pass
+
+
+@scenario('export_csv')
+def export_csv(rows=1_000_000):
+    seed_entries(rows, seed_catalog())
+    columns = export_columns(Entry)
+    return measure(lambda: _consume(stream_csv(Entry.objects.all(), columns)), rows)
+
+
+# Implementação anterior do export_as_xlsx, mantida apenas como referência de comparação
+def _legacy_xlsx(queryset, file):
+    field_names = [field.name for field in queryset.model._meta.fields if field.name != 'id']
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(field_names)
+    for obj in queryset:
+        row = []
+        for field in field_names:
+            value = getattr(obj, field)
+            row.append(str(value) if hasattr(value, '__str__') else value if value is not None else '')
+        ws.append(row)
+    wb.save(file)
+
+
+@scenario('export_xlsx')
+def export_xlsx(rows=50_000):
+    seed_entries(rows, seed_catalog())
+    columns = export_columns(Entry)
+    current = measure(lambda: write_xlsx(Entry.objects.all(), columns, io.BytesIO(), 'entry'), rows)
+    legacy = measure(lambda: _legacy_xlsx(Entry.objects.all(), io.BytesIO()), rows)
+    current.update({f'legacy_{key}': value for key, value in legacy.items() if key != 'rows'})
+    return current
+
+
+@scenario('reconcile')
+def reconcile(rows=1_000_000):
+    seed_entries(rows, seed_catalog(products=1000))
+    return measure(lambda: list(stock_drift()), rows)
+
+
+# Melhor tempo de algumas repetições, para reduzir o ruído do coletor de lixo e do cache
+def _timed(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 3)
+
+
+# Compara a serialização de listas: ModelSerializer completo, ModelSerializer com ?fields=
+# e o FastListSerializer sobre .values(), todos sobre as mesmas linhas
+@scenario('serialize_products')
+def serialize_products(rows=10_000):
+    seed_catalog(products=rows)
+    fields = ['id', 'title', 'stock', 'status']
+    request = Request(APIRequestFactory().get('/api/products/', {'fields': ','.join(fields)}))
+
+    def full():
+        ProductSerializer(list(Product.objects.all()), many=True).data
+
+    def sparse():
+        ProductSerializer(list(Product.objects.only(*fields)), many=True, context={'request': request}).data
+
+    def fast():
+        serializer = ProductSerializer(context={'request': request})
+        FastListSerializer(serializer).serialize(Product.objects.values(*fields))
+
+    return {
+        'rows': rows,
+        'full_seconds': _timed(full),
+        'sparse_seconds': _timed(sparse),
+        'fast_path_seconds': _timed(fast),
+    }
+
+
+SEARCH_NOUNS = ['Disjuntor', 'Cabo', 'Relé', 'Tomada', 'Interruptor', 'Lâmpada', 'Eletroduto', 'Conector', 'Fita', 'Quadro']
+SEARCH_QUALIFIERS = ['bipolar', 'flexível', 'fotoelétrico', 'LED', 'isolante', 'corrugado', 'tripolar', '2,5mm', '32A', '10A']
+
+# Consultas típicas: prefixo amplo, duas palavras, termo raro e erro de digitação (trigramas)
+SEARCH_QUERIES = ['cab', 'disjuntor bipolar', 'rele foto 4711', 'eletrodto']
+
+
+# Latência da busca de produtos (top 20) sobre um catálogo de nomes de material elétrico
+@scenario('search')
+def search(rows=500_000):
+    seed_catalog(
+        products=rows,
+        title=lambda i: f'{SEARCH_NOUNS[i % 10]} {SEARCH_QUALIFIERS[i // 10 % 10]} {i}'
+    )
+    result = {'rows': rows}
+    for query in SEARCH_QUERIES:
+        result[f'{query}_ms'] = round(_timed(lambda: search_products(query), repeat=5) * 1000)
+    return result
+
+
+IMPORT_HEADER = ['title', 'brand', 'category', 'price', 'stock', 'unit_of_measurement']
+
+
+def _import_rows(rows):
+    for i in range(rows):
+        yield [f'Produto {i}', 'Marca Benchmark', 'Categoria Benchmark', f'{i % 1000}.90', i % 50, 'un']
+
+
+def _import_file(rows, extension):
+    file = io.BytesIO()
+    if extension == 'csv':
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='', write_through=True)
+        writer = csv.writer(text)
+        writer.writerow(IMPORT_HEADER)
+        writer.writerows(_import_rows(rows))
+        text.detach()
+    else:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('produtos')
+        sheet.append(IMPORT_HEADER)
+        for row in _import_rows(rows):
+            sheet.append(row)
+        workbook.save(file)
+    file.seek(0)
+    return file
+
+
+# Importação em massa de CSV e XLSX: metade das linhas atualiza produtos existentes e a outra
+# metade cria produtos novos; os criados são apagados entre um formato e outro
+@scenario('import_products')
+def import_products_file(rows=100_000):
+    existing = seed_catalog(products=rows // 2)
+    last_seeded = existing[-1].pk
+    result = {'rows': rows}
+    for extension in ('csv', 'xlsx'):
+        file = _import_file(rows, extension)
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            start = time.perf_counter()
+            imported = import_products(file, f'produtos.{extension}')
+            elapsed = time.perf_counter() - start
+        if imported['errors']:
+            raise RuntimeError(imported['errors'][:5])
+        result.update({
+            f'{extension}_seconds': round(elapsed, 3),
+            f'{extension}_rows_per_second': round(rows / elapsed),
+            f'{extension}_queries': queries.count,
+            f'{extension}_created': imported['created'],
+            f'{extension}_updated': imported['updated'],
+        })
+        Product.objects.filter(pk__gt=last_seeded).delete()
+    return result
+
+
+# Dados realistas (datagen) para os cenários de caminhos críticos: `rows` produtos e dez
+# movimentações por produto
+def seed_dataset(rows):
+    generate_dataset(brands=50, categories=30, products=rows, movements=rows * 10)
+    return User.objects.create_superuser('benchmark')
+
+
+# Mediana e p95 (em ms) e consultas por chamada de uma operação repetida
+def _latency(function, repeat=20):
+    function()  # aquece caches de consultas, templates e conexões
+    queries = QueryCounter()
+    samples = []
+    with connection.execute_wrapper(queries):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - start)
+    return {
+        'ms': round(_percentile(samples, 0.5) * 1000, 2),
+        'p95_ms': round(_percentile(samples, 0.95) * 1000, 2),
+        'queries': queries.count // repeat,
+    }
+
+
+def _prefixed(prefix, metrics):
+    return {f'{prefix}_{key}': value for key, value in metrics.items()}
+
+
+# Entry.save e Exit.save (UPDATE condicional de estoque e fechamento do dia), uma por vez
+@scenario('movement_save')
+def movement_save(rows=10_000):
+    user = seed_dataset(rows)
+    ids = list(Product.objects.filter(stock__gte=100).values_list('pk', flat=True)[:100])
+    products = list(Product.objects.filter(pk__in=ids))
+    cycle = iter(range(10 ** 9))
+
+    def save(model):
+        model.objects.create(product=products[next(cycle) % len(products)], user=user, quantity=1)
+
+    return {
+        'rows': rows,
+        **_prefixed('entry_save', _latency(lambda: save(Entry), repeat=200)),
+        **_prefixed('exit_save', _latency(lambda: save(Exit), repeat=200)),
+    }
+
+
+# Endpoints da API (listagem e detalhe): nome -> modelo do detalhe
+API_ENDPOINTS = {
+    'products': Product, 'categories': Category, 'brands': Brand, 'units': UnitOfMeasurement,
+    'entries': Entry, 'exits': Exit, 'users': User, 'groups': Group, 'logs': LogEntry,
+}
+
+
+@contextmanager
+def _client(user):
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        client = APIClient()
+        client.force_login(user)
+        yield client
+
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url}: HTTP {response.status_code}')
+    _consume(getattr(response, 'streaming_content', ()))
+
+
+# Listagem e detalhe de cada ViewSet, pela pilha completa (middlewares, sessão, permissões)
+@scenario('api')
+def api(rows=10_000):
+    user = seed_dataset(rows)
+    Group.objects.create(name='Benchmark')
+    LogEntry.objects.log_action(user.pk, None, None, 'benchmark', ADDITION)
+    result = {'rows': rows}
+    with _client(user) as client:
+        for name, model in API_ENDPOINTS.items():
+            pk = model.objects.order_by('pk').values_list('pk', flat=True).last()
+            result.update(_prefixed(f'{name}_list', _latency(lambda: _get(client, f'/api/{name}/'))))
+            result.update(_prefixed(f'{name}_detail', _latency(lambda: _get(client, f'/api/{name}/{pk}/'))))
+        result.update(_prefixed('reports_valuation', _latency(lambda: _get(client, '/api/reports/valuation/'))))
+    return result
+
+
+# Changelists do Admin (a tela mais usada), com busca e filtro no de produtos
+@scenario('admin')
+def admin_changelists(rows=10_000):
+    user = seed_dataset(rows)
+    result = {'rows': rows}
+    pages = {
+        model._meta.model_name: reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        for model in admin.site._registry if model._meta.app_label == 'products'
+    }
+    pages['product_search'] = pages['product'] + '?q=cabo'
+    pages['product_filtered'] = pages['product'] + f'?category__id__exact={Category.objects.values_list("pk", flat=True).first()}'
+    with _client(user) as client:
+        for name, url in pages.items():
+            result.update(_prefixed(name, _latency(lambda: _get(client, url), repeat=10)))
+    return result
+
+
+# Estoque baixo pelo índice parcial (página da API, contagem e resumo). A contagem é comparada à
+# mesma consulta sem a marcação low_stock, que precisa percorrer todo o catálogo.
+@scenario('low_stock')
+def low_stock(rows=200_000):
+    user = seed_dataset(rows)
+    scan = Product.objects.filter(is_active=True, stock__lte=F('alert_level'))
+    result = {
+        'rows': rows,
+        'low_stock_products': low_stock_products().count(),
+        **_prefixed('page', _latency(lambda: list(low_stock_products().order_by('title', 'id')[:100]))),
+        **_prefixed('count', _latency(lambda: low_stock_products().count(), repeat=5)),
+        **_prefixed('scan_count', _latency(lambda: scan.count(), repeat=5)),
+        **_prefixed('digest', _latency(low_stock_digest, repeat=5)),
+    }
+    with _client(user) as client:
+        result.update(_prefixed('api', _latency(lambda: _get(client, '/api/products/low-stock/'))))
+        result.update(_prefixed('api_critical', _latency(lambda: _get(client, '/api/products/low-stock/?critical=true'))))
+    return result
+
+
+# Custo da instrumentação (app.metrics) por requisição: a mesma "view" com `rows` consultas
+# simples (todas diferentes, sem acionar o aviso de N+1), chamada diretamente e pelo MetricsMiddleware
+@scenario('instrumentation')
+def instrumentation(rows=10, requests=2000):
+    product = seed_catalog(products=1)[0]
+    match = type('Match', (), {'view_name': 'benchmark', 'route': ''})()
+    request = RequestFactory().get('/')
+
+    def view(request):
+        request.resolver_match = match
+        for i in range(rows):
+            Product.objects.filter(pk__in=[product.pk] * (i + 1)).exists()
+        return HttpResponse()
+
+    middleware = MetricsMiddleware(view)
+
+    def run(handler):
+        for _ in range(requests):
+            handler(request)
+
+    bare = _timed(lambda: run(view), repeat=5)
+    instrumented = _timed(lambda: run(middleware), repeat=5)
+    return {
+        'queries_per_request': rows,
+        'bare_us': round(bare / requests * 1e6),
+        'instrumented_us': round(instrumented / requests * 1e6),
+        'overhead_us': round((instrumented - bare) / requests * 1e6, 1),
+    }
+
+
+# Conexões simultâneas do teste de carga
+LOAD_CONCURRENCY = 500
+
+# Servidores comparados, um processo cada: WSGI (app/wsgi.py) com threads e ASGI (app/asgi.py)
+LOAD_SERVERS = {
+    'wsgi': ['-m', 'gunicorn', 'app.wsgi:application', '--worker-class', 'gthread', '--threads', '32',
+             '--backlog', '2048', '--bind', '127.0.0.1:{port}', '--log-level', 'warning'],
+    'asgi': ['-m', 'uvicorn', 'app.asgi:application', '--port', '{port}', '--backlog', '2048',
+             '--log-level', 'warning', '--no-access-log'],
+}
+
+# Alvo -> (servidor, caminho com o id do produto)
+LOAD_TARGETS = {
+    'wsgi_sync': ('wsgi', '/api/products/{}/'),
+    'asgi_sync': ('asgi', '/api/products/{}/'),
+    'asgi_async': ('asgi', '/api/async/products/{}/'),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def _server(kind, database):
+    port = _free_port()
+    command = [sys.executable] + [part.format(port=port) for part in LOAD_SERVERS[kind]]
+    env = {**os.environ, 'DB_NAME': database, 'DJANGO_SETTINGS_MODULE': 'app.settings'}
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'O servidor {kind} terminou ao iniciar (instale gunicorn e uvicorn).')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+# Cliente HTTP/1.1 mínimo com keep-alive: cada conexão consome caminhos da fila compartilhada
+async def _load_connection(port, paths, cookie, latencies, errors):
+    reader = writer = None
+    while paths:
+        path = paths.pop()
+        if writer is None:
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            except OSError:
+                errors.append(path)
+                continue
+        request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nCookie: {cookie}\r\n\r\n'
+        start = time.perf_counter()
+        try:
+            writer.write(request.encode())
+            await writer.drain()
+            head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').lower()
+            length = next(
+                (int(line.split(':', 1)[1]) for line in head.split('\r\n') if line.startswith('content-length:')), 0
+            )
+            await reader.readexactly(length)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            errors.append(path)
+            writer.close()
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if not head.startswith('http/1.1 200'):
+            errors.append(path)
+        if 'connection: close' in head:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _load(port, paths, cookie, concurrency):
+    latencies, errors = [], []
+    await asyncio.gather(*(
+        _load_connection(port, paths, cookie, latencies, errors) for _ in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))] if values else None
+
+
+# O banco de benchmark do SQLite fica em memória: copia para um arquivo visível a outros processos
+def _database_file(directory, name):
+    if connection.vendor != 'sqlite':
+        return str(connection.settings_dict['NAME'])
+    path = os.path.join(directory, name)
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    connection.connection.backup(target)
+    target.close()
+    return path
+
+
+# Sessão autenticada gravada no banco, enviada como cookie pelo cliente de carga
+def _session_cookie(user):
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+# Teste de carga: mesma leitura de produto pelo DRF síncrono sob WSGI e sob ASGI e pelo
+# endpoint assíncrono sob ASGI, com LOAD_CONCURRENCY conexões; `rows` é o número de
+# requisições por alvo. Requer gunicorn e uvicorn instalados.
+@scenario('http_load')
+def http_load(rows=20_000):
+    products = [product.pk for product in seed_catalog(products=1000)]
+    cookie = _session_cookie(User.objects.create_user('benchmark-load'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = _database_file(directory, 'load.sqlite3')
+        result = {'rows': rows, 'concurrency': LOAD_CONCURRENCY}
+        for kind in LOAD_SERVERS:
+            with _server(kind, database) as port:
+                for name, (server, path) in LOAD_TARGETS.items():
+                    if server != kind:
+                        continue
+                    asyncio.run(_load(port, [path.format(pk) for pk in products[:50]], cookie, 50))  # aquecimento
+                    paths = [path.format(random.choice(products)) for _ in range(rows)]
+                    start = time.perf_counter()
+                    latencies, errors = asyncio.run(_load(port, paths, cookie, LOAD_CONCURRENCY))
+                    elapsed = time.perf_counter() - start
+                    result.update({
+                        f'{name}_rps': round(len(latencies) / elapsed),
+                        f'{name}_p50_ms': round(_percentile(latencies, 0.5) * 1000, 1),
+                        f'{name}_p99_ms': round(_percentile(latencies, 0.99) * 1000, 1),
+                        f'{name}_errors': len(errors),
+                    })
+    return result
+
+
+# Processos escritores simultâneos do benchmark de concorrência no SQLite
+WRITER_PROCESSES = 8
+
+WRITER_SCRIPT = """
+import json, os, random, sys, time
+import django
+django.setup()
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import OperationalError
+from products.models import Entry, Exit, Product
+
+count = int(sys.argv[1])
+products = list(Product.objects.values_list('pk', flat=True))
+user = User.objects.get(username='benchmark')
+time.sleep(max(0, float(sys.argv[2]) - time.time()))
+written = locked = rejected = 0
+start = time.perf_counter()
+for i in range(count):
+    model = Entry if i % 2 == 0 else Exit
+    try:
+        model.objects.create(product_id=random.choice(products), user=user, quantity=1)
+        written += 1
+    except OperationalError:
+        locked += 1
+    except ValidationError:
+        # Saída de um produto sem estoque: recusada, o escritor continua
+        rejected += 1
+print(json.dumps({
+    'written': written, 'locked': locked, 'rejected': rejected, 'seconds': time.perf_counter() - start
+}))
+"""
+
+
+def _run_writers(database, tuned, count):
+    env = {
+        **os.environ, 'DB_NAME': database, 'SQLITE_TUNED': '1' if tuned else '0',
+        'DJANGO_SETTINGS_MODULE': 'app.settings',
+    }
+    start_at = str(time.time() + 3)
+    processes = [
+        subprocess.Popen(
+            [sys.executable, '-c', WRITER_SCRIPT, str(count), start_at],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE
+        )
+        for _ in range(WRITER_PROCESSES)
+    ]
+    results = [json.loads(process.communicate()[0].decode().strip().splitlines()[-1]) for process in processes]
+    written = sum(result['written'] for result in results)
+    elapsed = max(result['seconds'] for result in results)
+    return {
+        'writes_per_second': round(written / elapsed) if elapsed else None,
+        'locked_errors': sum(result['locked'] for result in results),
+        'rejected_writes': sum(result['rejected'] for result in results),
+        'seconds': round(elapsed, 2),
+    }
+
+
+# Vazão de escritores concorrentes (entradas e saídas alterando estoque, cada uma em sua
+# transação) com as configurações padrão do SQLite e com o modo ajustado (WAL, IMMEDIATE, timeout);
+# `rows` é o total de movimentações, dividido entre WRITER_PROCESSES processos
+@scenario('sqlite_writers')
+def sqlite_writers(rows=4000):
+    if connection.vendor != 'sqlite':
+        return {'skipped': 'somente SQLite'}
+    products = seed_catalog(products=100)
+    Product.objects.filter(pk__in=[product.pk for product in products]).update(stock=rows)
+    User.objects.create(username='benchmark')
+
+    result = {'rows': rows, 'processes': WRITER_PROCESSES}
+    with tempfile.TemporaryDirectory() as directory:
+        for tuned in (False, True):
+            name = 'tuned' if tuned else 'default'
+            database = _database_file(directory, f'{name}.sqlite3')
+            metrics = _run_writers(database, tuned, rows // WRITER_PROCESSES)
+            result.update({f'{name}_{key}': value for key, value in metrics.items()})
+    return result
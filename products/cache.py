@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
+
+from .models import Brand, Category, UnitOfMeasurement
+
+# Tabelas de referência: pequenas, lidas o tempo todo e raramente alteradas
+REFERENCE_MODELS = (Brand, Category, UnitOfMeasurement)
+
+# Backends em que cada processo tem o próprio cache: a troca de versão ao salvar só vale no
+# processo que salvou, e os demais workers servem o conjunto antigo até a entrada expirar
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Entradas de versões antigas não são apagadas: ficam inalcançáveis e expiram sozinhas. Sem um
+# cache compartilhado (CACHE_BACKEND), a validade curta limita o atraso entre os workers.
+SHARED_CACHE = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+REFERENCE_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE else 30
+
+_MISSING = object()
+
+
+def _key(model, suffix):
+    return f'reference:{model._meta.label_lower}:{suffix}'
+
+
+def is_reference_model(model):
+    return model in REFERENCE_MODELS
+
+
+# Versão atual do conjunto; faz parte da chave de todas as entradas em cache do modelo
+def reference_version(model):
+    key = _key(model, 'version')
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(model):
+    key = _key(model, 'version')
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Versão despejada do cache: recomeça de um valor que não colide com as anteriores
+        cache.set(key, time.time_ns(), None)
+
+
+# Invalida o conjunto trocando a versão. A troca é repetida após o commit, para descartar
+# o que outra requisição tenha guardado lendo o banco antes da transação terminar.
+def invalidate_reference(model):
+    _bump(model)
+    transaction.on_commit(lambda: _bump(model))
+
+
+def _count(model, outcome):
+    key = _key(model, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+# Devolve o valor guardado em `name` para a versão atual do modelo, ou o calcula com `producer`
+def cached_reference(model, name, producer):
+    key = _key(model, f'{reference_version(model)}:{name}')
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _count(model, 'misses')
+        value = producer()
+        cache.set(key, value, REFERENCE_CACHE_TIMEOUT)
+    else:
+        _count(model, 'hits')
+    return value
+
+
+# Opções (id, rótulo) de um campo de escolha de modelo, para selects e filtros
+def reference_choices(model, queryset=None):
+    queryset = model._default_manager.all() if queryset is None else queryset
+    return cached_reference(model, 'choices', lambda: [(obj.pk, str(obj)) for obj in queryset])
+
+
+# Contadores de acertos/falhas e versão atual de cada conjunto
+def reference_cache_stats():
+    stats = {}
+    for model in REFERENCE_MODELS:
+        values = cache.get_many([_key(model, name) for name in ('hits', 'misses', 'version')])
+        stats[model._meta.label_lower] = {
+            'hits': values.get(_key(model, 'hits'), 0),
+            'misses': values.get(_key(model, 'misses'), 0),
+            'version': values.get(_key(model, 'version')),
+        }
+    return stats
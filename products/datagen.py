@@ -0,0 +1,167 @@
+import datetime
+import random
+from array import array
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import Brand, Category, Product, UnitOfMeasurement, Entry, Exit, alert_level
+
+# Gerador de dados sintéticos para benchmarks e testes de carga: catálogo com nomes plausíveis
+# e histórico de entradas e saídas em ordem cronológica, coerente com o estoque de cada produto
+# (a conciliação não encontra divergências).
+
+UNITS = [
+    ('Unidade', 'un'), ('Metro', 'm'), ('Peça', 'pç'), ('Caixa', 'cx'), ('Rolo', 'rl'),
+    ('Quilograma', 'kg'), ('Litro', 'l'), ('Par', 'par'), ('Pacote', 'pct'), ('Conjunto', 'cj'),
+]
+BRAND_NAMES = ['Sil', 'Steck', 'Tramontina', 'Schneider', 'WEG', 'Pial', 'Fame', 'Margirius', 'Lorenzetti', 'Tigre']
+CATEGORY_NAMES = ['Cabos', 'Proteção', 'Iluminação', 'Tomadas', 'Conduletes', 'Ferramentas', 'Quadros', 'Fitas']
+PRODUCT_NOUNS = [
+    'Cabo', 'Disjuntor', 'Relé', 'Tomada', 'Interruptor', 'Lâmpada', 'Eletroduto', 'Conector', 'Fita', 'Quadro',
+    'Luminária', 'Plugue', 'Abraçadeira', 'Terminal', 'Caixa de passagem', 'Chave', 'Sensor', 'Reator',
+]
+PRODUCT_QUALIFIERS = [
+    'flexível', 'bipolar', 'tripolar', 'LED', 'isolante', 'corrugado', 'fotoelétrico', '2,5mm', '4mm', '6mm',
+    '10A', '20A', '32A', 'embutir', 'sobrepor', 'preto', 'branco', 'industrial', 'residencial', 'blindado',
+]
+
+# Parte das movimentações que são saídas (quando há estoque para atendê-las)
+EXIT_RATIO = 0.45
+
+# Estoque mínimo das categorias (o ponto de pedido é o dobro), em ciclo; sem sorteio, para não
+# alterar a sequência aleatória do restante do conjunto
+CATEGORY_MIN_STOCK = [2, 3, 5, 8]
+
+# Expoente da distribuição de popularidade: poucos produtos concentram a maior parte das movimentações
+POPULARITY_SKEW = 3
+
+
+def _names(base, count):
+    return [base[i % len(base)] if i < len(base) else f'{base[i % len(base)]} {i // len(base) + 1}' for i in range(count)]
+
+
+# Cria (ou reaproveita, pelo nome) os cadastros de referência e devolve os ids
+def _reference_ids(model, rows, key='name'):
+    names = [row[key] for row in rows]
+    existing = set(model.objects.filter(**{f'{key}__in': names}).values_list(key, flat=True))
+    model.objects.bulk_create(model(**row) for row in rows if row[key] not in existing)
+    return list(model.objects.filter(**{f'{key}__in': names}).order_by('pk').values_list('pk', flat=True))
+
+
+MOVEMENT_COLUMNS = ['product', 'user', 'quantity', 'date']
+
+
+# INSERT com executemany para o histórico: montar uma instância e compilar o bulk_create por linha
+# custa várias vezes o tempo do próprio banco (e o auto_now_add de `date` descartaria as datas passadas)
+def _insert_rows(connection, model, fields, rows):
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    # Um bloco por transação: em autocommit, cada linha do executemany seria confirmada separadamente
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+# Simula as movimentações em ordem cronológica sobre o estoque em memória: devolve, em arrays
+# compactos, o índice do produto e a quantidade (negativa nas saídas) de cada movimentação,
+# e o estoque final de cada produto
+def simulate_movements(products, movements, rng):
+    stock = array('l', [0]) * products
+    targets = array('l')
+    quantities = array('l')
+    for _ in range(movements):
+        index = int(products * rng.random() ** POPULARITY_SKEW)
+        quantity = rng.randint(1, 20)
+        if rng.random() < EXIT_RATIO and stock[index] >= quantity:
+            quantity = -quantity
+        stock[index] += quantity
+        targets.append(index)
+        quantities.append(quantity)
+    return targets, quantities, stock
+
+
+def generate_dataset(brands=50, categories=30, units=10, products=10_000, movements=100_000, users=5,
+                     days=365, batch_size=5000, seed=0, progress=None):
+    rng = random.Random(seed)
+    report = progress or (lambda message: None)
+
+    brand_ids = _reference_ids(Brand, [{'name': name} for name in _names(BRAND_NAMES, brands)])
+    category_ids = _reference_ids(Category, [
+        {'name': name, 'min_stock': minimum, 'reorder_point': minimum * 2}
+        for name, minimum in zip(_names(CATEGORY_NAMES, categories), CATEGORY_MIN_STOCK * categories)
+    ])
+    levels = {
+        pk: alert_level(min_stock, reorder_point) for pk, min_stock, reorder_point in
+        Category.objects.filter(pk__in=category_ids).values_list('pk', 'min_stock', 'reorder_point')
+    }
+    unit_ids = _reference_ids(UnitOfMeasurement, [
+        {'name': name, 'symbol': UNITS[i % len(UNITS)][1]}
+        for i, name in enumerate(_names([name for name, _ in UNITS], units))
+    ])
+    user_ids = _reference_ids(User, [{'username': f'operador{i + 1}'} for i in range(users)], key='username')
+
+    report(f'Simulando {movements} movimentações...')
+    targets, quantities, stock = simulate_movements(products, movements, rng)
+
+    # Ids atribuídos aqui para as movimentações referenciarem os produtos sem consultá-los
+    first_id = (Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    now = timezone.now()
+    for start in range(0, products, batch_size):
+        batch = [
+            Product(
+                pk=first_id + i,
+                title=f'{PRODUCT_NOUNS[i % len(PRODUCT_NOUNS)]} '
+                      f'{PRODUCT_QUALIFIERS[i // len(PRODUCT_NOUNS) % len(PRODUCT_QUALIFIERS)]} {i + 1}',
+                brand_id=rng.choice(brand_ids), category_id=rng.choice(category_ids),
+                unit_of_measurement_id=rng.choice(unit_ids),
+                price=Decimal(rng.randint(100, 99_999)) / 100,
+                stock=stock[i], status='in_stock' if stock[i] > 0 else 'out_of_stock',
+                dimension=rng.choice([None, '10x10cm', '2,5mm²', '1/2"', '100m']),
+            )
+            for i in range(start, min(start + batch_size, products))
+        ]
+        # bulk_create não passa pelo save: estoque baixo calculado aqui, pelos limites da categoria
+        for product in batch:
+            product.alert_level = levels[product.category_id]
+            product.low_stock = product.alert_level is not None and product.stock <= product.alert_level
+            product.low_stock_since = now if product.low_stock else None
+        Product.objects.bulk_create(batch)
+        report(f'Produtos: {min(start + batch_size, products)}/{products}')
+
+    connection = connections[router.db_for_write(Product)]
+    with connection.cursor() as cursor:
+        # Ids explícitos não avançam a sequência do PostgreSQL
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+            cursor.execute(sql)
+
+    step = datetime.timedelta(days=days) / max(movements, 1)
+    begin = now - datetime.timedelta(days=days)
+    adapt_date = connection.ops.adapt_datetimefield_value
+    for start in range(0, movements, batch_size):
+        entries, exits = [], []
+        for position in range(start, min(start + batch_size, movements)):
+            quantity = quantities[position]
+            row = (
+                first_id + targets[position], user_ids[position % len(user_ids)], abs(quantity),
+                adapt_date(begin + step * position),
+            )
+            (entries if quantity > 0 else exits).append(row)
+        _insert_rows(connection, Entry, MOVEMENT_COLUMNS, entries)
+        _insert_rows(connection, Exit, MOVEMENT_COLUMNS, exits)
+        report(f'Movimentações: {min(start + batch_size, movements)}/{movements}')
+
+    # Estatísticas atualizadas para o planejador escolher os índices como em produção
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    return {
+        'brands': len(brand_ids), 'categories': len(category_ids), 'units': len(unit_ids),
+        'products': products, 'entries': sum(1 for quantity in quantities if quantity > 0),
+        'exits': sum(1 for quantity in quantities if quantity < 0),
+    }
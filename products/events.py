@@ -0,0 +1,201 @@
+import hashlib
+import hmac
+import http.client
+import json
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import StockEvent, WebhookSubscription
+
+# Entrega dos eventos de estoque da outbox (StockEvent): webhooks em lotes, com cursor por
+# assinatura e nova tentativa com espera crescente, e o feed /api/stock-events/ (long-poll ou SSE).
+# A entrega é "pelo menos uma vez": o consumidor deve ignorar ids que já processou.
+
+EVENT_FIELDS = ['id', 'product_id', 'stock', 'status', 'created_at']
+
+# Eventos por POST de webhook e por leitura do feed
+EVENT_BATCH_SIZE = 500
+
+# Lotes seguidos entregues a uma assinatura por ciclo do dispatcher, antes de passar à próxima
+MAX_BATCHES_PER_CYCLE = 10
+
+# No PostgreSQL, uma transação pode confirmar eventos com ids menores que os de outra já
+# confirmada. A leitura para no primeiro buraco na sequência de ids mais novo que isso e espera
+# ele ser preenchido (buracos mais antigos são de transações desfeitas ou eventos apagados).
+EVENT_SETTLE = timedelta(seconds=5)
+
+# Intervalo entre consultas à outbox enquanto o feed espera eventos novos, em segundos
+POLL_INTERVAL = 0.5
+
+# Espera máxima de uma leitura long-poll e duração máxima de um stream SSE, em segundos.
+# Terminado o stream, o EventSource reconecta sozinho com o cabeçalho Last-Event-ID.
+LONG_POLL_MAX = 30
+STREAM_DURATION = 60
+STREAM_HEARTBEAT = 15
+STREAM_RETRY_MS = 2000
+
+WEBHOOK_TIMEOUT = 10
+SIGNATURE_HEADER = 'X-Inventory-Signature'
+
+# Reserva de uma assinatura por um dispatcher; se ele for encerrado, outro a assume depois disso
+WEBHOOK_LEASE = timedelta(minutes=5)
+
+# Espera antes da nova tentativa: BACKOFF_BASE, dobrando a cada falha seguida, até BACKOFF_MAX
+BACKOFF_BASE = timedelta(seconds=5)
+BACKOFF_MAX = timedelta(hours=1)
+
+# Eventos mais antigos que isso são apagados, desde que todas as assinaturas ativas já os tenham recebido
+EVENT_RETENTION = timedelta(days=getattr(settings, 'STOCK_EVENT_RETENTION_DAYS', 7))
+
+
+def _event_dict(row):
+    return {
+        'id': row['id'],
+        'product': row['product_id'],
+        'stock': row['stock'],
+        'status': row['status'],
+        'created_at': timezone.localtime(row['created_at']).isoformat(),
+    }
+
+
+# Até `limit` eventos depois do cursor, em ordem, parando em um buraco recente na sequência
+def events_after(cursor, limit=EVENT_BATCH_SIZE):
+    rows = list(StockEvent.objects.filter(pk__gt=cursor).order_by('pk').values(*EVENT_FIELDS)[:limit])
+    settled = timezone.now() - EVENT_SETTLE
+    expected = cursor + 1
+    for index, row in enumerate(rows):
+        if row['id'] != expected and row['created_at'] > settled:
+            rows = rows[:index]
+            break
+        expected = row['id'] + 1
+    return [_event_dict(row) for row in rows]
+
+
+def latest_event_id():
+    return StockEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+# Long-poll: devolve assim que houver eventos depois do cursor, ou vazio após `timeout` segundos
+def wait_for_events(cursor, limit=EVENT_BATCH_SIZE, timeout=0):
+    deadline = time.monotonic() + timeout
+    while True:
+        events = events_after(cursor, limit)
+        if events or time.monotonic() >= deadline:
+            return events
+        time.sleep(POLL_INTERVAL)
+
+
+# Stream SSE: um evento `stock` por mudança, com o id como cursor de retomada (Last-Event-ID),
+# e um comentário periódico para proxies não encerrarem a conexão ociosa
+def event_stream(cursor, duration=STREAM_DURATION):
+    deadline = time.monotonic() + duration
+    idle_since = time.monotonic()
+    yield f'retry: {STREAM_RETRY_MS}\n\n'
+    while True:
+        events = events_after(cursor)
+        for event in events:
+            yield f"id: {event['id']}\nevent: stock\ndata: {json.dumps(event)}\n\n"
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        if events:
+            cursor = events[-1]['id']
+            idle_since = now
+            continue
+        if now - idle_since >= STREAM_HEARTBEAT:
+            yield ': ping\n\n'
+            idle_since = now
+        time.sleep(POLL_INTERVAL)
+
+
+def signature(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def backoff(failures):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(failures - 1, 0))
+
+
+# Assinaturas ativas, atrasadas em relação à outbox e fora de espera, reservadas com um UPDATE
+# condicional: dispatchers simultâneos nunca entregam à mesma assinatura ao mesmo tempo
+def claim_due_subscriptions():
+    latest = latest_event_id()
+    now = timezone.now()
+    due = WebhookSubscription.objects.filter(is_active=True, cursor__lt=latest).filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+    )
+    for subscription in due:
+        claimed = WebhookSubscription.objects.filter(
+            pk=subscription.pk, next_attempt_at=subscription.next_attempt_at
+        ).update(next_attempt_at=now + WEBHOOK_LEASE)
+        if claimed:
+            yield subscription
+
+
+# Envia um lote de eventos e avança o cursor; devolve quantos foram entregues. Erros de rede e
+# respostas fora de 2xx sobem como exceção (urllib.error.URLError/HTTPError, OSError).
+def deliver(subscription, batch_size=EVENT_BATCH_SIZE):
+    events = events_after(subscription.cursor, batch_size)
+    if not events:
+        return 0
+    body = json.dumps({'events': events}).encode()
+    headers = {'Content-Type': 'application/json', 'User-Agent': 'inventory-webhooks'}
+    if subscription.secret:
+        headers[SIGNATURE_HEADER] = signature(subscription.secret, body)
+    request = urllib.request.Request(subscription.url, data=body, headers=headers, method='POST')
+    with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT):
+        pass
+
+    # Condicional ao cursor lido: se a reserva expirou e outro dispatcher avançou, nada é sobrescrito
+    updated = WebhookSubscription.objects.filter(pk=subscription.pk, cursor=subscription.cursor).update(
+        cursor=events[-1]['id'], failures=0, last_error='', last_delivered_at=timezone.now()
+    )
+    if not updated:
+        return 0
+    subscription.cursor = events[-1]['id']
+    subscription.failures = 0
+    return len(events)
+
+
+def _error_message(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return f'HTTP {error.code}: {error.reason}'
+    return f'{type(error).__name__}: {error}'
+
+
+# Um ciclo do dispatcher: entrega às assinaturas pendentes e devolve (eventos entregues, falhas)
+def dispatch_events(batch_size=EVENT_BATCH_SIZE):
+    delivered = failed = 0
+    for subscription in claim_due_subscriptions():
+        try:
+            for _ in range(MAX_BATCHES_PER_CYCLE):
+                count = deliver(subscription, batch_size)
+                delivered += count
+                if count < batch_size:
+                    break
+        # HTTPException cobre respostas malformadas ou conexões encerradas sem resposta
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            failed += 1
+            failures = subscription.failures + 1
+            WebhookSubscription.objects.filter(pk=subscription.pk).update(
+                failures=failures, last_error=_error_message(e),
+                next_attempt_at=timezone.now() + backoff(failures),
+            )
+        else:
+            WebhookSubscription.objects.filter(pk=subscription.pk).update(next_attempt_at=None)
+    return delivered, failed
+
+
+# Apaga os eventos fora da retenção que todas as assinaturas ativas já receberam
+def prune_events(retention=EVENT_RETENTION):
+    queryset = StockEvent.objects.filter(created_at__lt=timezone.now() - retention)
+    cursor = WebhookSubscription.objects.filter(is_active=True).aggregate(cursor=Min('cursor'))['cursor']
+    if cursor is not None:
+        queryset = queryset.filter(pk__lte=cursor)
+    return queryset.delete()[0]
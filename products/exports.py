@@ -0,0 +1,127 @@
+import csv
+import datetime
+import tempfile
+
+import openpyxl
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+# Quantidade de linhas buscadas do banco por vez durante a exportação
+EXPORT_CHUNK_SIZE = 2000
+
+# Campo usado para representar cada modelo relacionado na exportação
+RELATED_LABEL_FIELDS = ('name', 'title', 'username')
+
+
+# Colunas exportadas de um modelo: (cabeçalho, caminho para values_list).
+# Chaves estrangeiras viram o nome do relacionado, resolvido por JOIN na mesma consulta.
+def export_columns(model):
+    columns = []
+    for field in model._meta.fields:
+        if field.name == 'id':
+            continue
+        path = field.name
+        if field.is_relation:
+            related_fields = {f.name for f in field.related_model._meta.fields}
+            label = next((name for name in RELATED_LABEL_FIELDS if name in related_fields), 'pk')
+            path = f'{field.name}__{label}'
+        columns.append((field.name, path))
+    return columns
+
+
+# Linhas da exportação como tuplas de valores nativos, lidas em blocos sem materializar o queryset
+def export_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    paths = [path for _, path in columns]
+    return queryset.values_list(*paths).iterator(chunk_size=chunk_size)
+
+
+# Repassa as linhas chamando `progress(feitas, total)` a cada bloco (exportações em segundo plano)
+def with_progress(rows, progress, total, every=EXPORT_CHUNK_SIZE):
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % every == 0:
+            progress(done, total)
+    progress(done, total)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+# Pseudo-buffer: o csv.writer devolve a linha formatada em vez de acumulá-la
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in export_rows(queryset, columns):
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+# Grava o CSV em um arquivo de texto (tarefas em segundo plano); devolve o número de linhas
+def write_csv(queryset, columns, file, progress=None):
+    rows = export_rows(queryset, columns)
+    if progress:
+        rows = with_progress(rows, progress, queryset.count())
+    writer = csv.writer(file)
+    writer.writerow([header for header, _ in columns])
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        count += 1
+    return count
+
+
+# Resposta CSV em streaming: memória constante e uma única consulta, independente do volume
+def csv_response(queryset, filename):
+    columns = export_columns(queryset.model)
+    response = StreamingHttpResponse(stream_csv(queryset, columns), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename={filename}.csv'
+    return response
+
+
+def _xlsx_value(value):
+    # O Excel não armazena fuso horário: grava a data/hora local
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+# Grava a planilha em modo write_only: as linhas vão direto para o arquivo, com células tipadas
+# (Decimal, int, datetime) em vez de texto, e a memória não cresce com o número de linhas
+def write_xlsx(queryset, columns, file, title, progress=None):
+    rows = export_rows(queryset, columns)
+    if progress:
+        rows = with_progress(rows, progress, queryset.count())
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append([header for header, _ in columns])
+    count = 0
+    for row in rows:
+        sheet.append([_xlsx_value(value) for value in row])
+        count += 1
+    workbook.save(file)
+    return count
+
+
+# Resposta XLSX servida a partir de um arquivo temporário, sem montar a planilha em memória
+def xlsx_response(queryset, filename):
+    file = tempfile.TemporaryFile()
+    write_xlsx(queryset, export_columns(queryset.model), file, queryset.model._meta.model_name.capitalize())
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
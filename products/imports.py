@@ -0,0 +1,288 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from zipfile import BadZipFile
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate_reference
+from .models import Brand, Category, Product, UnitOfMeasurement, alert_level
+from .services import record_snapshots, record_stock_events
+
+# Linhas validadas e gravadas por vez
+IMPORT_CHUNK_SIZE = 2000
+
+# Limite de erros devolvidos (a validação continua até o fim do arquivo)
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_FIELDS = [
+    'title', 'brand', 'category', 'price', 'stock', 'dimension', 'unit_of_measurement', 'observation', 'is_active'
+]
+IMPORT_REQUIRED = ['title', 'category', 'price', 'unit_of_measurement']
+
+# Cabeçalhos aceitos: nome do campo ou rótulo, sem diferenciar maiúsculas (o mesmo formato da exportação)
+IMPORT_HEADERS = {
+    'unit': 'unit_of_measurement', 'unidade': 'unit_of_measurement', 'unidade de medida': 'unit_of_measurement',
+    'estoque': 'stock',
+}
+for _name in IMPORT_FIELDS:
+    IMPORT_HEADERS[_name] = _name
+    IMPORT_HEADERS[str(Product._meta.get_field(_name).verbose_name).lower()] = _name
+
+# Produtos já cadastrados (mesmo título, marca e categoria) são atualizados; o estoque só é
+# definido na criação, depois disso ele muda apenas por entradas e saídas
+UPDATE_FIELDS = [
+    'brand', 'category', 'price', 'dimension', 'unit_of_measurement', 'observation', 'is_active', 'updated_at'
+]
+
+TRUE_VALUES = {'1', 'true', 'sim', 's', 'yes', 'y', 'verdadeiro', 'ativo'}
+FALSE_VALUES = {'0', 'false', 'não', 'nao', 'n', 'no', 'falso', 'inativo'}
+
+
+def _header(row):
+    columns = {
+        index: IMPORT_HEADERS[str(name).strip().lower()]
+        for index, name in enumerate(row) if name is not None and str(name).strip().lower() in IMPORT_HEADERS
+    }
+    missing = [name for name in IMPORT_REQUIRED if name not in columns.values()]
+    if missing:
+        raise ValidationError(f"Colunas obrigatórias ausentes: {', '.join(missing)}.")
+    return columns
+
+
+# (número da linha no arquivo, {campo: valor}), ignorando linhas vazias
+def _records(rows):
+    rows = iter(rows)
+    columns = _header(next(rows, None) or [])
+    for line, row in enumerate(rows, start=2):
+        record = {field: row[index] for index, field in columns.items() if index < len(row)}
+        if any(value not in (None, '') for value in record.values()):
+            yield line, record
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+# Planilha em modo read_only: as linhas são lidas do arquivo conforme consumidas
+def _xlsx_rows(file):
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_records(file, filename):
+    rows = _xlsx_rows(file) if filename.lower().endswith('.xlsx') else _csv_rows(file)
+    try:
+        yield from _records(rows)
+    except (ValueError, KeyError, OSError, csv.Error, BadZipFile, InvalidFileException) as e:
+        raise ValidationError(f"Não foi possível ler o arquivo: {e}")
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _decimal(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return Decimal(str(value))
+    text = _text(value).replace('R$', '').strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    return Decimal(text)
+
+
+def _integer(value):
+    number = _decimal(value)
+    if number != number.to_integral_value():
+        raise InvalidOperation
+    return int(number)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text == '':
+        return True
+    if text in TRUE_VALUES or text in FALSE_VALUES:
+        return text in TRUE_VALUES
+    raise ValueError
+
+
+# Mapas nome -> id das tabelas de referência citadas no bloco, com uma consulta por tabela
+def _lookup_maps(records, create_missing):
+    names = {field: {_text(record.get(field)) for _, record in records} - {''} for field in ('brand', 'category')}
+    maps = {}
+    for field, model in (('brand', Brand), ('category', Category)):
+        maps[field] = {}
+        for pk, name in model.objects.filter(name__in=names[field]).order_by('-pk').values_list('pk', 'name'):
+            maps[field][name] = pk
+        missing = names[field] - set(maps[field])
+        if create_missing and missing:
+            for obj in model.objects.bulk_create(model(name=name) for name in sorted(missing)):
+                maps[field][obj.name] = obj.pk
+            invalidate_reference(model)
+
+    units = {_text(record.get('unit_of_measurement')) for _, record in records} - {''}
+    maps['unit_of_measurement'] = {}
+    for pk, name, symbol in UnitOfMeasurement.objects.filter(
+        Q(name__in=units) | Q(symbol__in=units)
+    ).values_list('pk', 'name', 'symbol'):
+        maps['unit_of_measurement'].setdefault(symbol, pk)
+        maps['unit_of_measurement'][name] = pk
+    return maps
+
+
+def _clean(record, maps):
+    errors = {}
+    values = {}
+
+    title = _text(record.get('title'))
+    if not title:
+        errors['title'] = ["Informe o título."]
+    elif len(title) > Product._meta.get_field('title').max_length:
+        errors['title'] = ["O título deve ter no máximo 100 caracteres."]
+    values['title'] = title
+
+    labels = {'brand': "Marca", 'category': "Categoria", 'unit_of_measurement': "Unidade de medida"}
+    for field, label in labels.items():
+        name = _text(record.get(field))
+        if not name:
+            if field != 'brand':
+                errors[field] = [f"Informe a {label.lower()}."]
+            values[f'{field}_id'] = None
+        elif name not in maps[field]:
+            errors[field] = [f"{label} '{name}' não encontrada."]
+        else:
+            values[f'{field}_id'] = maps[field][name]
+
+    try:
+        price = _decimal(record.get('price'))
+        if price < 0 or price.as_tuple().exponent < -2 or price >= Decimal('1e8'):
+            raise InvalidOperation
+        values['price'] = price
+    except (InvalidOperation, ValueError):
+        errors['price'] = ["Informe um preço válido, maior ou igual a zero e com até 2 casas decimais."]
+
+    try:
+        stock = 0 if _text(record.get('stock')) == '' else _integer(record.get('stock'))
+        if stock < 0:
+            raise InvalidOperation
+        values['stock'] = stock
+    except (InvalidOperation, ValueError):
+        errors['stock'] = ["O estoque deve ser um número inteiro maior ou igual a zero."]
+
+    try:
+        values['is_active'] = _boolean(record.get('is_active'))
+    except ValueError:
+        errors['is_active'] = ["Use sim/não, true/false ou 1/0."]
+
+    dimension = _text(record.get('dimension'))
+    if len(dimension) > Product._meta.get_field('dimension').max_length:
+        errors['dimension'] = ["A dimensão deve ter no máximo 100 caracteres."]
+    values['dimension'] = dimension or None
+    values['observation'] = _text(record.get('observation')) or None
+
+    if errors:
+        return None, errors
+    values['status'] = 'in_stock' if values['stock'] > 0 else 'out_of_stock'
+    return Product(**values), None
+
+
+# Grava um bloco validado: procura os existentes pela chave natural (título, marca, categoria)
+# em uma consulta, atualiza-os com bulk_create(update_conflicts=True) e insere os novos.
+# Devolve também o estado ({id: (estoque, status)}) dos criados, os únicos com estoque definido aqui.
+def _write(products):
+    by_key = {(product.title, product.brand_id, product.category_id): product for product in products}
+    existing = {}
+    for pk, *key in Product.objects.filter(
+        title__in={product.title for product in products}
+    ).order_by('pk').values_list('pk', 'title', 'brand_id', 'category_id'):
+        existing.setdefault(tuple(key), pk)
+
+    new, changed, states = [], [], {}
+    for key, product in by_key.items():
+        if key in existing:
+            product.pk = existing[key]
+            changed.append(product)
+        else:
+            new.append(product)
+
+    if changed:
+        Product.objects.bulk_create(
+            changed, update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS
+        )
+    if new:
+        # bulk_create não passa pelo save: nível de alerta e estoque baixo vêm dos limites da categoria
+        thresholds = {
+            pk: alert_level(min_stock, reorder_point) for pk, min_stock, reorder_point in Category.objects.filter(
+                pk__in={product.category_id for product in new}
+            ).values_list('pk', 'min_stock', 'reorder_point')
+        }
+        now = timezone.now()
+        for product in new:
+            product.alert_level = thresholds.get(product.category_id)
+            product.low_stock = product.alert_level is not None and product.stock <= product.alert_level
+            product.low_stock_since = now if product.low_stock else None
+        Product.objects.bulk_create(new)
+        states = {product.pk: (product.stock, product.status) for product in new if product.pk}
+        record_snapshots({pk: stock for pk, (stock, _) in states.items() if stock})
+    return len(new), len(changed), states
+
+
+# Importa registros (linha, {campo: valor}) em uma única transação, bloco a bloco. Se alguma linha
+# tiver erro, nada é gravado e os erros de todas as linhas são devolvidos.
+def import_records(records, create_missing=False):
+    result = {'rows': 0, 'created': 0, 'updated': 0, 'errors': []}
+    error_count = 0
+    states = {}
+    records = iter(records)
+    with transaction.atomic(using=router.db_for_write(Product)):
+        while chunk := list(islice(records, IMPORT_CHUNK_SIZE)):
+            result['rows'] += len(chunk)
+            maps = _lookup_maps(chunk, create_missing)
+            products = []
+            for line, record in chunk:
+                product, errors = _clean(record, maps)
+                if errors:
+                    error_count += 1
+                    if len(result['errors']) < IMPORT_MAX_ERRORS:
+                        result['errors'].append({"line": line, "errors": errors})
+                else:
+                    products.append(product)
+            if not error_count:
+                created, updated, changed = _write(products)
+                result['created'] += created
+                result['updated'] += updated
+                states.update(changed)
+
+        if error_count:
+            transaction.set_rollback(True)
+            result.update(created=0, updated=0, error_count=error_count)
+        else:
+            # Eventos gravados no fim, logo antes da confirmação: na leitura da outbox, os ids de
+            # uma importação longa não ficam atrás de eventos já visíveis de outras transações
+            record_stock_events(states)
+    return result
+
+
+# Importa um arquivo CSV (vírgula, ponto e vírgula ou tab; UTF-8) ou XLSX enviado
+def import_products(file, filename=None, create_missing=False):
+    return import_records(read_records(file, filename or file.name), create_missing)
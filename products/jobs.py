@@ -0,0 +1,156 @@
+import io
+import logging
+import tempfile
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files import File
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from .exports import export_columns, write_csv, write_xlsx
+from .models import Job
+from .reports import write_stock_pdf
+
+logger = logging.getLogger(__name__)
+
+# Tarefas em segundo plano sem broker externo: a fila é a tabela Job, e o comando run_jobs
+# reivindica cada tarefa com um UPDATE condicional (status='pending'), então vários workers
+# podem rodar ao mesmo tempo sem executar a mesma tarefa duas vezes.
+
+# Acima deste número de linhas, exportações do Admin e o PDF da API vão para a fila
+JOB_THRESHOLD = getattr(settings, 'JOB_THRESHOLD', 5000)
+
+# Intervalo mínimo entre gravações de progresso, em segundos
+PROGRESS_INTERVAL = 2
+
+# Tarefa em execução sem sinal há mais que isso é considerada abandonada (worker encerrado)
+# e volta para a fila
+STALE_AFTER = timedelta(minutes=10)
+
+# Tipo -> função(queryset, progress) que devolve (nome do arquivo, arquivo binário aberto, linhas)
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(function):
+        JOB_HANDLERS[kind] = function
+        return function
+    return register
+
+
+# A tarefa vai para a fila quando o queryset passa do limite (contagem limitada a JOB_THRESHOLD + 1)
+def should_enqueue(queryset):
+    return queryset.order_by()[:JOB_THRESHOLD + 1].count() > JOB_THRESHOLD
+
+
+# A tarefa guarda parâmetros em JSON, e não a consulta pronta, para continuar válida depois de
+# uma atualização do Django ou dos modelos. O worker remonta o queryset a partir de:
+#   {'filters': {lookup: valor}, 'ordering': [campos]}: filtros já validados por quem agendou
+#   {'changelist': 'query string'}: filtros, busca e ordenação do changelist do Admin, validados
+#   de novo pelo ModelAdmin com as permissões do usuário da tarefa
+def enqueue(kind, model, params, user=None):
+    return Job.objects.create(
+        kind=kind,
+        user=user if user is not None and user.is_authenticated else None,
+        model=model._meta.label_lower,
+        params=params,
+    )
+
+
+def changelist_queryset(model, query_string, user):
+    from django.contrib import admin
+
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(query_string)
+    request.user = user or AnonymousUser()
+    model_admin = admin.site._registry[model]
+    return model_admin.get_changelist_instance(request).get_queryset(request)
+
+
+def job_queryset(job):
+    model = apps.get_model(job.model)
+    if 'changelist' in job.params:
+        return changelist_queryset(model, job.params['changelist'], job.user)
+    queryset = model._default_manager.filter(**job.params.get('filters', {}))
+    if job.params.get('ordering'):
+        queryset = queryset.order_by(*job.params['ordering'])
+    return queryset
+
+
+# Grava o progresso no máximo a cada PROGRESS_INTERVAL segundos; serve também de sinal de vida
+class Progress:
+    def __init__(self, job):
+        self.job = job
+        self.last = 0
+
+    def __call__(self, done, total):
+        now = time.monotonic()
+        if now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        percent = min(99, done * 100 // total) if total else 0
+        Job.objects.filter(pk=self.job.pk).update(progress=percent, rows=done, heartbeat_at=timezone.now())
+
+
+@job_handler('export_csv')
+def export_csv_job(queryset, progress):
+    file = tempfile.TemporaryFile()
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    rows = write_csv(queryset, export_columns(queryset.model), text, progress)
+    text.flush()
+    text.detach()
+    return f'{queryset.model._meta.model_name}.csv', file, rows
+
+
+@job_handler('export_xlsx')
+def export_xlsx_job(queryset, progress):
+    file = tempfile.TemporaryFile()
+    title = queryset.model._meta.model_name.capitalize()
+    rows = write_xlsx(queryset, export_columns(queryset.model), file, title, progress)
+    return f'{queryset.model._meta.model_name}.xlsx', file, rows
+
+
+@job_handler('stock_pdf')
+def stock_pdf_job(queryset, progress):
+    file = tempfile.TemporaryFile()
+    rows = write_stock_pdf(file, queryset, progress)
+    return 'estoque.pdf', file, rows
+
+
+# Pega a tarefa mais antiga da fila; devolve None se não houver ou se outro worker a levou antes
+def claim_next_job():
+    pending = Job.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)
+    for pk in pending[:10]:
+        now = timezone.now()
+        if Job.objects.filter(pk=pk, status='pending').update(status='running', started_at=now, heartbeat_at=now):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale_jobs():
+    return Job.objects.filter(status='running', heartbeat_at__lt=timezone.now() - STALE_AFTER).update(
+        status='pending', progress=0, started_at=None, heartbeat_at=None
+    )
+
+
+def run_job(job):
+    try:
+        name, file, rows = JOB_HANDLERS[job.kind](job_queryset(job), Progress(job))
+        with file:
+            file.seek(0)
+            job.file.save(f'{job.pk}-{name}', File(file), save=False)
+        job.status = 'done'
+        job.progress = 100
+        job.rows = rows
+    except Exception as e:
+        logger.exception('Falha na tarefa %s', job.pk)
+        job.status = 'failed'
+        job.error = f'{type(e).__name__}: {e}'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'rows', 'file', 'error', 'finished_at'])
+    return job
@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.benchmarks import SCENARIOS, benchmark_database, compare_results, run_metadata
+
+
+class Command(BaseCommand):
+    help = 'Executa cenários de benchmark em um banco descartável e mostra as métricas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Cenários a executar (padrão: todos).')
+        parser.add_argument('--rows', type=int, help='Quantidade de linhas geradas para cada cenário.')
+        parser.add_argument('--json', dest='json_path', help='Grava os resultados em um arquivo JSON.')
+        parser.add_argument('--list', action='store_true', help='Lista os cenários disponíveis.')
+        parser.add_argument(
+            '--compare', dest='baseline_path',
+            help='Compara com um JSON gravado antes (--json), por exemplo no commit anterior.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=10.0,
+            help='Piora percentual a partir da qual a métrica é uma regressão (padrão: 10).'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Termina com erro se alguma métrica piorar além do limite (para uso em CI).'
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in SCENARIOS:
+                self.stdout.write(name)
+            return
+
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Cenário(s) desconhecido(s): {', '.join(unknown)}")
+
+        baseline = None
+        if options['baseline_path']:
+            with open(options['baseline_path']) as f:
+                baseline = json.load(f)
+            # Arquivos antigos guardavam só os cenários, sem metadados
+            baseline = baseline.get('scenarios', baseline)
+
+        kwargs = {'rows': options['rows']} if options['rows'] else {}
+        results = {}
+        for name in names:
+            with benchmark_database():
+                results[name] = SCENARIOS[name](**kwargs)
+            metrics = ', '.join(f'{key}={value}' for key, value in results[name].items())
+            self.stdout.write(f'{name}: {metrics}')
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'meta': run_metadata(), 'scenarios': results}, f, indent=2)
+
+        if baseline is not None:
+            regressions = self.compare(baseline, results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} métrica(s) pioraram mais de {options["threshold"]}%.')
+
+    def compare(self, baseline, results, threshold):
+        rows = compare_results(baseline, results, threshold)
+        for name, metric, before, after, change, regression in rows:
+            line = f'{name}.{metric}: {before} -> {after} ({change:+.1f}%)'
+            self.stdout.write(self.style.ERROR(line) if regression else line)
+        regressions = sum(1 for row in rows if row[-1])
+        self.stdout.write(f'{len(rows)} métrica(s) comparada(s), {regressions} regressão(ões).')
+        return regressions
@@ -0,0 +1,45 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.events import EVENT_BATCH_SIZE, dispatch_events, prune_events
+
+# Intervalo entre limpezas dos eventos fora da retenção, em segundos
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Entrega os eventos de estoque da outbox aos webhooks cadastrados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=1.0, help='Intervalo entre consultas à outbox, em segundos.')
+        parser.add_argument('--batch-size', type=int, default=EVENT_BATCH_SIZE, help='Eventos por requisição.')
+        parser.add_argument('--once', action='store_true', help='Faz um ciclo de entregas e termina.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            # SIGTERM/SIGINT: termina o ciclo atual e sai
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *args: stop.set())
+
+        last_prune = None
+        while not stop.is_set():
+            if last_prune is None or time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                pruned = prune_events()
+                if pruned:
+                    self.stdout.write(f'{pruned} evento(s) antigo(s) apagado(s).')
+                last_prune = time.monotonic()
+
+            delivered, failed = dispatch_events(max(1, options['batch_size']))
+            if delivered or failed:
+                self.stdout.write(f'{delivered} evento(s) entregue(s), {failed} webhook(s) com falha.')
+            if options['once']:
+                break
+            # Com entregas feitas, pode haver mais eventos pendentes: o próximo ciclo começa logo
+            if not delivered:
+                stop.wait(options['poll'])
+        connections.close_all()
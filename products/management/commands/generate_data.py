@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.datagen import generate_dataset
+
+LABELS = {
+    'brands': 'marcas', 'categories': 'categorias', 'units': 'unidades', 'products': 'produtos',
+    'entries': 'entradas', 'exits': 'saídas',
+}
+
+
+class Command(BaseCommand):
+    help = 'Gera um catálogo sintético com histórico de entradas e saídas coerente com o estoque.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brands', type=int, default=200, help='Quantidade de marcas.')
+        parser.add_argument('--categories', type=int, default=50, help='Quantidade de categorias.')
+        parser.add_argument('--units', type=int, default=10, help='Quantidade de unidades de medida.')
+        parser.add_argument('--products', type=int, default=1_000_000, help='Quantidade de produtos.')
+        parser.add_argument('--movements', type=int, default=10_000_000, help='Total de entradas e saídas.')
+        parser.add_argument('--users', type=int, default=5, help='Usuários que registram as movimentações.')
+        parser.add_argument('--days', type=int, default=365, help='Período do histórico, em dias até hoje.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Linhas por bulk_create.')
+        parser.add_argument('--seed', type=int, default=0, help='Semente: a mesma semente gera os mesmos dados.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        verbose = options['verbosity'] > 1
+        counts = generate_dataset(
+            brands=options['brands'], categories=options['categories'], units=options['units'],
+            products=options['products'], movements=options['movements'], users=options['users'],
+            days=options['days'], batch_size=options['batch_size'], seed=options['seed'],
+            progress=self.stdout.write if verbose else None,
+        )
+        summary = ', '.join(f'{count} {LABELS[name]}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Gerados: {summary} em {time.perf_counter() - start:.1f} s.'))
@@ -0,0 +1,64 @@
+import datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.reports import low_stock_digest
+
+
+class Command(BaseCommand):
+    help = 'Envia um único e-mail com o resumo dos produtos com estoque baixo (para agendar, por exemplo, diariamente).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=24,
+            help='Produtos que entraram em estoque baixo nas últimas N horas aparecem como novos (padrão: 24).'
+        )
+        parser.add_argument(
+            '--to', nargs='+', metavar='EMAIL',
+            help='Destinatários (padrão: LOW_STOCK_DIGEST_RECIPIENTS ou os usuários da equipe com e-mail).'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Mostra o resumo sem enviar.')
+
+    def handle(self, *args, **options):
+        digest = low_stock_digest(since=timezone.now() - datetime.timedelta(hours=options['hours']))
+        if not digest['total']:
+            self.stdout.write('Nenhum produto com estoque baixo.')
+            return
+
+        subject = (
+            f"Estoque baixo: {digest['total']} produto(s), {digest['critical']} abaixo do mínimo, "
+            f"{digest['new']} novo(s)"
+        )
+        body = self.render(digest)
+        recipients = options['to'] or settings.LOW_STOCK_DIGEST_RECIPIENTS or list(
+            User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True)
+        )
+        if options['dry_run'] or not recipients:
+            self.stdout.write(f'{subject}\n\n{body}')
+            if not recipients:
+                self.stdout.write(self.style.WARNING('Nenhum destinatário configurado; o resumo não foi enviado.'))
+            return
+
+        send_mail(subject, body, None, recipients)
+        self.stdout.write(self.style.SUCCESS(f'Resumo enviado para {len(recipients)} destinatário(s).'))
+
+    def render(self, digest):
+        lines = []
+        for product in digest['products']:
+            marks = ''.join(mark for flag, mark in ((product['critical'], '!'), (product['new'], '*')) if flag)
+            symbol = product['unit_of_measurement__symbol']
+            unit = f' {symbol}' if symbol else ''
+            lines.append(
+                f"{marks:2} #{product['id']} {product['title']}: {product['stock']}{unit} "
+                f"(alerta em {product['alert_level']})"
+            )
+        hidden = digest['total'] - len(digest['products'])
+        if hidden:
+            lines.append(f'... e mais {hidden} produto(s).')
+        lines.append('')
+        lines.append('! abaixo do estoque mínimo   * novo no período')
+        return '\n'.join(lines)
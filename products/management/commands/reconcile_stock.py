@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.models import StockReconciliation
+from products.services import fix_stock_drift, stock_drift
+
+
+class Command(BaseCommand):
+    help = 'Compara o estoque de cada produto com o total de entradas menos saídas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Corrige o estoque dos produtos divergentes.')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Verifica apenas os produtos alterados desde a última conciliação concluída.'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['incremental']:
+            last = StockReconciliation.objects.filter(finished_at__isnull=False).first()
+            since = last.started_at if last else None
+
+        run = StockReconciliation.objects.create(
+            started_at=timezone.now(), incremental=options['incremental'], checked_since=since
+        )
+
+        drift = list(stock_drift(since))
+        for pk, title, stock, expected in drift:
+            self.stdout.write(f'#{pk} {title}: estoque {stock}, movimentações {expected} ({expected - stock:+d})')
+
+        run.drifted = len(drift)
+        if options['fix'] and drift:
+            run.fixed = fix_stock_drift(drift)
+        run.finished_at = timezone.now()
+        run.save()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.drifted} produto(s) divergente(s), {run.fixed} corrigido(s).'
+        ))
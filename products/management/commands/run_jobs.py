@@ -0,0 +1,50 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano (exportações e relatórios) da fila no banco.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Tarefas executadas ao mesmo tempo.')
+        parser.add_argument('--poll', type=float, default=2.0, help='Intervalo entre consultas à fila, em segundos.')
+        parser.add_argument('--once', action='store_true', help='Esvazia a fila e termina.')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            # SIGTERM/SIGINT: para de pegar tarefas e espera as que estão em execução
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *args: stop.set())
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'{requeued} tarefa(s) abandonada(s) de volta na fila.')
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job') as pool:
+            while not stop.is_set():
+                running = {future for future in running if not future.done()}
+                job = claim_next_job() if len(running) < workers else None
+                if job is not None:
+                    running.add(pool.submit(self.run, job))
+                    continue
+                if options['once'] and not running:
+                    break
+                stop.wait(options['poll'] if len(running) < workers else 0.2)
+        connections.close_all()
+
+    def run(self, job):
+        try:
+            job = run_job(job)
+            self.stdout.write(f'{job}: {job.rows or 0} linha(s)' + (f' - {job.error}' if job.error else ''))
+        finally:
+            # Cada thread do pool tem as próprias conexões
+            connections.close_all()
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_alter_product_unit_of_measurement_entry_exit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='brand',
+            index=models.Index(fields=['name'], name='brand_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['name'], name='category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['date'], name='entry_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['product', 'date'], name='entry_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exit',
+            index=models.Index(fields=['date'], name='exit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exit',
+            index=models.Index(fields=['product', 'date'], name='exit_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['title'], name='product_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'is_active', 'title'], name='product_status_active_idx'),
+        ),
+    ]
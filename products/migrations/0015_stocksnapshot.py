@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_movement_and_product_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Data')),
+                ('closing_stock', models.IntegerField(verbose_name='Estoque de Fechamento')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Estoque',
+                'verbose_name_plural': 'Fechamentos de Estoque',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'date'), name='unique_product_snapshot_date')],
+            },
+        ),
+    ]
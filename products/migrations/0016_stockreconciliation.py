@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Iniciada em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+                ('incremental', models.BooleanField(default=False, verbose_name='Incremental')),
+                ('checked_since', models.DateTimeField(blank=True, null=True, verbose_name='Alterações desde')),
+                ('drifted', models.PositiveIntegerField(default=0, verbose_name='Divergências')),
+                ('fixed', models.PositiveIntegerField(default=0, verbose_name='Corrigidos')),
+            ],
+            options={
+                'verbose_name': 'Conciliação de Estoque',
+                'verbose_name_plural': 'Conciliações de Estoque',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+from products.search import install_sqlite_search, uninstall_sqlite_search
+
+
+# Índices de busca textual de produtos, conforme o banco em uso
+def install_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        install_sqlite_search(schema_editor)
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS product_title_trgm_idx ON products_product USING gin (title gin_trgm_ops)'
+        )
+
+
+def uninstall_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        uninstall_sqlite_search(schema_editor)
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_product_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('export_csv', 'Exportação CSV'), ('export_xlsx', 'Exportação XLSX'), ('stock_pdf', 'Relatório de estoque (PDF)')], max_length=30, verbose_name='Tipo')),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('running', 'Em execução'), ('done', 'Concluída'), ('failed', 'Falhou')], default='pending', max_length=20, verbose_name='Status')),
+                ('model', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('params', models.JSONField(default=dict, verbose_name='Parâmetros')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)')),
+                ('rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Linhas')),
+                ('file', models.FileField(blank=True, upload_to='jobs/%Y/%m/', verbose_name='Arquivo')),
+                ('error', models.TextField(blank=True, verbose_name='Erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criada em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciada em')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Último sinal')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='job_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome')),
+                ('url', models.URLField(max_length=500, verbose_name='URL')),
+                ('secret', models.CharField(blank=True, help_text='Assina o corpo com HMAC-SHA256 no cabeçalho X-Inventory-Signature.', max_length=200, verbose_name='Segredo')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('cursor', models.BigIntegerField(default=0, verbose_name='Último evento entregue')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Falhas seguidas')),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Próxima tentativa')),
+                ('last_delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Última entrega')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Webhook',
+                'verbose_name_plural': 'Webhooks',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField(verbose_name='Estoque')),
+                ('status', models.CharField(choices=[('in_stock', 'Em Estoque'), ('temporarily_unavailable', 'Indisponível'), ('out_of_stock', 'Esgotado')], max_length=50, verbose_name='Status')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('product', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Evento de Estoque',
+                'verbose_name_plural': 'Eventos de Estoque',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['created_at'], name='stock_event_created_idx')],
+            },
+        ),
+    ]
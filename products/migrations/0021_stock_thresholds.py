@@ -0,0 +1,68 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+from products.search import install_sqlite_search, uninstall_sqlite_search
+
+
+# No SQLite, adicionar ou remover low_stock (NOT NULL) recria a tabela de produtos, o que falha
+# com os triggers da busca textual que a referenciam: a busca sai antes e volta depois, nos dois sentidos
+def install_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        install_sqlite_search(schema_editor)
+
+
+def uninstall_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        uninstall_sqlite_search(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_stock_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_search, install_search),
+        migrations.AddField(
+            model_name='category',
+            name='min_stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Vale para os produtos da categoria sem limites próprios.', null=True, verbose_name='Estoque Mínimo'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='reorder_point',
+            field=models.PositiveIntegerField(blank=True, help_text='Vale para os produtos da categoria sem limites próprios.', null=True, verbose_name='Ponto de Pedido'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='alert_level',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Nível de Alerta'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Estoque Baixo'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Estoque Baixo Desde'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Em branco (junto com o ponto de pedido), vale o da categoria.', null=True, verbose_name='Estoque Mínimo'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_point',
+            field=models.PositiveIntegerField(blank=True, help_text='Em branco (junto com o estoque mínimo), vale o da categoria.', null=True, verbose_name='Ponto de Pedido'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['title', 'id'], name='product_low_stock_idx'),
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
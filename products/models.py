@@ -1,6 +1,30 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.utils import timezone
+
+
+# Nível de alerta de estoque baixo: o maior entre o estoque mínimo e o ponto de pedido informados
+def alert_level(min_stock, reorder_point):
+    levels = [level for level in (min_stock, reorder_point) if level is not None]
+    return max(levels) if levels else None
+
+
+# Quanto a movimentação acrescenta ao produto ao ser salva: a quantidade inteira se for nova (ou
+# trocar de produto) e só a diferença em uma edição; a validação olha só esse acréscimo
+def movement_increase(movement):
+    if movement.pk and not movement._state.adding:
+        previous = type(movement).objects.filter(pk=movement.pk).values_list('product_id', 'quantity').first()
+        if previous and previous[0] == movement.product_id:
+            return movement.quantity - previous[1]
+    return movement.quantity
+
+
+def validate_stock_thresholds(min_stock, reorder_point):
+    if min_stock is not None and reorder_point is not None and reorder_point < min_stock:
+        raise ValidationError({'reorder_point': "O ponto de pedido não pode ser menor que o estoque mínimo."})
+
 
 class Brand(models.Model):
     name = models.CharField(max_length=100, verbose_name='Nome')
@@ -12,6 +36,7 @@ class Brand(models.Model):
         ordering = ['name']
         verbose_name = 'Marca'
         verbose_name_plural = 'Marcas'
+        indexes = [models.Index(fields=['name'], name='brand_name_idx')]
 
     def __str__(self):
         return self.name
@@ -20,6 +45,14 @@ class Brand(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name='Nome')
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
+    min_stock = models.PositiveIntegerField(
+        verbose_name='Estoque Mínimo', blank=True, null=True,
+        help_text='Vale para os produtos da categoria sem limites próprios.'
+    )
+    reorder_point = models.PositiveIntegerField(
+        verbose_name='Ponto de Pedido', blank=True, null=True,
+        help_text='Vale para os produtos da categoria sem limites próprios.'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
@@ -27,9 +60,34 @@ class Category(models.Model):
         ordering = ['name']
         verbose_name = 'Categoria'
         verbose_name_plural = 'Categorias'
+        indexes = [models.Index(fields=['name'], name='category_name_idx')]
 
     def __str__(self):
         return self.name
+
+    # Guarda os limites lidos do banco para só recalcular os produtos quando eles mudarem
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'min_stock' in field_names and 'reorder_point' in field_names:
+            instance._loaded_thresholds = (
+                values[field_names.index('min_stock')], values[field_names.index('reorder_point')]
+            )
+        return instance
+
+    def clean(self):
+        validate_stock_thresholds(self.min_stock, self.reorder_point)
+
+    def save(self, *args, **kwargs):
+        from .services import apply_category_thresholds
+
+        thresholds = (self.min_stock, self.reorder_point)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if thresholds != getattr(self, '_loaded_thresholds', (None, None)):
+                apply_category_thresholds(self, using=using)
+        self._loaded_thresholds = thresholds
     
 
 class UnitOfMeasurement(models.Model):
@@ -66,6 +124,14 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
     dimension = models.CharField(max_length=100, verbose_name='Dimensão', blank=True, null=True)
     stock = models.IntegerField(verbose_name='Estoque Atual', default=0)
+    min_stock = models.PositiveIntegerField(
+        verbose_name='Estoque Mínimo', blank=True, null=True,
+        help_text='Em branco (junto com o ponto de pedido), vale o da categoria.'
+    )
+    reorder_point = models.PositiveIntegerField(
+        verbose_name='Ponto de Pedido', blank=True, null=True,
+        help_text='Em branco (junto com o estoque mínimo), vale o da categoria.'
+    )
     unit_of_measurement = models.ForeignKey(
         UnitOfMeasurement, on_delete=models.PROTECT, verbose_name='Un. de Medida'
     )
@@ -73,6 +139,13 @@ class Product(models.Model):
     status = models.CharField(
         max_length=50, choices=STATUS_CHOICES, default='in_stock', verbose_name='Status'
     )
+    # Mantidos no mesmo UPDATE que altera o estoque (services.change_stock): nível de alerta efetivo
+    # (limites do produto ou da categoria) e se o estoque está nele ou abaixo, desde quando
+    alert_level = models.PositiveIntegerField(verbose_name='Nível de Alerta', blank=True, null=True, editable=False)
+    low_stock = models.BooleanField(default=False, verbose_name='Estoque Baixo', editable=False)
+    low_stock_since = models.DateTimeField(
+        verbose_name='Estoque Baixo Desde', blank=True, null=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
@@ -80,86 +153,321 @@ class Product(models.Model):
         ordering = ['title']
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
+        indexes = [
+            models.Index(fields=['title'], name='product_title_idx'),
+            models.Index(fields=['status', 'is_active', 'title'], name='product_status_active_idx'),
+            models.Index(fields=['updated_at'], name='product_updated_at_idx'),
+            # Índice parcial: só os produtos com estoque baixo, na ordem da listagem (título, id)
+            models.Index(
+                fields=['title', 'id'], condition=models.Q(low_stock=True), name='product_low_stock_idx'
+            ),
+        ]
 
     def __str__(self):
         brand_name = self.brand.name if self.brand else "Sem Marca"
         category_name = self.category.name if self.category else "Sem Categoria"
         return f"{self.title} ({brand_name} - {category_name})"
 
+    # Guarda o estoque e o status lidos do banco para detectar alterações diretas no save
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'stock' in field_names:
+            instance._loaded_stock = values[field_names.index('stock')]
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+
+    # Limites do produto; sem nenhum dos dois informado, os da categoria
+    def stock_thresholds(self):
+        if self.min_stock is None and self.reorder_point is None and self.category_id:
+            return self.category.min_stock, self.category.reorder_point
+        return self.min_stock, self.reorder_point
+
+    def clean(self):
+        validate_stock_thresholds(self.min_stock, self.reorder_point)
+
+    # O refresh copia os valores de uma instância nova (a que passa pelo from_db) para esta
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'stock' in fields:
+            self._loaded_stock = self.stock
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
+
     def save(self, *args, **kwargs):
+        from .services import record_snapshots, record_stock_events
+
         # Atualiza o status com base no estoque
         if self.stock <= 0:
             self.status = 'out_of_stock'
         elif self.status == 'out_of_stock' and self.stock > 0:
             self.status = 'in_stock'
-        
-        # Chama o método save da superclasse
-        super().save(*args, **kwargs)
+
+        # Nível de alerta e estoque baixo
+        self.alert_level = alert_level(*self.stock_thresholds())
+        low_stock = self.alert_level is not None and self.stock <= self.alert_level
+        self.low_stock_since = (self.low_stock_since or timezone.now()) if low_stock else None
+        self.low_stock = low_stock
+
+        stock_changed = self.stock != getattr(self, '_loaded_stock', None)
+        status_changed = self.status != getattr(self, '_loaded_status', None)
+
+        # Chama o método save da superclasse (no mesmo banco em que o produto é gravado)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if stock_changed:
+                record_snapshots({self.pk: self.stock}, using=using)
+            if stock_changed or status_changed:
+                record_stock_events({self.pk: (self.stock, self.status)}, using=using)
+        self._loaded_stock = self.stock
+        self._loaded_status = self.status
+
+
+# Marca produtos como alterados para a conciliação incremental (reconcile_stock) verificá-los
+def touch_products(product_ids, using=None):
+    Product.objects.using(using).filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+# Uma movimentação apagada não deixa rastro: a exclusão marca os produtos afetados em um único
+# UPDATE. Não há sinais de exclusão nas movimentações, então as cascatas (do produto ou do
+# usuário, ver signals.py) continuam no caminho rápido, com um DELETE sem carregar as linhas.
+class MovementQuerySet(models.QuerySet):
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            touch_products(self.values('product_id'), using=self.db)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
-class Entry(models.Model):
+class MovementDeleteMixin:
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            touch_products([self.product_id], using=using)
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class Entry(MovementDeleteMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Produto')
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Usuário')
     quantity = models.PositiveIntegerField(verbose_name='Quantidade')
     date = models.DateTimeField(auto_now_add=True, verbose_name='Data')
 
+    objects = MovementQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date']
         verbose_name = 'Entrada'
         verbose_name_plural = 'Entradas'
+        indexes = [
+            models.Index(fields=['date'], name='entry_date_idx'),
+            models.Index(fields=['product', 'date'], name='entry_product_date_idx'),
+        ]
 
     def clean(self):
         if self.quantity is None or self.quantity <= 0:
             raise ValidationError("A quantidade de entrada deve ser maior que 0.")
-        if not self.product.is_active:
+        if movement_increase(self) > 0 and not self.product.is_active:
             raise ValidationError("Não é possível adicionar entradas para produtos que não estão ativos.")
 
     def save(self, *args, **kwargs):
         # Chama a validação antes de salvar
         self.clean()
 
-        # Atualiza o estoque do produto
-        self.product.stock += self.quantity  # Adiciona ao estoque
-        self.product.save()
+        # Atualiza o estoque do produto e grava a entrada na mesma transação
+        from .services import apply_movement
 
-        # Chama o método save da superclasse
-        super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            apply_movement(self, 1, using=using)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Entrada de {self.quantity} {self.product.unit_of_measurement.symbol} de {self.product.title} por {self.user.username}"
 
 
-class Exit(models.Model):
+class Exit(MovementDeleteMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Produto')
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Usuário')
     quantity = models.PositiveIntegerField(verbose_name='Quantidade')
     date = models.DateTimeField(auto_now_add=True, verbose_name='Data')
 
+    objects = MovementQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date']
         verbose_name = 'Saída'
         verbose_name_plural = 'Saídas'
+        indexes = [
+            models.Index(fields=['date'], name='exit_date_idx'),
+            models.Index(fields=['product', 'date'], name='exit_product_date_idx'),
+        ]
 
+    # Em edições, só o acréscimo à saída é validado; o estoque insuficiente é decidido de novo pelo
+    # UPDATE condicional de services.change_stock
     def clean(self):
         if self.quantity is None or self.quantity <= 0:
             raise ValidationError("A quantidade de saída deve ser maior que 0.")
+        increase = movement_increase(self)
+        if increase <= 0:
+            return
         if self.product.status == 'temporarily_unavailable':
             raise ValidationError("Não é possível retirar produtos que estão indisponíveis.")
         if not self.product.is_active:
             raise ValidationError("Não é possível retirar produtos que não estão ativos.")
-        if self.quantity > self.product.stock:
+        if increase > self.product.stock:
             raise ValidationError(f"Não é possível sair mais do que o estoque disponível ({self.product.stock}).")
 
     def save(self, *args, **kwargs):
         # Chama a validação antes de salvar
         self.clean()
 
-        # Atualiza o estoque do produto
-        self.product.stock -= self.quantity  # Subtrai do estoque
-        self.product.save()
+        # Atualiza o estoque do produto e grava a saída na mesma transação
+        from .services import apply_movement
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            apply_movement(self, -1, using=using)
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Saída de {self.quantity} {self.product.unit_of_measurement.symbol} de {self.product.title} por {self.user.username}"
+
+
+# Saldo de fechamento diário por produto, mantido a cada movimentação.
+# Permite consultar o estoque em uma data passada sem somar todo o histórico.
+class StockSnapshot(models.Model):
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, verbose_name='Produto', related_name='snapshots'
+    )
+    date = models.DateField(verbose_name='Data')
+    closing_stock = models.IntegerField(verbose_name='Estoque de Fechamento')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Fechamento de Estoque'
+        verbose_name_plural = 'Fechamentos de Estoque'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_product_snapshot_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.title} em {self.date:%d/%m/%Y}: {self.closing_stock}"
+
+
+# Registro de cada execução da conciliação de estoque (comando reconcile_stock)
+class StockReconciliation(models.Model):
+    started_at = models.DateTimeField(verbose_name='Iniciada em')
+    finished_at = models.DateTimeField(verbose_name='Concluída em', blank=True, null=True)
+    incremental = models.BooleanField(default=False, verbose_name='Incremental')
+    checked_since = models.DateTimeField(verbose_name='Alterações desde', blank=True, null=True)
+    drifted = models.PositiveIntegerField(default=0, verbose_name='Divergências')
+    fixed = models.PositiveIntegerField(default=0, verbose_name='Corrigidos')
+
+    class Meta:
+        ordering = ['-started_at']
+        verbose_name = 'Conciliação de Estoque'
+        verbose_name_plural = 'Conciliações de Estoque'
+
+    def __str__(self):
+        return f"Conciliação de {self.started_at:%d/%m/%Y %H:%M}"
+
+
+# Tarefa em segundo plano (exportações e relatórios grandes), executada pelo comando run_jobs.
+# Os parâmetros da consulta de origem são guardados em JSON e o worker remonta o queryset a partir
+# deles (ver jobs.enqueue).
+class Job(models.Model):
+    KIND_CHOICES = [
+        ('export_csv', 'Exportação CSV'),
+        ('export_xlsx', 'Exportação XLSX'),
+        ('stock_pdf', 'Relatório de estoque (PDF)'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Em execução'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, verbose_name='Tipo')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Status')
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, verbose_name='Usuário', related_name='jobs', blank=True, null=True
+    )
+    model = models.CharField(max_length=100, verbose_name='Modelo')
+    # Parâmetros da consulta, remontada pelo worker (ver jobs.enqueue)
+    params = models.JSONField(default=dict, verbose_name='Parâmetros')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)')
+    rows = models.PositiveIntegerField(verbose_name='Linhas', blank=True, null=True)
+    file = models.FileField(upload_to='jobs/%Y/%m/', verbose_name='Arquivo', blank=True)
+    error = models.TextField(verbose_name='Erro', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criada em')
+    started_at = models.DateTimeField(verbose_name='Iniciada em', blank=True, null=True)
+    heartbeat_at = models.DateTimeField(verbose_name='Último sinal', blank=True, null=True)
+    finished_at = models.DateTimeField(verbose_name='Concluída em', blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
 
-        # Chama o método save da superclasse
-        super().save(*args, **kwargs)
+
+# Outbox das mudanças de estoque e status: cada alteração grava, na mesma transação, o estado
+# novo do produto. Os eventos são entregues aos webhooks pelo comando dispatch_events e lidos
+# pelo feed /api/stock-events/, sempre em ordem de id (o cursor dos consumidores).
+class StockEvent(models.Model):
+    # Sem restrição de chave estrangeira: o histórico continua válido depois que o produto é excluído
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        verbose_name='Produto', related_name='+'
+    )
+    stock = models.IntegerField(verbose_name='Estoque')
+    status = models.CharField(max_length=50, choices=Product.STATUS_CHOICES, verbose_name='Status')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento de Estoque'
+        verbose_name_plural = 'Eventos de Estoque'
+        indexes = [models.Index(fields=['created_at'], name='stock_event_created_idx')]
 
     def __str__(self):
-        return f"Saída de {self.quantity} {self.product.unit_of_measurement.symbol} de {self.product.title} por {self.user.username}"
\ No newline at end of file
+        return f"#{self.pk}: produto {self.product_id} com {self.stock} ({self.status})"
+
+
+# Destino dos eventos de estoque: recebe POSTs em lotes e guarda o cursor (último evento entregue).
+# Em caso de falha, a entrega é repetida com espera crescente (next_attempt_at).
+class WebhookSubscription(models.Model):
+    name = models.CharField(max_length=100, verbose_name='Nome')
+    url = models.URLField(max_length=500, verbose_name='URL')
+    secret = models.CharField(
+        max_length=200, blank=True, verbose_name='Segredo',
+        help_text='Assina o corpo com HMAC-SHA256 no cabeçalho X-Inventory-Signature.'
+    )
+    is_active = models.BooleanField(default=True, verbose_name='Ativo')
+    cursor = models.BigIntegerField(default=0, verbose_name='Último evento entregue')
+    failures = models.PositiveIntegerField(default=0, verbose_name='Falhas seguidas')
+    next_attempt_at = models.DateTimeField(verbose_name='Próxima tentativa', blank=True, null=True)
+    last_delivered_at = models.DateTimeField(verbose_name='Última entrega', blank=True, null=True)
+    last_error = models.TextField(verbose_name='Último erro', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Webhook'
+        verbose_name_plural = 'Webhooks'
+
+    def __str__(self):
+        return self.name
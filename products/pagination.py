@@ -0,0 +1,31 @@
+from rest_framework.pagination import CursorPagination
+
+
+# Paginação por cursor: o custo de cada página não depende da profundidade.
+# O cursor guarda só o valor do primeiro campo da ordenação mais um deslocamento entre os empatados;
+# o id no final fixa a ordem desses empatados entre requisições, para que o deslocamento aponte
+# sempre para os mesmos registros. Muitos empates no primeiro campo tornam o deslocamento caro.
+class InventoryCursorPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-id',)
+
+
+class TitleCursorPagination(InventoryCursorPagination):
+    ordering = ('title', 'id')
+
+
+class NameCursorPagination(InventoryCursorPagination):
+    ordering = ('name', 'id')
+
+
+class DateCursorPagination(InventoryCursorPagination):
+    ordering = ('-date', '-id')
+
+
+class ActionTimeCursorPagination(InventoryCursorPagination):
+    ordering = ('-action_time', '-id')
+
+
+class UsernameCursorPagination(InventoryCursorPagination):
+    ordering = ('username', 'id')
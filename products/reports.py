@@ -0,0 +1,235 @@
+import hashlib
+import tempfile
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, Count, DateField, DecimalField, ExpressionWrapper, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth
+from django.http import FileResponse
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+from .models import Product, Entry, Exit
+from .services import BELOW_MINIMUM, low_stock_products
+
+# Linhas de produtos por página do relatório em PDF
+PDF_ROWS_PER_PAGE = 40
+
+PDF_HEADER = ['Produto', 'Marca', 'Categoria', 'Estoque', 'Un.', 'Status', 'Preço', 'Valor']
+PDF_COLUMN_WIDTHS = [53 * mm, 25 * mm, 25 * mm, 14 * mm, 10 * mm, 22 * mm, 16 * mm, 20 * mm]
+
+PDF_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 7),
+    ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 7),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('ALIGN', (3, 0), (3, -1), 'RIGHT'),
+    ('ALIGN', (6, 0), (-1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+])
+
+
+# Valor em estoque (preço x quantidade), calculado no banco
+def valuation_expression():
+    return ExpressionWrapper(
+        F('price') * F('stock'), output_field=DecimalField(max_digits=20, decimal_places=2)
+    )
+
+
+# Resultados dos relatórios analíticos ficam em cache; a chave inclui a última movimentação e a
+# última alteração de produto, então qualquer gravação gera uma chave nova. Exclusões de
+# movimentações não mudam essas marcas e aparecem ao expirar o cache.
+REPORT_CACHE_TIMEOUT = 300
+
+PERIODS = {'day': TruncDay, 'month': TruncMonth}
+
+
+def _money(value):
+    return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+
+# Marca d'água dos dados: consultas de Max() resolvidas pelos índices de data e de updated_at
+def report_watermark():
+    return (
+        Entry.objects.aggregate(last=Max('date'), id=Max('pk')),
+        Exit.objects.aggregate(last=Max('date'), id=Max('pk')),
+        Product.objects.aggregate(last=Max('updated_at')),
+    )
+
+
+def cached_report(name, params, producer):
+    key = f'{name}:{sorted(params.items())}:{report_watermark()}'
+    key = f'report:{name}:{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}'
+    result = cache.get(key)
+    if result is None:
+        result = producer()
+        cache.set(key, result, REPORT_CACHE_TIMEOUT)
+    return result
+
+
+def _valuation_groups(queryset, field):
+    rows = (
+        queryset.values(field, f'{field}__name')
+        .annotate(products=Count('pk'), units=Sum('stock'), value=Sum(valuation_expression()))
+        .order_by('-value', f'{field}__name')
+    )
+    return [
+        {
+            'id': row[field], 'name': row[f'{field}__name'], 'products': row['products'],
+            'stock': row['units'], 'value': _money(row['value']),
+        }
+        for row in rows
+    ]
+
+
+# Valor do estoque (preço x quantidade): total, por categoria e por marca, agregados no banco
+def stock_valuation(queryset=None):
+    queryset = Product.objects.all() if queryset is None else queryset
+    totals = queryset.aggregate(
+        products=Count('pk'), units=Coalesce(Sum('stock'), 0), value=Sum(valuation_expression())
+    )
+    return {
+        'products': totals['products'],
+        'stock': totals['units'],
+        'value': _money(totals['value']),
+        'by_category': _valuation_groups(queryset, 'category'),
+        'by_brand': _valuation_groups(queryset, 'brand'),
+    }
+
+
+# Entradas x saídas por dia ou mês (no fuso local), com filtros opcionais de período e produto
+def movement_summary(period='day', start=None, end=None, **filters):
+    trunc = PERIODS[period]
+    summary = {}
+    for model, name in ((Entry, 'entries'), (Exit, 'exits')):
+        queryset = model.objects.filter(**filters)
+        if start:
+            queryset = queryset.filter(date__gte=start)
+        if end:
+            queryset = queryset.filter(date__lte=end)
+        rows = (
+            queryset.annotate(period=trunc('date', output_field=DateField()))
+            .values('period').annotate(quantity=Sum('quantity'), count=Count('pk'))
+            .order_by('period').values_list('period', 'quantity', 'count')
+        )
+        for day, quantity, count in rows:
+            row = summary.setdefault(day, {
+                'period': day, 'entries': 0, 'entry_count': 0, 'exits': 0, 'exit_count': 0,
+            })
+            row[name] = quantity
+            row['entry_count' if model is Entry else 'exit_count'] = count
+
+    result = [summary[day] for day in sorted(summary)]
+    for row in result:
+        row['net'] = row['entries'] - row['exits']
+    return result
+
+
+# Linhas do relatório de estoque, lidas em blocos com os nomes relacionados por JOIN
+def stock_report_rows(queryset, chunk_size=2000):
+    return queryset.annotate(valuation=valuation_expression()).values_list(
+        'title', 'brand__name', 'category__name', 'stock', 'unit_of_measurement__symbol',
+        'status', 'price', 'valuation'
+    ).iterator(chunk_size=chunk_size)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Gera o relatório de estoque em PDF, uma página por bloco de linhas lido do banco.
+# `progress(done, total)` é chamado a cada página, para acompanhamento em segundo plano.
+def write_stock_pdf(file, queryset=None, progress=None):
+    queryset = Product.objects.all() if queryset is None else queryset
+    total = queryset.count() if progress else None
+    status_labels = dict(Product.STATUS_CHOICES)
+    width, height = letter
+    generated_at = timezone.localtime().strftime('%d/%m/%Y %H:%M')
+
+    pdf = canvas.Canvas(file, pagesize=letter, pageCompression=1)
+    pdf.setTitle('Relatório de Estoque')
+
+    done = 0
+    page = 0
+    total_stock = 0
+    total_value = Decimal('0')
+    for chunk in _chunks(stock_report_rows(queryset), PDF_ROWS_PER_PAGE):
+        page += 1
+        data = [PDF_HEADER]
+        for title, brand, category, stock, unit, status, price, valuation in chunk:
+            data.append([
+                title[:45], brand or '', category, stock, unit or '',
+                status_labels.get(status, status), f'{price:.2f}', f'{valuation:.2f}'
+            ])
+            total_stock += stock
+            total_value += valuation
+
+        _draw_page(pdf, data, page, generated_at, width, height)
+        done += len(chunk)
+        if progress:
+            progress(done, total)
+
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.drawString(15 * mm, height - 20 * mm, 'Resumo')
+    pdf.setFont('Helvetica', 9)
+    pdf.drawString(15 * mm, height - 28 * mm, f'Produtos: {done}')
+    pdf.drawString(15 * mm, height - 34 * mm, f'Itens em estoque: {total_stock}')
+    pdf.drawString(15 * mm, height - 40 * mm, f'Valor total em estoque: {total_value:.2f}')
+    pdf.showPage()
+    pdf.save()
+    return done
+
+
+def _draw_page(pdf, data, page, generated_at, width, height):
+    pdf.setFont('Helvetica-Bold', 11)
+    pdf.drawString(15 * mm, height - 15 * mm, 'Relatório de Estoque')
+    pdf.setFont('Helvetica', 7)
+    pdf.drawRightString(width - 15 * mm, height - 15 * mm, f'Gerado em {generated_at} - página {page}')
+
+    table = Table(data, colWidths=PDF_COLUMN_WIDTHS, repeatRows=1)
+    table.setStyle(PDF_TABLE_STYLE)
+    _, table_height = table.wrapOn(pdf, width - 30 * mm, height - 30 * mm)
+    table.drawOn(pdf, 15 * mm, height - 22 * mm - table_height)
+    pdf.showPage()
+
+
+# Resposta com o relatório em PDF, gerado em arquivo temporário
+def stock_pdf_response(queryset=None, filename='estoque'):
+    file = tempfile.TemporaryFile()
+    write_stock_pdf(file, queryset)
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=f'{filename}.pdf', content_type='application/pdf')
+
+
+# Produtos listados no resumo de estoque baixo; os demais entram só nas contagens
+DIGEST_MAX_ROWS = 200
+
+
+# Resumo de estoque baixo (comando low_stock_digest): contagens e os produtos, os abaixo do mínimo
+# primeiro, marcando os que entraram em estoque baixo desde `since`. Lê só o conjunto marcado
+# em low_stock (índice parcial), qualquer que seja o tamanho do catálogo.
+def low_stock_digest(since=None, limit=DIGEST_MAX_ROWS):
+    queryset = low_stock_products()
+    new = Q(low_stock_since__gte=since) if since else Q(low_stock_since__isnull=False)
+    totals = queryset.aggregate(
+        total=Count('pk'), critical=Count('pk', filter=BELOW_MINIMUM), new=Count('pk', filter=new)
+    )
+    rows = (
+        queryset.annotate(
+            critical=Case(When(BELOW_MINIMUM, then=Value(True)), default=Value(False)),
+            new=Case(When(new, then=Value(True)), default=Value(False)),
+        )
+        .order_by('-critical', 'title', 'id')
+        .values('id', 'title', 'stock', 'alert_level', 'low_stock_since', 'critical', 'new', 'unit_of_measurement__symbol')
+    )
+    return {**totals, 'since': since, 'products': list(rows[:limit])}
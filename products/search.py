@@ -0,0 +1,176 @@
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+# Tabelas FTS5 (SQLite): palavras com prefixo e ranking, e trigramas para tolerar erros de digitação
+FTS_TABLE = 'products_product_fts'
+TRIGRAM_TABLE = 'products_product_trigram'
+SEARCH_TABLES = {
+    FTS_TABLE: "tokenize='unicode61 remove_diacritics 2', prefix='2 3'",
+    TRIGRAM_TABLE: "tokenize='trigram'",
+}
+
+# Peso de cada coluna no bm25: título, marca, categoria
+SEARCH_WEIGHTS = (10.0, 3.0, 1.0)
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_TERMS = 8
+
+# Similaridade mínima (pg_trgm) para a busca aproximada no PostgreSQL
+TRIGRAM_THRESHOLD = 0.2
+
+
+# Termos da busca: só letras e dígitos, o que também impede injeção na sintaxe MATCH/tsquery
+def search_terms(text):
+    return re.findall(r'\w+', (text or '').lower())[:SEARCH_MAX_TERMS]
+
+
+def _fts_match(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _trigram_match(terms):
+    grams = dict.fromkeys(term[i:i + 3] for term in terms for i in range(len(term) - 2))
+    return ' OR '.join(f'"{gram}"' for gram in grams)
+
+
+def _ranked_ids(connection, table, match, limit):
+    if not match:
+        return []
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}, {weights}) LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_search(terms):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    vector = (
+        SearchVector('title', weight='A', config='simple')
+        + SearchVector('brand__name', weight='B', config='simple')
+        + SearchVector('category__name', weight='C', config='simple')
+    )
+    query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+    return vector, query, SearchRank(vector, query)
+
+
+def _icontains(terms):
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(brand__name__icontains=term) | Q(category__name__icontains=term)
+    return condition
+
+
+# Busca ranqueada: devolve (produtos em ordem de relevância, aproximada?). Sem resultado exato
+# (palavras ou prefixos), tenta a busca por trigramas, que tolera letras trocadas ou faltando.
+def search_products(term, queryset=None, limit=SEARCH_DEFAULT_LIMIT):
+    queryset = Product.objects.all() if queryset is None else queryset
+    terms = search_terms(term)
+    if not terms:
+        return [], False
+    connection = connections[router.db_for_read(Product)]
+
+    if connection.vendor == 'sqlite':
+        fuzzy = False
+        ids = _ranked_ids(connection, FTS_TABLE, _fts_match(terms), limit)
+        if not ids:
+            fuzzy = True
+            ids = _ranked_ids(connection, TRIGRAM_TABLE, _trigram_match(terms), limit)
+        products = queryset.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products], fuzzy
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        vector, query, rank = _postgres_search(terms)
+        results = list(queryset.annotate(search=vector, rank=rank).filter(search=query).order_by('-rank', 'title')[:limit])
+        if results:
+            return results, False
+        similarity = TrigramSimilarity('title', ' '.join(terms))
+        return list(
+            queryset.annotate(similarity=similarity).filter(similarity__gt=TRIGRAM_THRESHOLD)
+            .order_by('-similarity', 'title')[:limit]
+        ), True
+
+    return list(queryset.filter(_icontains(terms)).order_by('title')[:limit]), False
+
+
+# Filtra um queryset pelos termos, sem ranking (para o Admin, que aplica a própria ordenação)
+def filter_by_search(queryset, term):
+    terms = search_terms(term)
+    if not terms:
+        return queryset
+    connection = connections[router.db_for_read(Product)]
+
+    if connection.vendor == 'sqlite':
+        matches = queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_match(terms)])
+        )
+        if matches.exists():
+            return matches
+        ids = _ranked_ids(connection, TRIGRAM_TABLE, _trigram_match(terms), SEARCH_MAX_LIMIT)
+        return queryset.filter(pk__in=ids)
+
+    if connection.vendor == 'postgresql':
+        vector, query, _ = _postgres_search(terms)
+        return queryset.annotate(search=vector).filter(search=query)
+
+    return queryset.filter(_icontains(terms))
+
+
+# Índices de busca no SQLite: tabelas FTS5 preenchidas com os produtos existentes e mantidas
+# por triggers, que cobrem também bulk_create e update(). Recriar uma tabela (_remake_table do
+# SQLite) falha com triggers que a referenciam e apaga os dela: migrações que recriem produto,
+# marca ou categoria devem chamar uninstall_sqlite_search antes e install_sqlite_search depois.
+def install_sqlite_search(schema_editor):
+    uninstall_sqlite_search(schema_editor)
+    names = (
+        '(SELECT name FROM products_brand WHERE id = NEW.brand_id), '
+        '(SELECT name FROM products_category WHERE id = NEW.category_id)'
+    )
+    for table, options in SEARCH_TABLES.items():
+        schema_editor.execute(f'CREATE VIRTUAL TABLE {table} USING fts5(title, brand, category, {options})')
+        schema_editor.execute(
+            f'INSERT INTO {table} (rowid, title, brand, category) '
+            'SELECT p.id, p.title, b.name, c.name FROM products_product p '
+            'LEFT JOIN products_brand b ON b.id = p.brand_id '
+            'LEFT JOIN products_category c ON c.id = p.category_id'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_insert AFTER INSERT ON products_product BEGIN '
+            f'INSERT INTO {table} (rowid, title, brand, category) VALUES (NEW.id, NEW.title, {names}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_update AFTER UPDATE OF title, brand_id, category_id ON products_product '
+            'WHEN OLD.title IS NOT NEW.title OR OLD.brand_id IS NOT NEW.brand_id '
+            'OR OLD.category_id IS NOT NEW.category_id BEGIN '
+            f'DELETE FROM {table} WHERE rowid = OLD.id; '
+            f'INSERT INTO {table} (rowid, title, brand, category) VALUES (NEW.id, NEW.title, {names}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_delete AFTER DELETE ON products_product BEGIN '
+            f'DELETE FROM {table} WHERE rowid = OLD.id; END'
+        )
+        for related, column in (('brand', 'brand'), ('category', 'category')):
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_{related}_update AFTER UPDATE OF name ON products_{related} '
+                f'WHEN OLD.name IS NOT NEW.name BEGIN '
+                f'UPDATE {table} SET {column} = NEW.name '
+                f'WHERE rowid IN (SELECT id FROM products_product WHERE {related}_id = NEW.id); END'
+            )
+
+
+def uninstall_sqlite_search(schema_editor):
+    for table in SEARCH_TABLES:
+        for suffix in ('insert', 'update', 'delete', 'brand_update', 'category_update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
@@ -1,43 +1,163 @@
 from rest_framework import serializers
-from .models import Product, Category, Brand, UnitOfMeasurement, Entry, Exit
+from rest_framework.permissions import SAFE_METHODS
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from .models import Product, Category, Brand, UnitOfMeasurement, Entry, Exit, Job, validate_stock_thresholds
 from django.contrib.auth.models import User, Group
 
-class ProductSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Product
-        fields = '__all__'
 
-class CategorySerializer(serializers.ModelSerializer):
+# Representação expandida opcional: ?expand=brand,category embute os objetos relacionados
+# no lugar dos ids. Cada serializer declara em `expandable_fields`:
+#   nome no parâmetro -> (campo do modelo, serializer aninhado, prefetch_related adicionais)
+class ExpandableFieldsMixin:
+    expandable_fields = {}
+
+    @classmethod
+    def requested_expansions(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return []
+        names = request.query_params.get('expand', '').split(',')
+        return [cls.expandable_fields[name] for name in dict.fromkeys(names) if name in cls.expandable_fields]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if getattr(self, 'nested', False):
+            return fields
+        for field_name, serializer_class, _ in self.requested_expansions(self.context.get('request')):
+            nested = serializer_class(read_only=True)
+            nested.nested = True
+            fields[field_name] = nested
+        return fields
+
+
+# Conjunto esparso de campos: ?fields=id,title,stock devolve apenas esses campos; nomes
+# desconhecidos são recusados com 400
+class SparseFieldsMixin:
+    @classmethod
+    def requested_fields(cls, request):
+        if request is None or request.method not in SAFE_METHODS or not request.query_params.get('fields'):
+            return None
+        return [name for name in dict.fromkeys(request.query_params['fields'].split(',')) if name]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = None if getattr(self, 'nested', False) else self.requested_fields(self.context.get('request'))
+        if not requested:
+            return fields
+        unknown = [name for name in requested if name not in fields]
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Campo(s) desconhecido(s): {', '.join(unknown)}."})
+        return {name: field for name, field in fields.items() if name in requested}
+
+
+# Serialização rápida para listas somente leitura: recebe dicts de .values() e converte cada coluna
+# com o to_representation do campo correspondente, sem instanciar modelos nem percorrer atributos
+class FastListSerializer:
+    def __init__(self, serializer):
+        self.columns = []
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.RelatedField):
+                # .values() já devolve o id da chave estrangeira
+                self.columns.append((name, None))
+            else:
+                self.columns.append((name, field.to_representation))
+
+    def serialize(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, convert in self.columns:
+                value = row[name]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+
+# Estoque mínimo e ponto de pedido coerentes (o clean do modelo não roda nos serializers);
+# em atualizações parciais, o valor ausente vem da instância
+class StockThresholdsMixin:
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        values = [attrs.get(name, getattr(self.instance, name, None)) for name in ('min_stock', 'reorder_point')]
+        try:
+            validate_stock_thresholds(*values)
+        except ValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+        return attrs
+
+
+class CategorySerializer(StockThresholdsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
-class BrandSerializer(serializers.ModelSerializer):
+class BrandSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Brand
         fields = '__all__'
 
-class UnitSerializer(serializers.ModelSerializer):
+class UnitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UnitOfMeasurement
         fields = '__all__'
 
-class EntrySerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Entry
-        fields = '__all__'
+class ProductSerializer(StockThresholdsMixin, SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'brand': ('brand', BrandSerializer, []),
+        'category': ('category', CategorySerializer, []),
+        'unit': ('unit_of_measurement', UnitSerializer, []),
+    }
 
-class ExitSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Exit
+        model = Product
         fields = '__all__'
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'groups']
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Group
-        fields = ['id', 'name']
\ No newline at end of file
+        fields = ['id', 'name']
+
+MOVEMENT_EXPANDABLE_FIELDS = {
+    'product': ('product', ProductSerializer, []),
+    'user': ('user', UserSerializer, ['user__groups']),
+}
+
+class EntrySerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = MOVEMENT_EXPANDABLE_FIELDS
+
+    class Meta:
+        model = Entry
+        fields = '__all__'
+
+class ExitSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = MOVEMENT_EXPANDABLE_FIELDS
+
+    class Meta:
+        model = Exit
+        fields = '__all__'
+
+# Linha de um lote de movimentações; o produto é validado em conjunto pelo serviço
+class MovementLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+# Tarefas em segundo plano: status, progresso e o link de download quando concluída
+class JobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        exclude = ['params', 'file', 'heartbeat_at']
+
+    def get_download(self, obj):
+        if obj.status != 'done' or not obj.file:
+            return None
+        url = reverse('job-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
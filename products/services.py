@@ -0,0 +1,295 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Case, DateTimeField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, Entry, Exit, StockEvent, StockSnapshot, alert_level
+
+
+# Expressão do novo status, calculada no mesmo UPDATE que altera o estoque.
+# Dentro do UPDATE, F('stock') ainda é o valor antigo, por isso o delta entra na comparação.
+def _status_after(delta):
+    return Case(
+        When(stock__lte=-delta, then=Value('out_of_stock')),
+        When(status='out_of_stock', then=Value('in_stock')),
+        default=F('status'),
+    )
+
+
+# Colunas de estoque baixo depois de somar `delta` ao estoque, comparando com `limit` (o nível de
+# alerta gravado no produto ou um valor fixo). Como em _status_after, o delta entra na comparação
+# dentro do UPDATE; um nível nulo nunca é atingido.
+def low_stock_changes(delta=0, limit=F('alert_level'), now=None):
+    low = Q(stock__lte=limit - delta if delta else limit)
+    return {
+        'low_stock': Case(When(low, then=Value(True)), default=Value(False)),
+        'low_stock_since': Case(
+            When(low, then=Coalesce('low_stock_since', Value(now or timezone.now()))),
+            default=Value(None, output_field=DateTimeField()),
+        ),
+    }
+
+
+# Mensagem de erro para uma saída recusada pelo UPDATE condicional
+def _exit_error(product, quantity):
+    if product.status == 'temporarily_unavailable':
+        return "Não é possível retirar produtos que estão indisponíveis."
+    if not product.is_active:
+        return "Não é possível retirar produtos que não estão ativos."
+    return f"Não é possível sair mais do que o estoque disponível ({product.stock})."
+
+
+# Campos gravados por change_stock, relidos para manter a instância em memória coerente
+_STOCK_FIELDS = ['stock', 'status', 'low_stock', 'low_stock_since', 'updated_at']
+
+
+# Aplica um delta de estoque de forma atômica, gravando apenas estoque, status, estoque baixo e
+# updated_at. Deltas negativos só são aplicados se houver estoque suficiente e o produto puder ser
+# retirado. Sem `using`, roda no banco que o roteador escolhe para gravar o produto.
+def change_stock(product, delta, using=None):
+    using = using or router.db_for_write(Product, instance=product)
+    queryset = Product.objects.using(using).filter(pk=product.pk)
+    if delta < 0:
+        queryset = queryset.filter(is_active=True, stock__gte=-delta).exclude(
+            status='temporarily_unavailable'
+        )
+
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        updated = queryset.update(
+            stock=F('stock') + delta,
+            status=_status_after(delta),
+            **low_stock_changes(delta, now=now),
+            updated_at=now,
+        )
+        current = Product.objects.using(using).only('is_active', *_STOCK_FIELDS).get(pk=product.pk)
+        if not updated:
+            raise ValidationError(_exit_error(current, -delta))
+        record_snapshots({product.pk: current.stock}, using=using)
+        record_stock_events({product.pk: (current.stock, current.status)}, using=using)
+
+    # Mantém a instância em memória coerente com o banco, inclusive os valores lidos que o
+    # Product.save compara para gravar fechamento e evento: um save posterior não os repete
+    for field in _STOCK_FIELDS:
+        setattr(product, field, getattr(current, field))
+    product._loaded_stock = current.stock
+    product._loaded_status = current.status
+    return product
+
+
+# Aplica ao estoque do produto o efeito de uma movimentação (Entry ou Exit) prestes a ser salva.
+# Deve rodar na mesma transação do save da movimentação; em edições aplica só a diferença.
+def apply_movement(movement, sign, using=None):
+    if movement.pk and not movement._state.adding:
+        previous = (
+            type(movement).objects.using(using).select_for_update()
+            .only('product_id', 'quantity')
+            .get(pk=movement.pk)
+        )
+        if previous.product_id == movement.product_id:
+            delta = movement.quantity - previous.quantity
+        else:
+            change_stock(previous.product, -sign * previous.quantity, using=using)
+            delta = movement.quantity
+    else:
+        delta = movement.quantity
+
+    if delta:
+        change_stock(movement.product, sign * delta, using=using)
+
+
+# Parâmetros SQL usados por produto no UPDATE em lote (CASE de estoque, de status e o IN)
+_PARAMS_PER_PRODUCT = 8
+
+
+# Grava um lote de movimentações (Entry ou Exit) com um único delta líquido por produto.
+# `lines` é uma lista de dicts {'product': id, 'quantity': n}; erros são levantados por linha,
+# indexados pela posição no lote, e nada é gravado se qualquer linha for inválida.
+def apply_movement_batch(model, sign, lines, user):
+    inactive_error = (
+        "Não é possível adicionar entradas para produtos que não estão ativos." if sign > 0
+        else "Não é possível retirar produtos que não estão ativos."
+    )
+
+    with transaction.atomic():
+        products = Product.objects.only('stock', 'status', 'is_active').in_bulk(
+            {line['product'] for line in lines}
+        )
+
+        errors = {}
+        deltas = {}
+        for index, line in enumerate(lines):
+            product = products.get(line['product'])
+            if product is None:
+                errors[index] = [f"Produto {line['product']} não encontrado."]
+            elif not product.is_active:
+                errors[index] = [inactive_error]
+            elif sign < 0 and product.status == 'temporarily_unavailable':
+                errors[index] = ["Não é possível retirar produtos que estão indisponíveis."]
+            else:
+                deltas[product.pk] = deltas.get(product.pk, 0) + sign * line['quantity']
+        if errors:
+            raise ValidationError(errors)
+
+        states = _update_stock_in_bulk(deltas)
+        stocks = {pk: stock for pk, (stock, _) in states.items()}
+
+        short = {pk for pk, stock in stocks.items() if stock < 0 and deltas[pk] < 0}
+        if short:
+            for index, line in enumerate(lines):
+                if line['product'] in short:
+                    available = stocks[line['product']] - deltas[line['product']]
+                    errors[index] = [f"Não é possível sair mais do que o estoque disponível ({available})."]
+            raise ValidationError(errors)
+
+        record_snapshots(stocks)
+        record_stock_events(states)
+
+        return model.objects.bulk_create(
+            [model(product_id=line['product'], user=user, quantity=line['quantity']) for line in lines],
+            batch_size=1000,
+        )
+
+
+# Aplica os deltas líquidos com UPDATEs CASE, divididos apenas pelo limite de parâmetros do banco.
+# Devolve o novo estoque e status de cada produto ({id: (estoque, status)}), lidos logo após
+# o UPDATE de cada bloco.
+def _update_stock_in_bulk(deltas):
+    max_params = connections[router.db_for_write(Product)].features.max_query_params
+    chunk_size = max_params // _PARAMS_PER_PRODUCT if max_params else len(deltas) or 1
+    items = list(deltas.items())
+    now = timezone.now()
+    states = {}
+
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        queryset = Product.objects.filter(pk__in=[pk for pk, _ in chunk])
+        queryset.update(
+            stock=F('stock') + Case(*[When(pk=pk, then=Value(delta)) for pk, delta in chunk]),
+            status=Case(
+                *[When(pk=pk, stock__lte=-delta, then=Value('out_of_stock')) for pk, delta in chunk],
+                When(status='out_of_stock', then=Value('in_stock')),
+                default=F('status'),
+            ),
+            updated_at=now,
+        )
+        # Estoque baixo sobre o estoque já atualizado, sem parâmetros por produto (um CASE a mais
+        # reduziria o bloco); produtos sem nível de alerta nunca estão com estoque baixo
+        queryset.filter(alert_level__isnull=False).update(**low_stock_changes(now=now))
+        states.update((pk, (stock, status)) for pk, stock, status in queryset.values_list('pk', 'stock', 'status'))
+    return states
+
+
+# Recalcula o nível de alerta e o estoque baixo dos produtos da categoria sem limites próprios,
+# em um UPDATE; chamado pelo Category.save quando os limites da categoria mudam
+def apply_category_thresholds(category, using=None):
+    level = alert_level(category.min_stock, category.reorder_point)
+    now = timezone.now()
+    return Product.objects.db_manager(using).filter(
+        category=category, min_stock__isnull=True, reorder_point__isnull=True
+    ).update(
+        alert_level=level,
+        **low_stock_changes(limit=Value(level, output_field=IntegerField()), now=now),
+        updated_at=now,
+    )
+
+
+# Produtos abaixo do estoque mínimo: o do produto ou, sem limites próprios, o da categoria
+BELOW_MINIMUM = Q(min_stock__isnull=False, stock__lte=F('min_stock')) | Q(
+    min_stock__isnull=True, reorder_point__isnull=True, stock__lte=F('category__min_stock')
+)
+
+
+# Produtos ativos com estoque baixo, pelo índice parcial de low_stock (não percorre o catálogo);
+# `critical` restringe aos que estão abaixo do estoque mínimo
+def low_stock_products(queryset=None, critical=False):
+    queryset = Product.objects.all() if queryset is None else queryset
+    queryset = queryset.filter(low_stock=True, is_active=True)
+    return queryset.filter(BELOW_MINIMUM) if critical else queryset
+
+
+# Grava (ou atualiza) o fechamento do dia para os produtos informados ({id: estoque atual})
+def record_snapshots(stocks, using=None):
+    today = timezone.localdate()
+    StockSnapshot.objects.db_manager(using).bulk_create(
+        [StockSnapshot(product_id=pk, date=today, closing_stock=stock) for pk, stock in stocks.items()],
+        update_conflicts=True,
+        unique_fields=['product', 'date'],
+        update_fields=['closing_stock', 'updated_at'],
+        batch_size=1000,
+    )
+
+
+# Grava na outbox o estado novo dos produtos alterados ({id: (estoque, status)}). Deve rodar na
+# transação da alteração: o evento existe se, e somente se, a alteração for confirmada.
+def record_stock_events(states, using=None):
+    StockEvent.objects.db_manager(using).bulk_create(
+        [StockEvent(product_id=pk, stock=stock, status=status) for pk, (stock, status) in sorted(states.items())],
+        batch_size=1000,
+    )
+
+
+# Estoque de um produto em um instante passado: parte do último fechamento anterior ao dia
+# e soma apenas as movimentações daquele dia. Sem fechamento anterior, parte do estoque atual
+# e desfaz as movimentações posteriores ao instante.
+def stock_at(product, moment):
+    day = timezone.localtime(moment).date()
+    snapshot = (
+        StockSnapshot.objects.filter(product=product, date__lt=day)
+        .order_by('-date').only('date', 'closing_stock').first()
+    )
+
+    if snapshot:
+        next_day = snapshot.date + datetime.timedelta(days=1)
+        start = timezone.make_aware(datetime.datetime.combine(next_day, datetime.time.min))
+        entries = _movement_total(Entry, product, date__gte=start, date__lte=moment)
+        exits = _movement_total(Exit, product, date__gte=start, date__lte=moment)
+        return snapshot.closing_stock + entries - exits
+
+    entries = _movement_total(Entry, product, date__gt=moment)
+    exits = _movement_total(Exit, product, date__gt=moment)
+    return Product.objects.values_list('stock', flat=True).get(pk=product.pk) - entries + exits
+
+
+def _movement_total(model, product, **filters):
+    return model.objects.filter(product=product, **filters).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+# Total movimentado por produto, como subconsulta correlacionada agrupada (usa o índice product, date)
+def _movement_sum(model):
+    totals = (
+        model.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    return Coalesce(Subquery(totals), 0)
+
+
+# Produtos cujo estoque difere de entradas - saídas, em uma única consulta agregada.
+# Com `since`, considera só os produtos alterados ou movimentados a partir desse instante.
+def stock_drift(since=None):
+    queryset = Product.objects.all()
+    if since:
+        queryset = queryset.filter(
+            Q(updated_at__gte=since)
+            | Q(pk__in=Entry.objects.filter(date__gte=since).values('product'))
+            | Q(pk__in=Exit.objects.filter(date__gte=since).values('product'))
+        )
+    return (
+        queryset.annotate(expected=_movement_sum(Entry) - _movement_sum(Exit))
+        .exclude(stock=F('expected'))
+        .order_by('pk')
+        .values_list('pk', 'title', 'stock', 'expected')
+    )
+
+
+# Corrige as divergências aplicando a diferença como delta, o que continua correto
+# mesmo que novas movimentações tenham ocorrido desde a detecção.
+def fix_stock_drift(drift):
+    with transaction.atomic():
+        states = _update_stock_in_bulk({pk: expected - stock for pk, _, stock, expected in drift})
+        record_snapshots({pk: stock for pk, (stock, _) in states.items()})
+        record_stock_events(states)
+    return len(states)
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.utils import timezone
+
+from .cache import REFERENCE_MODELS, invalidate_reference
+from .models import Entry, Exit, Job, Product
+
+
+# Qualquer gravação ou exclusão em uma tabela de referência invalida o cache dela.
+# Atualizações em massa (queryset.update) não disparam sinais e devem chamar invalidate_reference.
+def invalidate_reference_cache(sender, **kwargs):
+    invalidate_reference(sender)
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(invalidate_reference_cache, sender=model, dispatch_uid=f'reference-save-{model._meta.label_lower}')
+    post_delete.connect(invalidate_reference_cache, sender=model, dispatch_uid=f'reference-delete-{model._meta.label_lower}')
+
+
+# O arquivo gerado por uma tarefa é apagado junto com ela
+def delete_job_file(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+post_delete.connect(delete_job_file, sender=Job, dispatch_uid='job-delete-file')
+
+
+# A cascata da exclusão de um usuário apaga as movimentações dele sem passar pelo MovementQuerySet:
+# os produtos afetados são marcados antes, em um único UPDATE por usuário
+def touch_user_movement_products(sender, instance, using, **kwargs):
+    Product.objects.using(using).filter(
+        Q(pk__in=Entry.objects.using(using).filter(user=instance).values('product_id'))
+        | Q(pk__in=Exit.objects.using(using).filter(user=instance).values('product_id'))
+    ).update(updated_at=timezone.now())
+
+
+pre_delete.connect(touch_user_movement_products, sender=User, dispatch_uid='user-delete-touch-products')
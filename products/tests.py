@@ -1,3 +1,1551 @@
-from django.test import TestCase
+import base64
+import datetime
+import hashlib
+import hmac
+import http.client
+import http.server
+import io
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.test import APISimpleTestCase, APITestCase
+
+from app.metrics import DUPLICATE_QUERIES, REQUESTS, MetricsMiddleware
+from app.routers import ReplicaRouter, use_replica
+
+from .admin import CappedCountPaginator, ExitForm
+from .benchmarks import compare_results
+from .cache import REFERENCE_CACHE_TIMEOUT, SHARED_CACHE
+from .events import backoff, dispatch_events, latest_event_id, prune_events, wait_for_events
+from .exports import csv_response, xlsx_response
+from .imports import import_products
+from .jobs import STALE_AFTER, claim_next_job, enqueue, requeue_stale_jobs, run_job
+from .models import (
+    Brand, Category, Product, UnitOfMeasurement, Entry, Exit, Job, StockEvent, StockSnapshot, WebhookSubscription
+)
+from .reports import PDF_ROWS_PER_PAGE, write_stock_pdf
+from .search import search_products
+from .services import low_stock_products, stock_at, stock_drift
+
+
+# Cria os cadastros mínimos para um produto
+def make_product(title='Cabo 2,5mm', stock=0, **kwargs):
+    category, _ = Category.objects.get_or_create(name='Cabos')
+    unit, _ = UnitOfMeasurement.objects.get_or_create(name='Metro', defaults={'symbol': 'm'})
+    brand, _ = Brand.objects.get_or_create(name='Sil')
+    return Product.objects.create(
+        title=title, brand=brand, category=category, unit_of_measurement=unit,
+        price='10.00', stock=stock, **kwargs
+    )
+
+
+class StockMovementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('estoquista')
+        self.product = make_product(stock=10)
+
+    def test_entry_and_exit_update_stock(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        Exit.objects.create(product=self.product, user=self.user, quantity=3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 12)
+
+    def test_exit_empties_stock_and_entry_restores_status(self):
+        Exit.objects.create(product=self.product, user=self.user, quantity=10)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.status, 'out_of_stock')
+        Entry.objects.create(product=self.product, user=self.user, quantity=1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.status, 'in_stock')
+
+    def test_exit_beyond_stock_is_rejected_without_side_effects(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Exit.objects.create(product=self.product, user=self.user, quantity=8)
+        # A instância desatualizada ainda "vê" 10 unidades, mas o banco só tem 2
+        with self.assertRaises(ValidationError):
+            Exit.objects.create(product=stale, user=self.user, quantity=5)
+        self.assertEqual(Exit.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+    def test_editing_movement_applies_only_the_difference(self):
+        entry = Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        entry.quantity = 7
+        entry.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 17)
+
+    def test_reducing_an_exit_is_accepted_with_low_stock(self):
+        exit = Exit.objects.create(product=self.product, user=self.user, quantity=8)
+        exit.quantity = 5
+        exit.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+        exit.quantity = 11
+        with self.assertRaises(ValidationError):
+            exit.save()
+
+        form = ExitForm(instance=exit, data={'product': self.product.pk, 'user': self.user.pk, 'quantity': 8})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_editing_an_entry_of_an_inactive_product(self):
+        entry = Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        entry = Entry.objects.get(pk=entry.pk)
+        entry.user = User.objects.create_user('conferente')
+        entry.save()
+        self.assertEqual(Entry.objects.get(pk=entry.pk).user.username, 'conferente')
+
+        entry.quantity = 6
+        with self.assertRaises(ValidationError):
+            entry.save()
+
+    def test_stock_update_writes_only_changed_columns(self):
+        Product.objects.filter(pk=self.product.pk).update(title='Renomeado')
+        Entry.objects.create(product=self.product, user=self.user, quantity=1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.title, 'Renomeado')
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    threads = 8
+    movements_per_thread = 25
+
+    def setUp(self):
+        self.user = User.objects.create_user('estoquista')
+        self.product = make_product(stock=1000)
+
+    # Repete a operação quando o SQLite de testes devolve "locked"
+    def _retry(self, operation):
+        while True:
+            try:
+                return operation()
+            except OperationalError:
+                continue
+
+    def _worker(self, barrier, errors):
+        try:
+            barrier.wait()
+            for i in range(self.movements_per_thread):
+                # Cada thread usa sua própria instância, com estoque possivelmente desatualizado
+                product = self._retry(lambda: Product.objects.get(pk=self.product.pk))
+                model = Entry if i % 2 else Exit
+                self._retry(lambda: model.objects.create(product=product, user=self.user, quantity=3))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_concurrent_movements_lose_no_stock(self):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+        workers = [
+            threading.Thread(target=self._worker, args=(barrier, errors))
+            for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        entries = Entry.objects.count()
+        exits = Exit.objects.count()
+        self.assertEqual(entries + exits, self.threads * self.movements_per_thread)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1000 + 3 * entries - 3 * exits)
+
+
+class BulkMovementTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('doca')
+        self.client.force_authenticate(self.user)
+        self.products = [make_product(f'Disjuntor {i}A', stock=100) for i in range(5)]
+
+    def _lines(self, count, quantity=1):
+        return [
+            {'product': self.products[i % len(self.products)].pk, 'quantity': quantity}
+            for i in range(count)
+        ]
+
+    def test_entries_batch_applies_net_delta_per_product(self):
+        response = self.client.post('/api/entries/bulk/', self._lines(50, quantity=2), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 50)
+        self.assertEqual(Entry.objects.count(), 50)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 120)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        counts = []
+        for size in (10, 200):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/exits/bulk/', self._lines(size, quantity=1), format='json')
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_exit_batch_beyond_stock_reports_lines_and_writes_nothing(self):
+        lines = self._lines(5, quantity=60) + self._lines(1, quantity=60)
+        response = self.client.post('/api/exits/bulk/', lines, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['line'] for error in response.data['errors']], [1, 6])
+        self.assertEqual(Exit.objects.count(), 0)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 100)
+
+    def test_invalid_lines_are_reported_per_line(self):
+        lines = self._lines(3)
+        lines[1]['quantity'] = 0
+        lines[2]['product'] = 999999
+        response = self.client.post('/api/entries/bulk/', lines, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2])
+
+        lines[1]['quantity'] = 1
+        response = self.client.post('/api/entries/bulk/', lines, format='json')
+        self.assertEqual([error['line'] for error in response.data['errors']], [3])
+        self.assertEqual(Entry.objects.count(), 0)
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_products_are_paged_by_title_without_gaps(self):
+        for i in range(7):
+            make_product(title='Tomada' if i % 2 else f'Interruptor {i}')
+        products = self._walk('/api/products/?page_size=2')
+        self.assertEqual(len(products), 7)
+        self.assertEqual(len({product['id'] for product in products}), 7)
+        self.assertEqual([p['title'] for p in products], sorted(p['title'] for p in products))
+
+    def test_movements_are_paged_newest_first(self):
+        product = make_product(stock=50)
+        for _ in range(5):
+            Exit.objects.create(product=product, user=self.user, quantity=1)
+        exits = self._walk('/api/exits/?page_size=2')
+        expected = Exit.objects.order_by('-date', '-id').values_list('id', flat=True)
+        self.assertEqual([e['id'] for e in exits], list(expected))
+
+
+class CsvExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_login(self.user)
+        for i in range(3):
+            product = make_product(title=f'Lâmpada {i}', stock=10)
+            Entry.objects.create(product=product, user=self.user, quantity=i + 1)
+
+    def _rows(self, response):
+        content = b''.join(response.streaming_content).decode()
+        return [line.split(',') for line in content.splitlines()]
+
+    def test_export_resolves_related_names_in_a_single_query(self):
+        with self.assertNumQueries(1):
+            rows = self._rows(csv_response(Entry.objects.all(), 'entry'))
+        self.assertEqual(rows[0], ['product', 'user', 'quantity', 'date'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][:3], ['Lâmpada 2', 'admin', '3'])
+
+    def test_changelist_links_to_filtered_export(self):
+        response = self.client.get('/products/entry/', {'q': 'Lâmpada'})
+        self.assertContains(response, 'export/csv/?q=L')
+
+    def test_changelist_export_applies_current_filters(self):
+        response = self.client.get('/products/product/export/csv/', {'q': 'Lâmpada 1'})
+        self.assertEqual(response.status_code, 200)
+        rows = self._rows(response)
+        self.assertEqual([row[0] for row in rows[1:]], ['Lâmpada 1'])
+
+
+class XlsxExportTests(TestCase):
+    def test_cells_keep_native_types(self):
+        make_product(title='Reator', stock=7)
+        response = xlsx_response(Product.objects.all(), 'product')
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        header, row = list(workbook.active.values)
+        values = dict(zip(header, row))
+        self.assertEqual(values['brand'], 'Sil')
+        self.assertEqual(values['stock'], 7)
+        self.assertEqual(Decimal(str(values['price'])), Decimal('10.00'))
+        self.assertIsInstance(values['created_at'], datetime.datetime)
+        self.assertIsNone(values['dimension'])
+
+
+class StockPdfReportTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin'))
+        for i in range(PDF_ROWS_PER_PAGE + 5):
+            make_product(title=f'Eletroduto {i}', stock=i)
+
+    def test_pdf_is_rendered_page_by_page_with_progress(self):
+        calls = []
+        file = io.BytesIO()
+        written = write_stock_pdf(file, progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(written, PDF_ROWS_PER_PAGE + 5)
+        self.assertEqual(calls, [(PDF_ROWS_PER_PAGE, written), (written, written)])
+        self.assertTrue(file.getvalue().startswith(b'%PDF'))
+
+    def test_api_returns_pdf(self):
+        response = self.client.get('/api/reports/stock-pdf/', {'status': 'in_stock'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class QueryPlanTests(TestCase):
+    tables = ('products_product', 'products_entry', 'products_exit')
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_login(self.user)
+        product = make_product(stock=10)
+        Entry.objects.create(product=product, user=self.user, quantity=1)
+        Exit.objects.create(product=product, user=self.user, quantity=1)
+
+    # Planos problemáticos: varredura da tabela sem índice, ou varredura completa seguida de
+    # ordenação em memória. Buscas por índice (SEARCH) com ordenação do resultado são aceitas.
+    def _bad_plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+
+        problems = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(f'"{table}"' in sql for table in self.tables):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                details = [row[-1] for row in cursor.fetchall()]
+                scans = [
+                    detail for detail in details
+                    if any(detail == f'SCAN {t}' or detail.startswith(f'SCAN {t} ') for t in self.tables)
+                ]
+                if any('INDEX' not in detail for detail in scans):
+                    problems.append((url, details, sql))
+                elif scans and 'USE TEMP B-TREE FOR ORDER BY' in details:
+                    problems.append((url, details, sql))
+        return problems
+
+    def test_admin_changelists_use_indexes(self):
+        for url, params in [
+            ('/products/product/', {}),
+            ('/products/product/', {'status__exact': 'in_stock', 'is_active__exact': '1'}),
+            ('/products/product/', {'low_stock': 'reorder'}),
+            ('/products/entry/', {}),
+            ('/products/exit/', {}),
+        ]:
+            self.assertEqual(self._bad_plans(url, params), [])
+
+    def test_api_lists_use_indexes(self):
+        self.client.force_login(self.user)
+        for url in ['/api/products/', '/api/products/low-stock/', '/api/entries/', '/api/exits/']:
+            self.assertEqual(self._bad_plans(url), [])
+
+
+class StockLedgerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+        self.product = make_product(stock=0)
+
+    def _at(self, day, hour):
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+    def test_movements_keep_todays_closing_balance(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        Exit.objects.create(product=self.product, user=self.user, quantity=2)
+        self.client.post('/api/entries/bulk/', [{'product': self.product.pk, 'quantity': 4}], format='json')
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual(snapshot.date, timezone.localdate())
+        self.assertEqual(snapshot.closing_stock, 7)
+
+    def test_stock_at_uses_last_snapshot_and_movements_of_the_day(self):
+        day = timezone.localdate() - datetime.timedelta(days=3)
+        StockSnapshot.objects.update(date=day - datetime.timedelta(days=10))
+        StockSnapshot.objects.create(product=self.product, date=day - datetime.timedelta(days=1), closing_stock=5)
+        entry = Entry.objects.create(product=self.product, user=self.user, quantity=3)
+        exit = Exit.objects.create(product=self.product, user=self.user, quantity=1)
+        Entry.objects.filter(pk=entry.pk).update(date=self._at(day, 10))
+        Exit.objects.filter(pk=exit.pk).update(date=self._at(day, 12))
+
+        with self.assertNumQueries(3):
+            self.assertEqual(stock_at(self.product, self._at(day, 11)), 8)
+        self.assertEqual(stock_at(self.product, self._at(day, 13)), 7)
+
+    def test_stock_at_without_snapshot_rewinds_from_current_stock(self):
+        StockSnapshot.objects.all().delete()
+        Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        StockSnapshot.objects.all().delete()
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        self.assertEqual(stock_at(self.product, yesterday), 0)
+        self.assertEqual(stock_at(self.product, timezone.now()), 5)
+
+    def test_api_accepts_date_and_rejects_garbage(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=2)
+        url = f'/api/products/{self.product.pk}/stock-at/'
+        response = self.client.get(url, {'date': timezone.localdate().isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 2)
+        self.assertEqual(self.client.get(url, {'date': 'ontem'}).status_code, 400)
+
+
+class ReconcileStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('estoquista')
+        self.product = make_product(stock=0)
+        self.other = make_product(title='Fita isolante', stock=0)
+        Entry.objects.create(product=self.product, user=self.user, quantity=10)
+        Exit.objects.create(product=self.product, user=self.user, quantity=4)
+        Entry.objects.create(product=self.other, user=self.user, quantity=3)
+
+    def _run(self, *args):
+        out = io.StringIO()
+        call_command('reconcile_stock', *args, stdout=out)
+        return out.getvalue()
+
+    def test_drift_is_found_in_one_query_and_fixed(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        with self.assertNumQueries(1):
+            drift = list(stock_drift())
+        self.assertEqual(drift, [(self.product.pk, self.product.title, 1, 6)])
+
+        output = self._run('--fix')
+        self.assertIn('1 produto(s) divergente(s), 1 corrigido(s)', output)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 6)
+        self.assertEqual(list(stock_drift()), [])
+
+    def test_incremental_run_checks_only_touched_products(self):
+        self._run()
+        last_week = timezone.now() - datetime.timedelta(days=7)
+        Product.objects.filter(pk=self.other.pk).update(stock=50, updated_at=last_week)
+        self.assertIn('0 produto(s) divergente(s)', self._run('--incremental'))
+        self.assertIn('1 produto(s) divergente(s)', self._run())
+        Exit.objects.create(product=self.other, user=self.user, quantity=1)
+        self.assertIn('1 produto(s) divergente(s)', self._run('--incremental'))
+
+    def test_incremental_run_sees_deleted_movements(self):
+        self._run()
+        last_week = timezone.now() - datetime.timedelta(days=7)
+        Product.objects.update(updated_at=last_week)
+        # Excluir o usuário apaga as movimentações dele em cascata, sem carregá-las
+        with CaptureQueriesContext(connection) as queries:
+            self.user.delete()
+        movement_reads = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith('SELECT') and ('"products_entry"' in q['sql'] or '"products_exit"' in q['sql'])
+        ]
+        self.assertEqual(movement_reads, [])
+        self.assertIn('2 produto(s) divergente(s)', self._run('--incremental'))
+
+    def test_incremental_run_sees_movements_deleted_in_bulk(self):
+        self._run()
+        Product.objects.update(updated_at=timezone.now() - datetime.timedelta(days=7))
+        with self.assertNumQueries(4):  # savepoint, UPDATE dos produtos, DELETE e release
+            Entry.objects.filter(product=self.other).delete()
+        self.assertIn('1 produto(s) divergente(s)', self._run('--incremental'))
+
+        Product.objects.update(updated_at=timezone.now() - datetime.timedelta(days=7))
+        Exit.objects.get().delete()
+        self.assertIn('1 produto(s) divergente(s)', self._run('--incremental'))
+
+
+class AdminChangelistQueryTests(TestCase):
+    urls = ['/products/product/', '/products/entry/', '/products/exit/', '/admin/logentry/']
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def _add_rows(self, count):
+        for i in range(count):
+            brand = Brand.objects.create(name=f'Marca {Brand.objects.count()}')
+            product = make_product(title=f'Relé {brand.pk}', stock=10)
+            Product.objects.filter(pk=product.pk).update(brand=brand)
+            Entry.objects.create(product=product, user=self.user, quantity=1)
+            Exit.objects.create(product=product, user=self.user, quantity=1)
+            LogEntry.objects.log_action(self.user.pk, None, product.pk, str(product), ADDITION)
+
+    def _query_counts(self):
+        counts = {}
+        for url in self.urls:
+            self.client.get(url)  # aquece o cache das opções de filtro
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts[url] = len(queries)
+        return counts
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self._add_rows(2)
+        few = self._query_counts()
+        self._add_rows(20)
+        self.assertEqual(self._query_counts(), few)
+
+    def test_count_is_capped(self):
+        self._add_rows(3)
+        paginator = CappedCountPaginator(Entry.objects.all(), 1)
+        paginator.count_cap = 2
+        self.assertEqual((paginator.count, paginator.capped), (2, True))
+
+    def test_pages_beyond_the_cap_are_reachable(self):
+        self._add_rows(3)
+        oldest = Entry.objects.order_by('date', 'pk').first()
+        with mock.patch.object(CappedCountPaginator, 'count_cap', 1), \
+                mock.patch('products.admin.EntryAdmin.list_per_page', 1):
+            response = self.client.get('/products/entry/')
+            self.assertEqual(response.context['cl'].result_count, 2)
+            self.assertContains(response, '2+')
+            self.assertContains(response, '?p=2')
+
+            response = self.client.get('/products/entry/', {'p': 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['cl'].result_list), [oldest])
+            self.assertFalse(response.context['cl'].paginator.capped)
+
+
+class ExpandedRepresentationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+
+    def _add_rows(self, count):
+        for i in range(count):
+            brand = Brand.objects.create(name=f'Marca {Brand.objects.count()}')
+            product = make_product(title=f'Plugue {brand.pk}', stock=5)
+            Product.objects.filter(pk=product.pk).update(brand=brand)
+            Entry.objects.create(product=product, user=self.user, quantity=1)
+
+    def _count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_expanded_products_inline_related_objects(self):
+        self._add_rows(1)
+        _, results = self._count('/api/products/?expand=brand,unit')
+        self.assertEqual(results[0]['brand']['name'], Product.objects.get().brand.name)
+        self.assertEqual(results[0]['unit_of_measurement']['symbol'], 'm')
+        self.assertIsInstance(results[0]['category'], int)
+
+    def test_expanded_lists_cost_a_constant_number_of_queries(self):
+        urls = ['/api/products/?expand=brand,category,unit', '/api/entries/?expand=product,user']
+        self._add_rows(2)
+        few = [self._count(url)[0] for url in urls]
+        self._add_rows(10)
+        self.assertEqual([self._count(url)[0] for url in urls], few)
+
+    def test_writes_keep_accepting_ids(self):
+        self._add_rows(1)
+        product = Product.objects.get()
+        response = self.client.post(
+            '/api/entries/?expand=product',
+            {'product': product.pk, 'user': self.user.pk, 'quantity': 2},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['product'], product.pk)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+        make_product(title='Quadro de distribuição', stock=3, observation='x' * 1000)
+
+    def test_list_returns_only_requested_fields_without_fetching_others(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'fields': 'id,title,stock,status'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['results'],
+            [{'id': Product.objects.get().pk, 'title': 'Quadro de distribuição', 'stock': 3, 'status': 'in_stock'}]
+        )
+        select = [q['sql'] for q in queries.captured_queries if 'FROM "products_product"' in q['sql']]
+        self.assertNotIn('observation', select[-1])
+
+    def test_fast_path_matches_model_serializer_output(self):
+        url = '/api/products/'
+        fields = 'id,title,price,brand,created_at,dimension,is_active'
+        fast = self.client.get(url, {'fields': fields}).data['results']
+        # Com ?expand= o caminho completo do ModelSerializer é usado
+        full = self.client.get(url, {'fields': fields, 'expand': 'none'}).data['results']
+        self.assertEqual(fast, full)
+
+    def test_detail_and_movements_accept_fields(self):
+        product = Product.objects.get()
+        Entry.objects.create(product=product, user=self.user, quantity=2)
+        response = self.client.get(f'/api/products/{product.pk}/', {'fields': 'title'})
+        self.assertEqual(response.data, {'title': 'Quadro de distribuição'})
+        response = self.client.get('/api/entries/', {'fields': 'product,quantity', 'expand': 'product'})
+        self.assertEqual(response.data['results'][0]['product']['title'], 'Quadro de distribuição')
+        self.assertEqual(set(response.data['results'][0]), {'product', 'quantity'})
+
+    def test_unknown_fields_are_rejected(self):
+        for fields in ('nope', 'title,nope'):
+            response = self.client.get('/api/products/', {'fields': fields})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('nope', str(response.data['fields']))
+        product = Product.objects.get()
+        self.assertEqual(self.client.get(f'/api/products/{product.pk}/', {'fields': 'nope'}).status_code, 400)
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin'))
+        self.product = make_product(stock=1)
+
+    def test_unchanged_list_returns_304_without_serializing(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Brand.objects.create(name='Nova')
+        self.assertEqual(self.client.get('/api/brands/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() + datetime.timedelta(seconds=5))
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/api/products/{self.product.pk}/'
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+
+    def test_expanded_responses_change_with_related_rows(self):
+        for url in ('/api/products/', f'/api/products/{self.product.pk}/'):
+            etag = self.client.get(url, {'expand': 'brand'})['ETag']
+            self.assertEqual(self.client.get(url, {'expand': 'brand'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            Brand.objects.filter(pk=self.product.brand_id).update(
+                name=f'Sil {url}', updated_at=timezone.now() + datetime.timedelta(seconds=5)
+            )
+            self.assertEqual(self.client.get(url, {'expand': 'brand'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_has_no_last_modified_that_misses_deletions(self):
+        make_product(title='Canaleta')
+        response = self.client.get('/api/products/')
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        Product.objects.filter(title='Canaleta').delete()
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_updated_since_returns_only_changed_rows(self):
+        other = make_product(title='Canaleta')
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - datetime.timedelta(days=2))
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        response = self.client.get('/api/products/', {'updated_since': since})
+        self.assertEqual([p['id'] for p in response.data['results']], [other.pk])
+        self.assertEqual(self.client.get('/api/products/', {'updated_since': 'ontem'}).status_code, 400)
+
+
+class ReferenceCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+        self.product = make_product()
+
+    def test_reference_list_is_served_from_cache_until_saved(self):
+        first = self.client.get('/api/brands/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/brands/')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/brands/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        Brand.objects.create(name='Tramontina')
+        names = [brand['name'] for brand in self.client.get('/api/brands/').data['results']]
+        self.assertEqual(names, ['Sil', 'Tramontina'])
+
+        Brand.objects.get(name='Tramontina').delete()
+        self.assertEqual(len(self.client.get('/api/brands/').data['results']), 1)
+
+    def test_admin_choices_come_from_cache(self):
+        self.client.force_login(self.user)
+        self.client.get('/products/product/add/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/products/product/add/')
+        self.assertContains(response, '>Sil</option>')
+        reference_tables = ('products_brand', 'products_category', 'products_unitofmeasurement')
+        self.assertFalse([q for q in queries if any(f'FROM "{table}"' in q['sql'] for table in reference_tables)])
+
+        Category.objects.create(name='Disjuntores')
+        self.assertContains(self.client.get('/products/product/add/'), '>Disjuntores</option>')
+
+    def test_stats_count_hits_and_misses(self):
+        self.client.get('/api/units/')
+        self.client.get('/api/units/')
+        stats = self.client.get('/api/cache-stats/').data['products.unitofmeasurement']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_process_local_cache_expires_quickly(self):
+        # Os testes usam o LocMemCache padrão: sem cache compartilhado, a validade é curta
+        self.assertFalse(SHARED_CACHE)
+        with mock.patch('products.cache.cache.set') as cache_set:
+            self.client.get('/api/units/')
+        self.assertEqual({call.args[2] for call in cache_set.call_args_list}, {REFERENCE_CACHE_TIMEOUT})
+        self.assertLessEqual(REFERENCE_CACHE_TIMEOUT, 60)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+        self.breaker = make_product(title='Disjuntor bipolar 32A')
+        self.relay = make_product(title='Relé fotoelétrico')
+        self.cable = make_product(title='Cabo flexível 2,5mm')
+        Brand.objects.filter(name='Sil').update(name='Sil Fios')  # atualização em massa também reindexa
+
+    def _search(self, q, **params):
+        response = self.client.get('/api/products/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.data['results']], response.data['fuzzy']
+
+    def test_prefix_and_accent_insensitive_match(self):
+        self.assertEqual(self._search('disj'), ([self.breaker.pk], False))
+        self.assertEqual(self._search('rele foto'), ([self.relay.pk], False))
+
+    def test_title_ranks_above_brand(self):
+        brand = Brand.objects.create(name='Cabos Brasil')
+        Product.objects.filter(pk=self.relay.pk).update(brand=brand)
+        # título > marca > categoria (todos estão na categoria "Cabos")
+        ids, _ = self._search('cabo')
+        self.assertEqual(ids, [self.cable.pk, self.relay.pk, self.breaker.pk])
+
+    def test_typo_falls_back_to_trigrams(self):
+        ids, fuzzy = self._search('disjutor')
+        self.assertTrue(fuzzy)
+        self.assertEqual(ids[0], self.breaker.pk)
+
+    def test_index_follows_renames_and_deletes(self):
+        self.assertEqual(len(self._search('fios')[0]), 3)
+        self.cable.title = 'Eletroduto corrugado'
+        self.cable.save()
+        self.assertEqual(self._search('eletroduto')[0], [self.cable.pk])
+        self.cable.delete()
+        self.assertEqual(self._search('eletroduto')[0], [])
+
+    def test_validation(self):
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/products/search/', {'q': 'cabo', 'limit': 500}).status_code, 400)
+
+    def test_admin_search_box_uses_index(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/products/product/', {'q': 'disj'})
+        self.assertContains(response, 'Disjuntor bipolar 32A')
+        self.assertNotContains(response, 'Relé fotoelétrico')
+
+
+class AnalyticsReportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+        self.cable = make_product(stock=10)  # 10 x 10,00
+        self.breaker = make_product(title='Disjuntor 32A')
+        Product.objects.filter(pk=self.breaker.pk).update(
+            price='25.50', stock=4, category=Category.objects.create(name='Proteção')
+        )  # 102,00
+
+    def test_valuation_totals_and_groups(self):
+        data = self.client.get('/api/reports/valuation/').data
+        self.assertEqual((data['products'], data['stock'], data['value']), (2, 14, '202.00'))
+        self.assertEqual(
+            [(group['name'], group['value']) for group in data['by_category']],
+            [('Proteção', '102.00'), ('Cabos', '100.00')]
+        )
+        self.assertEqual([group['value'] for group in data['by_brand']], ['202.00'])
+
+        filtered = self.client.get('/api/reports/valuation/', {'category': self.cable.category_id}).data
+        self.assertEqual(filtered['value'], '100.00')
+        self.assertEqual(self.client.get('/api/reports/valuation/', {'category': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/stock-pdf/', {'brand': 'xyz'}).status_code, 400)
+
+    def test_movements_grouped_by_day_and_month(self):
+        Entry.objects.create(product=self.cable, user=self.user, quantity=5)
+        Exit.objects.create(product=self.cable, user=self.user, quantity=2)
+        old = Entry.objects.create(product=self.breaker, user=self.user, quantity=7)
+        Entry.objects.filter(pk=old.pk).update(date=timezone.now() - datetime.timedelta(days=40))
+
+        days = self.client.get('/api/reports/movements/').data
+        self.assertEqual(len(days), 2)
+        self.assertEqual(
+            (days[-1]['entries'], days[-1]['exits'], days[-1]['net'], days[-1]['exit_count']), (5, 2, 3, 1)
+        )
+
+        since = (timezone.localdate() - datetime.timedelta(days=1)).isoformat()
+        recent = self.client.get('/api/reports/movements/', {'period': 'month', 'start': since}).data
+        self.assertEqual([(row['entries'], row['exits']) for row in recent], [(5, 2)])
+        self.assertEqual(self.client.get('/api/reports/movements/', {'period': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/movements/', {'start': 'ontem'}).status_code, 400)
+
+    def test_results_are_cached_until_data_changes(self):
+        first = self.client.get('/api/reports/valuation/').data
+        with self.assertNumQueries(3):  # somente a marca d'água
+            self.assertEqual(self.client.get('/api/reports/valuation/').data, first)
+
+        Entry.objects.create(product=self.cable, user=self.user, quantity=1)
+        self.assertEqual(self.client.get('/api/reports/valuation/').data['value'], '212.00')
+
+
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.product = make_product(stock=5)
+        for quantity in (1, 2, 3):
+            Entry.objects.create(product=self.product, user=self.user, quantity=quantity)
+
+    async def test_product_lookup_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/api/async/products/{self.product.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['title'], response.json()['stock']), ('Cabo 2,5mm', 11))
+        self.assertEqual((await self.async_client.get('/api/async/products/999999/')).status_code, 404)
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(f'/api/async/products/{self.product.pk}/').status_code, 403)
+
+    async def test_accepts_basic_authentication(self):
+        self.user.set_password('senha')
+        await self.user.asave()
+        url = f'/api/async/products/{self.product.pk}/'
+        credentials = base64.b64encode(b'admin:senha').decode()
+        response = await self.async_client.get(url, headers={'Authorization': f'Basic {credentials}'})
+        self.assertEqual(response.status_code, 200)
+        wrong = base64.b64encode(b'admin:errada').decode()
+        response = await self.async_client.get(url, headers={'Authorization': f'Basic {wrong}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_stock_check(self):
+        self.client.force_login(self.user)
+        url = f'/api/async/products/{self.product.pk}/stock/'
+        self.assertTrue(self.client.get(url, {'quantity': 11}).json()['available'])
+        self.assertFalse(self.client.get(url, {'quantity': 12}).json()['available'])
+        self.assertEqual(self.client.get(url, {'quantity': 'x'}).status_code, 400)
+
+    def test_movement_list_pages_by_id(self):
+        self.client.force_login(self.user)
+        first = self.client.get('/api/async/entries/', {'limit': 2, 'product': self.product.pk}).json()
+        self.assertEqual([row['quantity'] for row in first['results']], [3, 2])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['quantity'] for row in second['results']], [1])
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.client.get('/api/async/exits/').json()['results'], [])
+
+
+# Dois arquivos SQLite fazem o papel de primário e réplica, registrados antes do setUpClass
+class ReplicaRoutingTests(APISimpleTestCase):
+    aliases = {'primary': 'primary_test', 'replica': 'replica_test'}
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        configured = connections.configure_settings({
+            'default': connections.settings['default'],
+            **{
+                alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.directory.name, f'{alias}.sqlite3')}
+                for alias in cls.aliases.values()
+            },
+        })
+        for alias in cls.aliases.values():
+            connections.settings[alias] = configured[alias]
+        super().setUpClass()
+
+        # Dados distintos em cada banco, gravados sem roteador
+        with override_settings(DATABASE_ROUTERS=[]):
+            for role, alias in cls.aliases.items():
+                call_command('migrate', database=alias, verbosity=0)
+                cls.user = User.objects.db_manager(alias).create_superuser('admin')
+                category = Category.objects.using(alias).create(name='Cabos')
+                unit = UnitOfMeasurement.objects.using(alias).create(name='Metro', symbol='m')
+                cls.product = Product.objects.using(alias).create(
+                    title=f'Cabo ({role})', category=category, unit_of_measurement=unit, price='10.00',
+                    stock=5 if role == 'primary' else 3
+                )
+            LogEntry.objects.using(cls.aliases['replica']).create(
+                user=cls.user, object_id=cls.product.pk, object_repr='Cabo', action_flag=ADDITION
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.aliases.values():
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        router = override_settings(DATABASE_ROUTERS=[ReplicaRouter(**self.aliases)])
+        router.enable()
+        self.addCleanup(router.disable)
+
+    def test_reads_go_to_replica(self):
+        with CaptureQueriesContext(connections[self.aliases['primary']]) as primary:
+            self.assertEqual(self.client.get('/api/products/').data['results'][0]['title'], 'Cabo (replica)')
+            self.assertEqual(self.client.get(f'/api/products/{self.product.pk}/').data['stock'], 3)
+            self.assertEqual(len(self.client.get('/api/logs/').data['results']), 1)
+            self.assertEqual(self.client.get('/api/reports/valuation/').data['value'], '30.00')
+        self.assertEqual(len(primary), 0)
+
+    def test_writes_go_to_primary(self):
+        response = self.client.post('/api/entries/', {'product': self.product.pk, 'user': self.user.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Product.objects.using(self.aliases['primary']).get().stock, 7)
+        self.assertFalse(Entry.objects.using(self.aliases['replica']).exists())
+        with use_replica():
+            self.assertEqual(Entry.objects.all().db, self.aliases['replica'])
+        self.assertEqual(Entry.objects.all().db, self.aliases['primary'])
+
+    def test_without_replica_reads_stay_on_primary(self):
+        router = ReplicaRouter(primary='primary_test', replica='missing')
+        with use_replica():
+            self.assertEqual(router.db_for_read(Product), 'primary_test')
+        self.assertFalse(router.allow_migrate('missing', 'products'))
+
+
+class ProductImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.client.force_authenticate(self.user)
+        self.existing = make_product(stock=5)
+
+    def _upload(self, content, name='produtos.csv', **data):
+        return self.client.post(
+            '/api/products/import/', {'file': SimpleUploadedFile(name, content.encode()), **data}, format='multipart'
+        )
+
+    def test_csv_creates_and_updates_by_natural_key(self):
+        response = self._upload(
+            'Título;Marca;Categoria;Preço;Estoque;Unidade de medida\n'
+            'Cabo 2,5mm;Sil;Cabos;12,90;99;Metro\n'
+            'Cabo 4mm;Sil;Cabos;18,50;30;m\n'
+            'Cabo 6mm;;Cabos;25;;Metro\n'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['rows'], response.data['created'], response.data['updated']), (3, 2, 1))
+
+        # Atualiza preço, mas o estoque de um produto existente só muda por movimentações
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price, self.existing.stock), (Decimal('12.90'), 5))
+        created = Product.objects.get(title='Cabo 4mm')
+        self.assertEqual((created.stock, created.status), (30, 'in_stock'))
+        self.assertEqual(Product.objects.get(title='Cabo 6mm').status, 'out_of_stock')
+        self.assertEqual(StockSnapshot.objects.get(product=created).closing_stock, 30)
+        self.assertEqual([product.title for product in search_products('4mm')[0]], ['Cabo 4mm'])
+
+    def test_invalid_rows_are_reported_and_nothing_is_written(self):
+        response = self._upload(
+            'title,category,price,stock,unit_of_measurement,is_active\n'
+            'Cabo 4mm,Cabos,18.50,30,m,sim\n'
+            ',Cabos,abc,-1,m,talvez\n'
+            'Cabo 6mm,Fios,25,1,Litro,não\n'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['line'] for row in response.data['errors']], [3, 4])
+        self.assertEqual(
+            sorted(response.data['errors'][0]['errors']), ['is_active', 'price', 'stock', 'title']
+        )
+        self.assertEqual(sorted(response.data['errors'][1]['errors']), ['category', 'unit_of_measurement'])
+        self.assertEqual(Product.objects.count(), 1)
+
+        missing = self._upload('title,price\nCabo,1\n')
+        self.assertEqual(missing.status_code, 400)
+        self.assertIn('category', missing.data['file'][0])
+
+    def test_xlsx_import_can_create_missing_references(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['title', 'brand', 'category', 'price', 'stock', 'unit_of_measurement'])
+        workbook.active.append(['Disjuntor 32A', 'Steck', 'Proteção', 25.5, 4, 'Metro'])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+
+        result = import_products(buffer, 'produtos.xlsx', create_missing=True)
+        self.assertEqual((result['created'], result['errors']), (1, []))
+        product = Product.objects.select_related('brand', 'category').get(title='Disjuntor 32A')
+        self.assertEqual((product.brand.name, product.category.name, product.price), ('Steck', 'Proteção', Decimal('25.50')))
+
+    def test_export_round_trips(self):
+        exported = b''.join(csv_response(Product.objects.all(), 'produtos').streaming_content).decode()
+        Product.objects.filter(pk=self.existing.pk).update(price='1.00')
+        self.assertEqual(self._upload(exported).data['updated'], 1)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.price, Decimal('10.00'))
+
+    def test_admin_upload_and_permissions(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('produtos.csv', b'title,category,price,unit_of_measurement\nCabo 4mm,Cabos,1,m\n')
+        response = self.client.post('/products/product/import/', {'file': upload})
+        self.assertRedirects(response, '/products/product/', fetch_redirect_response=False)
+        self.assertTrue(Product.objects.filter(title='Cabo 4mm').exists())
+
+        viewer = User.objects.create_user('leitor')
+        self.client.force_authenticate(viewer)
+        self.assertEqual(self._upload('title\n').status_code, 403)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.product = make_product(stock=5)
+
+    def _sample(self, text, prefix):
+        return next((float(line.split()[-1]) for line in text.splitlines() if line.startswith(prefix)), 0)
+
+    def test_requests_are_exposed_per_view(self):
+        self.client.force_login(self.user)
+        sample = 'inventory_http_requests_total{view="product-list",method="GET",status="200"}'
+        before = self._sample(self.client.get('/metrics').content.decode(), sample)
+        self.client.get('/api/products/')
+        self.client.get(f'/api/async/products/{self.product.pk}/')
+        self.client.get('/products/product/')
+
+        text = self.client.get('/metrics').content.decode()
+        self.assertEqual(self._sample(text, sample), before + 1)
+        self.assertGreaterEqual(
+            self._sample(text, 'inventory_db_queries_per_request_count{view="async-product-detail"}'), 1
+        )
+        self.assertGreater(
+            self._sample(text, 'inventory_db_query_duration_seconds_total{view="async-product-detail"}'), 0
+        )
+        self.assertIn('view="admin:products_product_changelist"', text)
+        self.assertNotIn('view="metrics"', text)
+
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='segredo'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer errado').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer segredo').status_code, 200)
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_duplicate_queries_and_server_timing(self):
+        request = RequestFactory().get('/')
+
+        def view(request):
+            request.resolver_match = type('Match', (), {'view_name': 'n-plus-one', 'route': ''})()
+            for product in Product.objects.all():
+                for pk in (product.pk, product.pk, product.pk):
+                    Product.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        before = DUPLICATE_QUERIES.series.get(('n-plus-one',), 0)
+        response = MetricsMiddleware(view)(request)
+        self.assertEqual(DUPLICATE_QUERIES.series[('n-plus-one',)], before + 2)
+        self.assertGreaterEqual(REQUESTS.series[('n-plus-one', 'GET', 200)], 1)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="4 consultas", app;dur=[\d.]+$')
+
+
+class DataGeneratorTests(TestCase):
+    def test_generated_history_matches_stock(self):
+        out = io.StringIO()
+        options = {'brands': 12, 'categories': 3, 'units': 2, 'products': 40, 'movements': 600, 'days': 30}
+        call_command('generate_data', stdout=out, **options)
+        self.assertIn('40 produtos', out.getvalue())
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Entry.objects.count() + Exit.objects.count(), 600)
+        self.assertEqual(list(stock_drift()), [])
+        self.assertFalse(Product.objects.filter(stock__lt=0).exists())
+        self.assertEqual(Product.objects.filter(stock=0).exclude(status='out_of_stock').count(), 0)
+
+        # Histórico em ordem cronológica ao longo do período
+        dates = list(Entry.objects.order_by('pk').values_list('date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertLess(dates[0], timezone.now() - datetime.timedelta(days=25))
+
+        # Uma segunda execução reaproveita os cadastros e continua os ids dos produtos
+        call_command('generate_data', stdout=out, **{**options, 'products': 5, 'movements': 10})
+        self.assertEqual((Brand.objects.count(), User.objects.count(), Product.objects.count()), (12, 5, 45))
+        self.assertEqual(list(stock_drift()), [])
+        make_product(title='Criado depois')
+
+
+class BenchmarkComparisonTests(TestCase):
+    def test_regressions_follow_metric_direction(self):
+        baseline = {
+            'api': {'products_list_ms': 10, 'products_list_queries': 4, 'rows': 100},
+            'import': {'csv_rows_per_second': 1000},
+        }
+        current = {
+            'api': {'products_list_ms': 10.5, 'products_list_queries': 6, 'rows': 200},
+            'import': {'csv_rows_per_second': 800},
+        }
+        rows = {
+            (name, metric): (change, regression)
+            for name, metric, _, _, change, regression in compare_results(baseline, current)
+        }
+        self.assertEqual(rows, {
+            ('api', 'products_list_ms'): (5.0, False),
+            ('api', 'products_list_queries'): (50.0, True),
+            ('import', 'csv_rows_per_second'): (-20.0, True),
+        })
+
+
+# Arquivos das tarefas em um diretório temporário, apagado ao fim de cada teste
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+@mock.patch('products.jobs.JOB_THRESHOLD', 2)
+class BackgroundJobTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser('admin')
+        self.products = [make_product(title=f'Cabo {i}mm', stock=i) for i in range(1, 4)]
+
+    def test_large_admin_export_is_enqueued_and_downloadable(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/products/product/', {
+            'action': 'export_as_csv', '_selected_action': [product.pk for product in self.products],
+        })
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.status, job.user), ('export_csv', 'pending', self.user))
+        self.assertEqual(sorted(job.params['filters']['pk__in']), [product.pk for product in self.products])
+
+        job = run_job(claim_next_job())
+        self.assertEqual((job.status, job.progress, job.rows, job.error), ('done', 100, 3, ''))
+        download = self.client.get(f'/products/job/{job.pk}/download/')
+        lines = b''.join(download.streaming_content).decode().splitlines()
+        self.assertEqual((lines[0].split(',')[0], len(lines)), ('title', 4))
+
+        # Abaixo do limite a exportação continua imediata
+        response = self.client.post('/products/product/', {
+            'action': 'export_as_csv', '_selected_action': [self.products[0].pk],
+        })
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_changelist_export_keeps_filters(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/products/product/export/xlsx/', {'status': 'in_stock'})
+        self.assertRedirects(response, '/products/product/?status=in_stock', fetch_redirect_response=False)
+        self.assertEqual(Job.objects.get().params, {'changelist': 'status=in_stock'})
+        job = run_job(claim_next_job())
+        self.assertEqual((job.kind, job.rows), ('export_xlsx', 3))
+        self.assertTrue(job.file.name.endswith('product.xlsx'))
+
+    def test_report_endpoint_returns_job(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/reports/stock-pdf/', {'category': self.products[0].category_id})
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(response.data['download'])
+        self.assertTrue(response['Location'].endswith(f"/api/jobs/{response.data['id']}/"))
+        self.assertEqual(self.client.get(response['Location']).data['status'], 'pending')
+        self.assertEqual(self.client.get(f"/api/jobs/{response.data['id']}/download/").status_code, 409)
+
+        run_job(claim_next_job())
+        job = self.client.get(response['Location']).data
+        self.assertEqual((job['status'], job['rows']), ('done', 3))
+        self.assertTrue(b''.join(self.client.get(job['download']).streaming_content).startswith(b'%PDF'))
+
+        other = User.objects.create_user('leitor')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(response['Location']).status_code, 404)
+
+    def test_select_all_action_rebuilds_the_changelist_in_the_worker(self):
+        make_product(title='Cabo 10mm', stock=10)
+        Product.objects.filter(pk=self.products[0].pk).update(status='temporarily_unavailable')
+        self.client.force_login(self.user)
+        self.client.post('/products/product/?status=in_stock', {
+            'action': 'export_as_csv', 'select_across': '1', '_selected_action': [self.products[1].pk],
+        })
+        self.assertEqual(Job.objects.get().params, {'changelist': 'status=in_stock'})
+        self.assertEqual(run_job(claim_next_job()).rows, 3)
+
+    def test_claim_is_exclusive_and_failures_are_recorded(self):
+        job = enqueue('stock_pdf', Product, {}, self.user)
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.status), (job.pk, 'running'))
+        self.assertIsNone(claim_next_job())
+
+        # Worker encerrado no meio da tarefa: volta para a fila depois de STALE_AFTER sem sinal
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - STALE_AFTER * 2)
+        self.assertEqual(requeue_stale_jobs(), 1)
+
+        Job.objects.filter(pk=job.pk).update(model='products.inexistente')
+        with self.assertLogs('products.jobs', 'ERROR'):
+            failed = run_job(claim_next_job())
+        self.assertEqual(failed.status, 'failed')
+        self.assertIn('LookupError', failed.error)
+
+
+class JobWorkerTests(MediaRootMixin, TransactionTestCase):
+    def test_worker_drains_queue_in_parallel(self):
+        user = User.objects.create_user('estoquista')
+        for i in range(3):
+            make_product(title=f'Produto {i}')
+        for kind in ('export_csv', 'export_xlsx', 'stock_pdf'):
+            enqueue(kind, Product, {'ordering': ['title']}, user)
+
+        call_command('run_jobs', once=True, workers=2, poll=0.05, stdout=io.StringIO())
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)), ['done'] * 3)
+        job = Job.objects.get(kind='stock_pdf')
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+        job.delete()
+        self.assertFalse(os.path.exists(path))
+
+
+class StockEventOutboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin')
+        self.product = make_product(stock=10)
+        self.start = StockEvent.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+    def new_events(self):
+        return list(StockEvent.objects.filter(pk__gt=self.start).values_list('product', 'stock', 'status'))
+
+    def test_stock_and_status_changes_write_events(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        Exit.objects.create(product=self.product, user=self.user, quantity=15)
+        with self.assertRaises(ValidationError):
+            Exit.objects.create(product=self.product, user=self.user, quantity=1)
+
+        self.product.refresh_from_db()
+        self.product.title = 'Cabo 4mm'
+        self.product.save()
+        Entry.objects.create(product=self.product, user=self.user, quantity=2)
+        self.product.refresh_from_db()
+        self.product.status = 'temporarily_unavailable'
+        self.product.save()
+
+        pk = self.product.pk
+        self.assertEqual(self.new_events(), [
+            (pk, 15, 'in_stock'), (pk, 0, 'out_of_stock'), (pk, 2, 'in_stock'), (pk, 2, 'temporarily_unavailable'),
+        ])
+
+    def test_saving_the_moved_instance_writes_no_extra_event(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=5)
+        self.product.title = 'Cabo 4mm'
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save()
+        self.assertEqual(self.new_events(), [(self.product.pk, 15, 'in_stock')])
+        self.assertFalse([q for q in queries.captured_queries if 'products_stocksnapshot' in q['sql']])
+
+    def test_bulk_movements_and_import_write_one_event_per_product(self):
+        other = make_product(title='Disjuntor 20A', stock=3)
+        self.start = StockEvent.objects.order_by('-pk').values_list('pk', flat=True).first()
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/exits/bulk/', [
+            {'product': self.product.pk, 'quantity': 4}, {'product': self.product.pk, 'quantity': 6},
+            {'product': other.pk, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.new_events(), [(self.product.pk, 0, 'out_of_stock'), (other.pk, 2, 'in_stock')])
+
+        self.start = StockEvent.objects.order_by('-pk').values_list('pk', flat=True).first()
+        csv = 'title,brand,category,unit,price,stock\nDisjuntor 20A,Sil,Cabos,Metro,12.00,9\nRelé 12V,Sil,Cabos,Metro,30.00,7\n'
+        result = import_products(SimpleUploadedFile('produtos.csv', csv.encode()))
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        # O estoque de um produto existente não muda na importação: só o criado gera evento
+        created = Product.objects.get(title='Relé 12V')
+        self.assertEqual(self.new_events(), [(created.pk, 7, 'in_stock')])
+
+    def test_feed_returns_events_after_cursor(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=1)
+        Entry.objects.create(product=self.product, user=self.user, quantity=2)
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get('/api/stock-events/', {'after': self.start, 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        first = response.data['events']
+        self.assertEqual([(event['product'], event['stock']) for event in first], [(self.product.pk, 11)])
+        self.assertEqual(response.data['cursor'], first[0]['id'])
+
+        response = self.client.get('/api/stock-events/', {'after': response.data['cursor']})
+        self.assertEqual([event['stock'] for event in response.data['events']], [13])
+        response = self.client.get('/api/stock-events/', {'after': response.data['cursor']})
+        self.assertEqual(response.data['events'], [])
+        self.assertEqual(self.client.get('/api/stock-events/', {'after': 'x'}).status_code, 400)
+
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get('/api/stock-events/').status_code, (401, 403))
+
+    def test_event_stream_resumes_from_last_event_id(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=1)
+        Entry.objects.create(product=self.product, user=self.user, quantity=2)
+        first = StockEvent.objects.filter(pk__gt=self.start).first()
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(
+            '/api/stock-events/', {'wait': 0}, HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=str(first.pk)
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        messages = [block for block in body.split('\n\n') if block.startswith('id:')]
+        self.assertEqual(len(messages), 1)
+        id_line, event_line, data_line = messages[0].split('\n')
+        self.assertEqual((id_line, event_line), (f'id: {first.pk + 1}', 'event: stock'))
+        self.assertEqual(json.loads(data_line[len('data: '):])['stock'], 13)
+
+        response = self.client.get('/api/stock-events/', {'format': 'sse', 'wait': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith(b'event: error'))
+
+    def test_prune_keeps_events_not_yet_delivered(self):
+        Entry.objects.create(product=self.product, user=self.user, quantity=1)
+        events = list(StockEvent.objects.values_list('pk', flat=True))
+        StockEvent.objects.update(created_at=timezone.now() - datetime.timedelta(days=30))
+        WebhookSubscription.objects.create(name='ERP', url='http://127.0.0.1:9/', cursor=events[0])
+
+        self.assertEqual(prune_events(), 1)
+        self.assertEqual(list(StockEvent.objects.values_list('pk', flat=True)), events[1:])
+
+
+# Servidor HTTP local no lugar do sistema que recebe os webhooks
+class WebhookReceiver(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.headers, body))
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookDispatchTests(TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), WebhookReceiver)
+        self.server.received = []
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        user = User.objects.create_user('estoquista')
+        self.product = make_product(stock=10)
+        for quantity in (1, 2):
+            Entry.objects.create(product=self.product, user=user, quantity=quantity)
+        self.subscription = WebhookSubscription.objects.create(
+            name='Loja', url=f'http://127.0.0.1:{self.server.server_port}/eventos', secret='segredo',
+            cursor=StockEvent.objects.order_by('pk').first().pk,
+        )
+
+    def test_delivers_signed_batches_and_advances_cursor(self):
+        self.assertEqual(dispatch_events(batch_size=1), (2, 0))
+        payloads = [json.loads(body) for _, body in self.server.received]
+        self.assertEqual([[event['stock'] for event in payload['events']] for payload in payloads], [[11], [13]])
+        headers, body = self.server.received[0]
+        expected = 'sha256=' + hmac.new(b'segredo', body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-Inventory-Signature'], expected)
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.cursor, StockEvent.objects.order_by('pk').last().pk)
+        self.assertIsNone(self.subscription.next_attempt_at)
+        self.assertIsNotNone(self.subscription.last_delivered_at)
+
+        # Sem eventos novos, nenhuma requisição
+        self.assertEqual(dispatch_events(), (0, 0))
+        self.assertEqual(len(self.server.received), 2)
+
+    def test_failures_back_off_without_losing_events(self):
+        cursor = self.subscription.cursor
+        self.server.status = 503
+        self.assertEqual(dispatch_events(), (0, 1))
+        self.subscription.refresh_from_db()
+        self.assertEqual((self.subscription.cursor, self.subscription.failures), (cursor, 1))
+        self.assertIn('503', self.subscription.last_error)
+        self.assertGreater(self.subscription.next_attempt_at, timezone.now())
+
+        # Em espera: o ciclo seguinte não tenta de novo
+        self.assertEqual(dispatch_events(), (0, 0))
+        self.assertEqual(len(self.server.received), 1)
+        self.assertEqual(backoff(3), backoff(1) * 4)
+
+        self.server.status = 204
+        WebhookSubscription.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_events(), (2, 0))
+        self.subscription.refresh_from_db()
+        self.assertEqual((self.subscription.failures, self.subscription.last_error), (0, ''))
+
+    def test_malformed_response_counts_as_failure(self):
+        with mock.patch('urllib.request.urlopen', side_effect=http.client.BadStatusLine('lixo')):
+            self.assertEqual(dispatch_events(), (0, 1))
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.failures, 1)
+        self.assertIn('BadStatusLine', self.subscription.last_error)
+
+    def test_command_delivers_once(self):
+        out = io.StringIO()
+        call_command('dispatch_events', once=True, stdout=out)
+        self.assertIn('2 evento(s) entregue(s)', out.getvalue())
+
+    def test_admin_pending_reads_the_outbox_once(self):
+        WebhookSubscription.objects.create(name='Atrasada', url='http://127.0.0.1/atrasada', secret='s', cursor=0)
+        self.client.force_login(User.objects.create_superuser('admin'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/products/webhooksubscription/')
+        pending = {row.name: row.pending for row in response.context['cl'].result_list}
+        self.assertEqual(pending, {'Loja': 2, 'Atrasada': latest_event_id()})
+        self.assertEqual(sum('products_stockevent' in query['sql'] for query in queries.captured_queries), 1)
+
+
+class StockEventLongPollTests(TransactionTestCase):
+    def test_wait_returns_as_soon_as_an_event_is_committed(self):
+        user = User.objects.create_user('estoquista')
+        product = make_product(stock=1)
+        cursor = latest_event_id()
+
+        def add_entry():
+            Entry.objects.create(product=product, user=user, quantity=4)
+            connection.close()
+
+        timer = threading.Timer(0.2, add_entry)
+        timer.start()
+        events = wait_for_events(cursor, timeout=10)
+        timer.join()
+        self.assertEqual([(event['product'], event['stock']) for event in events], [(product.pk, 5)])
+
+
+class LowStockTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', email='admin@example.com')
+        self.category = Category.objects.create(name='Lâmpadas', min_stock=5, reorder_point=10)
+        self.product = make_product(stock=20)
+        self.product.category = self.category
+        self.product.save()
+
+    def flags(self, product=None):
+        product = product or self.product
+        product.refresh_from_db()
+        return product.alert_level, product.low_stock, product.low_stock_since is not None
+
+    def test_movements_set_and_clear_low_stock(self):
+        self.assertEqual(self.flags(), (10, False, False))
+        Exit.objects.create(product=self.product, user=self.user, quantity=10)
+        self.assertEqual(self.flags(), (10, True, True))
+        since = self.product.low_stock_since
+
+        # Continua baixo: a data de entrada em estoque baixo não muda
+        Exit.objects.create(product=self.product, user=self.user, quantity=6)
+        self.assertEqual(self.flags(), (10, True, True))
+        self.assertEqual(self.product.low_stock_since, since)
+
+        Entry.objects.create(product=self.product, user=self.user, quantity=7)
+        self.assertEqual(self.flags(), (10, False, False))
+
+    def test_bulk_exits_set_low_stock(self):
+        other = make_product(title='Disjuntor 20A', stock=12, min_stock=3, reorder_point=11)
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/exits/bulk/', [
+            {'product': self.product.pk, 'quantity': 4}, {'product': other.pk, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.flags(), (10, False, False))
+        self.assertEqual(self.flags(other), (11, True, True))
+
+    def test_category_thresholds_apply_to_products_without_own_limits(self):
+        own = make_product(title='Relé 12V', stock=15, min_stock=2, reorder_point=4)
+        own.category = self.category
+        own.save()
+
+        self.category.min_stock, self.category.reorder_point = 10, 25
+        self.category.save()
+        self.assertEqual(self.flags(), (25, True, True))
+        self.assertEqual(self.flags(own), (4, False, False))
+
+        self.category.min_stock = self.category.reorder_point = None
+        self.category.save()
+        self.assertEqual(self.flags(), (None, False, False))
+
+    def test_threshold_validation(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/api/products/{self.product.pk}/', {'min_stock': 8, 'reorder_point': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reorder_point', response.data)
+        response = self.client.patch(f'/api/categories/{self.category.pk}/', {'reorder_point': 4})
+        self.assertEqual(response.status_code, 400)
+
+        self.product.min_stock, self.product.reorder_point = 8, 3
+        with self.assertRaises(ValidationError):
+            self.product.full_clean()
+
+    def test_low_stock_endpoint_and_admin_filter(self):
+        reorder = make_product(title='Relé 12V', stock=8)
+        critical = make_product(title='Disjuntor 20A', stock=4)
+        inactive = make_product(title='Fusível 10A', stock=1, is_active=False)
+        for product in (reorder, critical, inactive):
+            product.category = self.category
+            product.save()
+        self.assertEqual(set(low_stock_products()), {reorder, critical})
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/products/low-stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['title'] for row in response.data['results']], ['Disjuntor 20A', 'Relé 12V'])
+        response = self.client.get('/api/products/low-stock/', {'critical': 'true', 'category': self.category.pk})
+        self.assertEqual([row['id'] for row in response.data['results']], [critical.pk])
+        self.assertEqual(self.client.get('/api/products/low-stock/', {'category': 'x'}).status_code, 400)
+
+        self.client.force_login(self.user)
+        response = self.client.get('/products/product/', {'low_stock': 'critical'})
+        self.assertEqual(list(response.context['cl'].result_list), [critical])
+
+    def test_digest_command_sends_one_email(self):
+        make_product(title='Disjuntor 20A', stock=4, min_stock=5, reorder_point=6)
+        Exit.objects.create(product=self.product, user=self.user, quantity=12)
+
+        call_command('low_stock_digest', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['admin@example.com'])
+        self.assertIn('2 produto(s), 1 abaixo do mínimo, 2 novo(s)', message.subject)
+        self.assertIn('Disjuntor 20A: 4 m (alerta em 6)', message.body)
+
+        out = io.StringIO()
+        call_command('low_stock_digest', to=['compras@example.com'], dry_run=True, stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Cabo 2,5mm: 8 m (alerta em 10)', out.getvalue())
@@ -1,32 +1,320 @@
-from rest_framework import viewsets, serializers
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAdminUser, DjangoModelPermissions
+import datetime
+import hashlib
+import json
+from functools import partial
+
+from rest_framework import viewsets, serializers, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, DjangoModelPermissions, SAFE_METHODS
+from rest_framework.renderers import BaseRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import User, Group
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.dateparse import parse_date, parse_datetime
+
+from app.routers import use_replica
 
-from .models import Product, Category, Brand, UnitOfMeasurement, Entry, Exit
+from .models import Product, Category, Brand, UnitOfMeasurement, Entry, Exit, Job, StockEvent
 from .serializers import (
     ProductSerializer, CategorySerializer, BrandSerializer, 
     UnitSerializer, EntrySerializer, ExitSerializer, 
-    UserSerializer, GroupSerializer
+    UserSerializer, GroupSerializer, MovementLineSerializer, JobSerializer,
+    FastListSerializer, SparseFieldsMixin, ExpandableFieldsMixin
+)
+from .services import apply_movement_batch, low_stock_products, stock_at
+from .cache import cached_reference, reference_cache_stats
+from .events import EVENT_BATCH_SIZE, LONG_POLL_MAX, STREAM_DURATION, event_stream, wait_for_events
+from .imports import import_products
+from .jobs import enqueue, should_enqueue
+from .search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_products, search_terms
+from .reports import PERIODS, cached_report, movement_summary, stock_pdf_response, stock_valuation
+from .pagination import (
+    TitleCursorPagination, NameCursorPagination, DateCursorPagination,
+    ActionTimeCursorPagination, UsernameCursorPagination, InventoryCursorPagination
 )
 
 
+# Converte AAAA-MM-DD (início ou fim do dia) ou data/hora ISO 8601 em datetime com fuso
+def parse_moment(value, end_of_day=False):
+    try:
+        day = parse_date(value)
+        if day:
+            moment = datetime.datetime.combine(day, datetime.time.max if end_of_day else datetime.time.min)
+        else:
+            moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+# Requisições condicionais (ETag / Last-Modified) e sincronização incremental (?updated_since=)
+# para catálogos. O validador vem de Max('updated_at') e da contagem, sem serializar nada:
+# se o cliente já tem a versão atual, a resposta é 304. Listas só têm ETag: uma exclusão muda a
+# contagem, mas não o Max('updated_at') de um Last-Modified.
+class ConditionalCatalogMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        value = self.request.query_params.get('updated_since')
+        if value:
+            since = parse_moment(value)
+            if since is None:
+                raise serializers.ValidationError(
+                    {"updated_since": "Informe uma data AAAA-MM-DD ou data/hora ISO 8601."}
+                )
+            queryset = queryset.filter(updated_at__gt=since)
+        return queryset
+
+    def _validators(self, request, *parts):
+        key = ':'.join(str(part) for part in (
+            self.queryset.model._meta.label_lower, request.get_full_path(),
+            request.accepted_renderer.format, *parts
+        ))
+        return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+    def _conditional(self, request, etag, last_modified, respond):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    # `validators()` devolve (etag, last_modified); `respond()` monta a resposta completa
+    def conditional_response(self, request, validators, respond):
+        etag, last_modified = validators()
+        return self._conditional(request, etag, last_modified, respond)
+
+    # Última alteração das tabelas embutidas por ?expand=: renomear uma marca muda o validador
+    def expansion_stamps(self, request):
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, ExpandableFieldsMixin):
+            return []
+        return [
+            self.queryset.model._meta.get_field(field).related_model._default_manager.aggregate(
+                last=Max('updated_at')
+            )['last']
+            for field, _, _ in serializer_class.requested_expansions(request)
+        ]
+
+    def list_validators(self, request):
+        stats = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            last=Max('updated_at'), count=Count('pk')
+        )
+        return self._validators(request, stats['last'], stats['count'], *self.expansion_stamps(request)), None
+
+    def retrieve_validators(self, request, lookup_value):
+        updated_at = (
+            self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: lookup_value})
+            .values_list('updated_at', flat=True).first()
+        )
+        if updated_at is None:
+            raise Http404
+        stamps = self.expansion_stamps(request)
+        last_modified = max([updated_at, *filter(None, stamps)])
+        return self._validators(request, updated_at, *stamps), last_modified
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(self.list_validators, request), partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_value = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.conditional_response(
+            request, partial(self.retrieve_validators, request, lookup_value),
+            partial(super().retrieve, request, *args, **kwargs)
+        )
+
+
+# Catálogos de referência (marcas, categorias, unidades): validadores e corpo das respostas de
+# leitura ficam no cache versionado, invalidado ao salvar; um acerto não consulta o banco
+class ReferenceCacheMixin(ConditionalCatalogMixin):
+    def conditional_response(self, request, validators, respond):
+        def produce():
+            etag, last_modified = validators()
+            return {'etag': etag, 'last_modified': last_modified, 'data': respond().data}
+
+        name = f'response:{request.accepted_renderer.format}:{request.build_absolute_uri()}'
+        entry = cached_reference(self.queryset.model, name, produce)
+        return self._conditional(
+            request, entry['etag'], entry['last_modified'], lambda: Response(entry['data'])
+        )
+
+
+# Ações somente leitura listadas em `replica_actions` leem da réplica (quando configurada);
+# criações, alterações e exclusões continuam no primário
+class ReplicaReadMixin:
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        if request.method in SAFE_METHODS and action in self.replica_actions:
+            with use_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+
+# Aplica ao queryset os select_related/prefetch_related das expansões pedidas em ?expand=,
+# para que uma lista expandida continue com um número constante de consultas
+class ExpandableQuerysetMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expansions = self.get_serializer_class().requested_expansions(self.request)
+        if expansions:
+            queryset = queryset.select_related(*[field for field, _, _ in expansions])
+            prefetch = [path for _, _, paths in expansions for path in paths]
+            if prefetch:
+                queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+# ?fields= no nível do queryset: busca só as colunas pedidas (.only()) e, em listas simples,
+# usa .values() com o FastListSerializer em vez de instanciar modelos e serializers por linha
+class SparseFieldsQuerysetMixin:
+    def get_sparse_columns(self):
+        serializer_class = self.get_serializer_class()
+        requested = serializer_class.requested_fields(self.request)
+        if not requested:
+            return None
+        model_fields = {
+            field.name: field for field in self.queryset.model._meta.concrete_fields
+        }
+        columns = [name for name in requested if name in model_fields]
+        # Sem nenhuma coluna pedida, o queryset fica completo (nomes desconhecidos são recusados
+        # pelo serializer)
+        if not columns:
+            return None
+        # Campos expandidos são percorridos com select_related e não podem ser adiados
+        if issubclass(serializer_class, ExpandableFieldsMixin):
+            for field, _, _ in serializer_class.requested_expansions(self.request):
+                if field not in columns:
+                    columns.append(field)
+        # Campos de ordenação da paginação precisam estar carregados para montar o cursor
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        for name in ordering:
+            name = name.lstrip('-')
+            if name in model_fields and name not in columns:
+                columns.append(name)
+        return columns
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        columns = self.get_sparse_columns()
+        return queryset.only(*columns) if columns else queryset
+
+    def list(self, request, *args, **kwargs):
+        columns = self.get_sparse_columns()
+        serializer = self.get_serializer()
+        if not columns or request.query_params.get('expand') or not set(serializer.fields) <= set(columns):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(queryset)
+        data = FastListSerializer(serializer).serialize(queryset if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+
 # Serializer para os logs
-class LogEntrySerializer(serializers.ModelSerializer):
+class LogEntrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LogEntry
         fields = '__all__'
 
 
 # ViewSet para leitura dos logs (somente admins)
-class LogEntryViewSet(viewsets.ReadOnlyModelViewSet):
+class LogEntryViewSet(ReplicaReadMixin, SparseFieldsQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = LogEntry.objects.all().order_by('-action_time')
     serializer_class = LogEntrySerializer
+    pagination_class = ActionTimeCursorPagination
     permission_classes = [IsAdminUser]
 
 
+# Tarefas em segundo plano do usuário (todas, para superusuários), com o download do arquivo gerado
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Job.objects.select_related('user')
+    serializer_class = JobSerializer
+    pagination_class = InventoryCursorPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'done' or not job.file:
+            return Response({"detail": "A tarefa ainda não gerou o arquivo."}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1])
+
+
+# text/event-stream (Accept do EventSource ou ?format=sse). A resposta de sucesso é um
+# StreamingHttpResponse montado na view; o renderer só formata os erros como um evento `error`.
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f'event: error\ndata: {json.dumps(data, default=str)}\n\n'.encode()
+
+
+# Feed das mudanças de estoque (outbox), para sistemas que hoje consultam /api/products/ em laço.
+# Cursor: ?after=<id do último evento recebido> (ou o cabeçalho Last-Event-ID); ?limit= até 500.
+# - JSON (long-poll): ?wait=<segundos> (até 30) espera por eventos novos antes de responder vazio;
+#   a resposta traz o cursor para a próxima chamada.
+# - SSE (Accept: text/event-stream ou ?format=sse): mantém o stream aberto por ?wait= segundos
+#   (padrão e máximo de 60); o EventSource reconecta e retoma do último id recebido.
+class StockEventViewSet(viewsets.GenericViewSet):
+    queryset = StockEvent.objects.all()
+    pagination_class = None
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+
+    def list(self, request):
+        params = request.query_params
+        stream = request.accepted_renderer.format == 'sse'
+        values = {
+            'after': params.get('after') or request.headers.get('Last-Event-ID') or '0',
+            'limit': params.get('limit') or str(EVENT_BATCH_SIZE),
+            'wait': params.get('wait') or str(STREAM_DURATION if stream else 0),
+        }
+        invalid = {name: "Informe um número inteiro." for name, value in values.items() if not value.isdigit()}
+        if invalid:
+            return Response(invalid, status=status.HTTP_400_BAD_REQUEST)
+        after, limit, wait = (int(value) for value in values.values())
+
+        if stream:
+            response = StreamingHttpResponse(
+                event_stream(after, min(wait, STREAM_DURATION)), content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            # Sem buffer no proxy (nginx), para cada evento chegar assim que é gravado
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        events = wait_for_events(after, min(max(limit, 1), EVENT_BATCH_SIZE), min(wait, LONG_POLL_MAX))
+        return Response({"cursor": events[-1]['id'] if events else after, "events": events})
+
+
 # View para apagar todos os logs (somente admins)
 @api_view(['DELETE'])
 @permission_classes([IsAdminUser])
@@ -35,50 +323,258 @@ def clear_logs(request):
     return Response({"detail": f"{count} log(s) apagado(s)."})
 
 
+# Acertos e falhas do cache de tabelas de referência (somente admins)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(reference_cache_stats())
+
+
 # ViewSets com controle de permissão por modelo
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, ConditionalCatalogMixin, SparseFieldsQuerysetMixin, ExpandableQuerysetMixin, viewsets.ModelViewSet):
+    replica_actions = ('list', 'retrieve', 'low_stock')
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = TitleCursorPagination
     permission_classes = [DjangoModelPermissions]
 
+    # Produtos ativos no nível de alerta ou abaixo (ponto de pedido ou estoque mínimo, do produto
+    # ou da categoria), pelo índice parcial de low_stock. ?critical=true: só os abaixo do mínimo;
+    # aceita também ?category=, ?fields= e ?expand=
+    @action(detail=False, methods=['get'], url_path='low-stock')
+    def low_stock(self, request):
+        params = request.query_params
+        queryset = low_stock_products(self.get_queryset(), critical=params.get('critical') == 'true')
+        if params.get('category'):
+            if not params['category'].isdigit():
+                return Response({"category": "Informe um id numérico."}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(category=int(params['category']))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    # Estoque em uma data passada: ?date=AAAA-MM-DD (fim do dia) ou data/hora ISO 8601
+    @action(detail=True, methods=['get'], url_path='stock-at')
+    def stock_at_date(self, request, pk=None):
+        product = self.get_object()
+        moment = parse_moment(request.query_params.get('date', ''), end_of_day=True)
+        if moment is None:
+            return Response(
+                {"detail": "Informe ?date= no formato AAAA-MM-DD ou data/hora ISO 8601."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-class CategoryViewSet(viewsets.ModelViewSet):
+        return Response({
+            "product": product.pk,
+            "date": moment,
+            "stock": stock_at(product, moment),
+        })
+
+    # Busca textual ranqueada: ?q= (palavras ou prefixos, com tolerância a erros de digitação)
+    # e ?limit= (padrão 20, até 100)
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        term = request.query_params.get('q', '')
+        if not search_terms(term):
+            return Response({"detail": "Informe o termo de busca em ?q=."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= SEARCH_MAX_LIMIT:
+            return Response(
+                {"detail": f"?limit= deve ser um número entre 1 e {SEARCH_MAX_LIMIT}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products, fuzzy = search_products(term, self.get_queryset(), limit)
+        return Response({
+            "query": term,
+            "fuzzy": fuzzy,
+            "count": len(products),
+            "results": self.get_serializer(products, many=True).data,
+        })
+
+    # Importação em massa (multipart): 'file' com o CSV ou XLSX e 'create_missing' opcional para
+    # cadastrar marcas e categorias inexistentes. Cria e atualiza produtos: exige as duas permissões.
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def bulk_import(self, request):
+        if not request.user.has_perms(['products.add_product', 'products.change_product']):
+            raise PermissionDenied
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"file": ["Envie o arquivo CSV ou XLSX no campo 'file'."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        create_missing = str(request.data.get('create_missing', '')).lower() in ('1', 'true', 'on')
+        try:
+            result = import_products(upload, create_missing=create_missing)
+        except ValidationError as e:
+            return Response({"file": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if result['errors'] else status.HTTP_200_OK)
+
+
+class CategoryViewSet(ReplicaReadMixin, ReferenceCacheMixin, SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = NameCursorPagination
     permission_classes = [DjangoModelPermissions]
 
 
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(ReplicaReadMixin, ReferenceCacheMixin, SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    pagination_class = NameCursorPagination
     permission_classes = [DjangoModelPermissions]
 
 
-class UnitViewSet(viewsets.ModelViewSet):
+class UnitViewSet(ReplicaReadMixin, ReferenceCacheMixin, SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
     queryset = UnitOfMeasurement.objects.all()
     serializer_class = UnitSerializer
+    pagination_class = NameCursorPagination
     permission_classes = [DjangoModelPermissions]
 
 
-class EntryViewSet(viewsets.ModelViewSet):
+# Endpoint POST <movimentações>/bulk/ que grava um lote inteiro em uma transação
+class BulkMovementMixin:
+    movement_sign = 1
+    max_batch_lines = 10000
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {"detail": "Envie uma lista não vazia de movimentações."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.max_batch_lines:
+            return Response(
+                {"detail": f"O lote excede o limite de {self.max_batch_lines} linhas."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        lines = MovementLineSerializer(data=request.data, many=True)
+        if not lines.is_valid():
+            errors = [
+                {"line": index + 1, "errors": line_errors}
+                for index, line_errors in enumerate(lines.errors) if line_errors
+            ]
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created = apply_movement_batch(
+                self.get_queryset().model, self.movement_sign, lines.validated_data, request.user
+            )
+        except ValidationError as e:
+            errors = [
+                {"line": index + 1, "errors": {"non_field_errors": messages}}
+                for index, messages in sorted(e.message_dict.items())
+            ]
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"created": len(created)}, status=status.HTTP_201_CREATED)
+
+
+class EntryViewSet(ReplicaReadMixin, SparseFieldsQuerysetMixin, ExpandableQuerysetMixin, BulkMovementMixin, viewsets.ModelViewSet):
     queryset = Entry.objects.all()
     serializer_class = EntrySerializer
+    pagination_class = DateCursorPagination
     permission_classes = [DjangoModelPermissions]
 
 
-class ExitViewSet(viewsets.ModelViewSet):
+class ExitViewSet(ReplicaReadMixin, SparseFieldsQuerysetMixin, ExpandableQuerysetMixin, BulkMovementMixin, viewsets.ModelViewSet):
+    movement_sign = -1
     queryset = Exit.objects.all()
     serializer_class = ExitSerializer
+    pagination_class = DateCursorPagination
     permission_classes = [DjangoModelPermissions]
 
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class UserViewSet(ReplicaReadMixin, SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
+    queryset = User.objects.prefetch_related('groups')
     serializer_class = UserSerializer
+    pagination_class = UsernameCursorPagination
     permission_classes = [DjangoModelPermissions]
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ReplicaReadMixin, SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
-    permission_classes = [DjangoModelPermissions]
\ No newline at end of file
+    pagination_class = NameCursorPagination
+    permission_classes = [DjangoModelPermissions]
+
+
+# Relatórios sobre produtos e movimentações
+class ReportViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
+    replica_actions = ('valuation', 'movements', 'stock_pdf')
+    queryset = Product.objects.all()
+    permission_classes = [DjangoModelPermissions]
+    pagination_class = None
+
+    # Filtros opcionais: ?category=, ?brand= (ids), ?status=, ?is_active=; o dict validado também
+    # é o que uma tarefa em segundo plano guarda para remontar a consulta
+    def report_filters(self):
+        params = self.request.query_params
+        filters = {}
+        for field in ('category', 'brand'):
+            if params.get(field):
+                if not params[field].isdigit():
+                    raise serializers.ValidationError({field: "Informe um id numérico."})
+                filters[field] = int(params[field])
+        if params.get('status'):
+            filters['status'] = params['status']
+        if params.get('is_active') in ('true', 'false'):
+            filters['is_active'] = params['is_active'] == 'true'
+        return filters
+
+    def get_queryset(self):
+        return super().get_queryset().filter(**self.report_filters())
+
+    # PDF do estoque; com muitos produtos (ou ?background=true) vira uma tarefa em segundo plano
+    # e a resposta é 202 com a tarefa, acompanhada em /api/jobs/<id>/
+    @action(detail=False, methods=['get'], url_path='stock-pdf')
+    def stock_pdf(self, request):
+        queryset = self.get_queryset()
+        if request.query_params.get('background') == 'true' or should_enqueue(queryset):
+            job = enqueue('stock_pdf', Product, {'filters': self.report_filters()}, request.user)
+            url = request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+            data = JobSerializer(job, context={'request': request}).data
+            return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+        return stock_pdf_response(queryset)
+
+    # Valor do estoque total, por categoria e por marca (aceita os mesmos filtros)
+    @action(detail=False, methods=['get'])
+    def valuation(self, request):
+        queryset = self.get_queryset()
+        return Response(cached_report('valuation', request.query_params.dict(), partial(stock_valuation, queryset)))
+
+    # Entradas x saídas agrupadas: ?period=day|month, ?start= e ?end= (AAAA-MM-DD ou ISO 8601),
+    # ?product= e ?category=
+    @action(detail=False, methods=['get'])
+    def movements(self, request):
+        params = request.query_params
+        period = params.get('period', 'day')
+        if period not in PERIODS:
+            return Response(
+                {"period": f"Use um de: {', '.join(PERIODS)}."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        moments = {}
+        for name in ('start', 'end'):
+            if params.get(name):
+                moments[name] = parse_moment(params[name], end_of_day=name == 'end')
+                if moments[name] is None:
+                    return Response(
+                        {name: "Informe uma data AAAA-MM-DD ou data/hora ISO 8601."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        filters = {}
+        for name, lookup in (('product', 'product'), ('category', 'product__category')):
+            if params.get(name):
+                if not params[name].isdigit():
+                    return Response({name: "Informe um id numérico."}, status=status.HTTP_400_BAD_REQUEST)
+                filters[lookup] = int(params[name])
+
+        producer = partial(movement_summary, period, moments.get('start'), moments.get('end'), **filters)
+        return Response(cached_report('movements', params.dict(), producer))